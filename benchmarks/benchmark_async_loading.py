@@ -0,0 +1,60 @@
+from ocrtoc_dataset_toolkit import OCRTOC_Dataset
+from ocrtoc_dataset_toolkit.frame_dataset import load_frame
+from ocrtoc_dataset_toolkit.utils.logging import set_log_level
+import argparse
+import asyncio
+import time
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--dataset_root', help='Dataset root directory')
+parser.add_argument('--scene_ids', type=int, nargs='+', default=[0], help='Scenes to load')
+parser.add_argument('--latency_ms', type=float, default=20.0, help='Latency injected before every file read')
+parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32], help='Frames in flight of the async loader')
+FLAGS = parser.parse_args()
+
+set_log_level('WARNING')
+
+class LatencyDataset(OCRTOC_Dataset):
+    """Stand-in for a network file system, every per-file read waits for one round trip"""
+    def _wait(self):
+        time.sleep(FLAGS.latency_ms / 1000.0)
+
+    def load_raw_image(self, scene_id, image_id, order = 'RGB'):
+        self._wait()
+        return super().load_raw_image(scene_id, image_id, order = order)
+
+    def load_depth_image(self, scene_id, image_id):
+        self._wait()
+        return super().load_depth_image(scene_id, image_id)
+
+    def load_seg_mask(self, scene_id, image_id):
+        self._wait()
+        return super().load_seg_mask(scene_id, image_id)
+
+    def load_camera_pose(self, scene_id, image_id):
+        self._wait()
+        return super().load_camera_pose(scene_id, image_id)
+
+dataset = LatencyDataset(root = FLAGS.dataset_root)
+frame_number = sum(dataset.load_scene_image_number(scene_id) for scene_id in FLAGS.scene_ids)
+
+tic = time.time()
+for scene_id in FLAGS.scene_ids:
+    for image_id in range(dataset.load_scene_image_number(scene_id)):
+        load_frame(dataset, scene_id, image_id)
+toc = time.time()
+print('{:>12}: {:7.2f}s, {:7.1f} frames/s'.format('synchronous', toc - tic, frame_number / (toc - tic)))
+
+async def consume(concurrency, ordered):
+    number = 0
+    async for frame in dataset.aiter_frames(FLAGS.scene_ids, concurrency = concurrency, ordered = ordered):
+        number += 1
+    return number
+
+for concurrency in FLAGS.concurrency:
+    for ordered in [True, False]:
+        tic = time.time()
+        assert asyncio.run(consume(concurrency, ordered)) == frame_number
+        toc = time.time()
+        print('{:>12}: {:7.2f}s, {:7.1f} frames/s, concurrency {}'.format(
+            'ordered' if ordered else 'unordered', toc - tic, frame_number / (toc - tic), concurrency))
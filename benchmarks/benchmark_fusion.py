@@ -0,0 +1,37 @@
+from ocrtoc_dataset_toolkit import OCRTOC_Dataset
+from ocrtoc_dataset_toolkit.utils.logging import set_log_level
+import argparse
+import tracemalloc
+import time
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--dataset_root', help='Dataset root directory')
+parser.add_argument('--scene_ids', type=int, nargs='+', default=[0], help='Scenes to reconstruct')
+parser.add_argument('--engines', nargs='+', default=['voxel', 'tsdf'], choices=['voxel', 'tsdf'], help='Fusion engines to compare')
+parser.add_argument('--image_strides', type=int, nargs='+', default=[4, 1], help='One in image_stride images is fused')
+parser.add_argument('--voxel_size', type=float, default=0.002, help='Voxel size of both engines')
+parser.add_argument('--workers', type=int, default=4, help='Number of threads loading the frames')
+FLAGS = parser.parse_args()
+
+set_log_level('WARNING')
+
+dataset = OCRTOC_Dataset(root = FLAGS.dataset_root)
+
+for scene_id in FLAGS.scene_ids:
+    for image_stride in FLAGS.image_strides:
+        for engine in FLAGS.engines:
+            tracemalloc.start()
+            tic = time.time()
+            points, _ = dataset.load_scene_point_cloud_array(
+                scene_id,
+                workers = FLAGS.workers,
+                image_stride = image_stride,
+                voxel_size = FLAGS.voxel_size,
+                use_cache = False,
+                fusion = engine
+            )
+            toc = time.time()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print('scene {} stride {} {:>5}: {:7.2f}s, numpy peak {:8.1f}MB, {} points'.format(
+                scene_id, image_stride, engine, toc - tic, peak / 1e6, len(points)))
@@ -0,0 +1,38 @@
+import argparse
+import subprocess
+import sys
+import time
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--repeat', type=int, default=5, help='Number of fresh interpreters to time')
+parser.add_argument('--max_seconds', type=float, default=1.0, help='Fail when the median import time exceeds this')
+FLAGS = parser.parse_args()
+
+# modules which must not be imported by `import ocrtoc_dataset_toolkit`
+LAZY_MODULES = ['open3d', 'matplotlib', 'PIL', 'tqdm', 'torch']
+
+CHECK = '''
+import sys
+import ocrtoc_dataset_toolkit
+print(','.join(m for m in {} if m in sys.modules))
+'''.format(LAZY_MODULES)
+
+def time_interpreter(code):
+    tic = time.time()
+    output = subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True).stdout
+    return time.time() - tic, output.strip()
+
+baseline = sorted(time_interpreter('pass')[0] for _ in range(FLAGS.repeat))[FLAGS.repeat // 2]
+results = [time_interpreter(CHECK) for _ in range(FLAGS.repeat)]
+median = sorted(elapsed for elapsed, _ in results)[FLAGS.repeat // 2] - baseline
+eager_modules = results[0][1]
+
+print('import ocrtoc_dataset_toolkit: {:.3f}s (median of {}, interpreter startup excluded)'.format(median, FLAGS.repeat))
+failed = False
+if eager_modules:
+    print('FAIL: heavy modules imported eagerly: {}'.format(eager_modules))
+    failed = True
+if median > FLAGS.max_seconds:
+    print('FAIL: import time above the {:.3f}s threshold'.format(FLAGS.max_seconds))
+    failed = True
+sys.exit(1 if failed else 0)
@@ -0,0 +1,58 @@
+from ocrtoc_dataset_toolkit.utils.combine import VoxelAccumulator, default_voxel_size
+from ocrtoc_dataset_toolkit.utils.logging import set_log_level
+import open3d as o3d
+import numpy as np
+import argparse
+import tracemalloc
+import time
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--frame_numbers', type=int, nargs='+', default=[50, 200, 800], help='Scene sizes in frames, one in four frames is merged')
+parser.add_argument('--points_per_view', type=int, default=50000, help='Points in each synthetic view')
+FLAGS = parser.parse_args()
+
+set_log_level('WARNING')
+
+def generate_view(rng):
+    # a noisy patch of a 0.5m x 0.5m table top seen from a random position
+    points = np.zeros((FLAGS.points_per_view, 3))
+    points[:, :2] = rng.uniform(-0.25, 0.25, (FLAGS.points_per_view, 2))
+    points[:, 2] = rng.normal(0, 0.002, FLAGS.points_per_view)
+    pcd = o3d.geometry.PointCloud()
+    pcd.points = o3d.utility.Vector3dVector(points)
+    pcd.colors = o3d.utility.Vector3dVector(rng.uniform(0, 1, (FLAGS.points_per_view, 3)))
+    return pcd
+
+def generate_views(frame_number):
+    rng = np.random.RandomState(0)
+    for _ in range(0, frame_number, 4):
+        yield generate_view(rng)
+
+def vstack_merge(frame_number):
+    # the original merge_pcds followed by voxel_down_sample
+    points = np.zeros(shape = (0, 3), dtype = np.float64)
+    colors = np.zeros(shape = (0, 3), dtype = np.float64)
+    for pcd in generate_views(frame_number):
+        points = np.vstack((points, np.asarray(pcd.points)))
+        colors = np.vstack((colors, np.asarray(pcd.colors)))
+    out_pcd = o3d.geometry.PointCloud()
+    out_pcd.points = o3d.utility.Vector3dVector(points)
+    out_pcd.colors = o3d.utility.Vector3dVector(colors)
+    return out_pcd.voxel_down_sample(default_voxel_size)
+
+def streaming_merge(frame_number):
+    accumulator = VoxelAccumulator(default_voxel_size)
+    for pcd in generate_views(frame_number):
+        accumulator.add_pcd(pcd)
+    return accumulator.get_pcd()
+
+for frame_number in FLAGS.frame_numbers:
+    for name, merge in [('vstack', vstack_merge), ('streaming', streaming_merge)]:
+        tracemalloc.start()
+        tic = time.time()
+        pcd = merge(frame_number)
+        toc = time.time()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print('{:>4} frames {:>9}: {:7.2f}s, numpy peak {:8.1f}MB, {} points'.format(
+            frame_number, name, toc - tic, peak / 1e6, len(pcd.points)))
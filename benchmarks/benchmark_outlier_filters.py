@@ -0,0 +1,51 @@
+from ocrtoc_dataset_toolkit import OCRTOC_Dataset
+from ocrtoc_dataset_toolkit.utils.combine import VoxelAccumulator, get_inlier_mask
+from ocrtoc_dataset_toolkit.utils.logging import set_log_level
+from ocrtoc_dataset_toolkit.utils.vis import points_to_pointcloud, transform_points
+import numpy as np
+import argparse
+import time
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--dataset_root', help='Dataset root directory')
+parser.add_argument('--scene_ids', type=int, nargs='+', default=[0], help='Scenes to reconstruct')
+parser.add_argument('--image_stride', type=int, default=4, help='One in image_stride images is fused')
+parser.add_argument('--voxel_size', type=float, default=0.002, help='Voxel size')
+parser.add_argument('--match_distance', type=float, default=0.004, help='Distance under which two points match')
+FLAGS = parser.parse_args()
+
+set_log_level('WARNING')
+
+dataset = OCRTOC_Dataset(root = FLAGS.dataset_root)
+
+def match_ratio(source, target):
+    # fraction of the source points with a target point closer than match_distance
+    if len(source) == 0 or len(target) == 0:
+        return 0.0
+    distances = np.asarray(points_to_pointcloud(source).compute_point_cloud_distance(points_to_pointcloud(target)))
+    return float(np.mean(distances < FLAGS.match_distance))
+
+for scene_id in FLAGS.scene_ids:
+    image_ids = range(0, dataset.load_scene_image_number(scene_id), FLAGS.image_stride)
+    # the views are accumulated once, only the filters are timed
+    accumulator = VoxelAccumulator(FLAGS.voxel_size)
+    frames = []
+    for image_id in image_ids:
+        camera_points, _ = dataset.load_point_cloud_array(scene_id, image_id, dtype=np.float64, with_colors=False)
+        camera_pose = dataset.load_camera_pose(scene_id, image_id)
+        accumulator.add(transform_points(camera_points, camera_pose))
+        # depth, intrinsics and camera pose of each view for the multiview filter
+        frames.append((dataset.load_depth_image(scene_id, image_id), dataset.load_real_camera_intrinsic(scene_id), camera_pose))
+    points, _ = accumulator.get_arrays()
+
+    reference = None
+    for outlier_filter in ['statistical', 'voxel_count', 'radius', 'multiview', 'none']:
+        tic = time.time()
+        mask = get_inlier_mask(points, outlier_filter, counts = accumulator.counts, frames = frames)
+        toc = time.time()
+        if reference is None:
+            reference = points[mask]
+        # precision and recall against the statistical filter
+        print('scene {} {:>11}: {:7.2f}s, {:8d} of {} points, precision {:.3f}, recall {:.3f}'.format(
+            scene_id, outlier_filter, toc - tic, int(mask.sum()), len(points),
+            match_ratio(points[mask], reference), match_ratio(reference, points[mask])))
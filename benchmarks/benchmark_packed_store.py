@@ -0,0 +1,45 @@
+from ocrtoc_dataset_toolkit import OCRTOC_Dataset
+from ocrtoc_dataset_toolkit.utils.logging import set_log_level
+import numpy as np
+import argparse
+import time
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--dataset_root', help='Dataset root directory')
+parser.add_argument('--num_frames', type=int, default=500, help='Number of random frames to load')
+parser.add_argument('--seed', type=int, default=0, help='Random seed for frame sampling')
+FLAGS = parser.parse_args()
+
+set_log_level('WARNING')
+
+per_file = OCRTOC_Dataset(root = FLAGS.dataset_root)
+packed = OCRTOC_Dataset(root = FLAGS.dataset_root, packed = True)
+
+for scene_id in range(per_file.load_scene_number()):
+    per_file.pack_scene(scene_id)
+
+rng = np.random.RandomState(FLAGS.seed)
+frames = []
+for _ in range(FLAGS.num_frames):
+    scene_id = rng.randint(per_file.load_scene_number())
+    frames.append((scene_id, rng.randint(per_file.load_scene_image_number(scene_id))))
+
+def load_frame(dataset, scene_id, image_id):
+    return (
+        dataset.load_raw_image(scene_id, image_id),
+        dataset.load_depth_image(scene_id, image_id),
+        dataset.load_seg_mask(scene_id, image_id),
+        dataset.load_camera_pose(scene_id, image_id),
+    )
+
+# the packed loader must return exactly what the per-file loader returns
+for scene_id, image_id in frames[:20]:
+    for a, b in zip(load_frame(per_file, scene_id, image_id), load_frame(packed, scene_id, image_id)):
+        assert a.dtype == b.dtype and np.array_equal(a, b)
+
+for name, dataset in [('per-file', per_file), ('packed', packed)]:
+    tic = time.time()
+    for scene_id, image_id in frames:
+        load_frame(dataset, scene_id, image_id)
+    toc = time.time()
+    print('{:>8}: {:.1f} frames/sec'.format(name, len(frames) / (toc - tic)))
@@ -0,0 +1,47 @@
+from ocrtoc_dataset_toolkit import OCRTOC_Dataset
+from ocrtoc_dataset_toolkit.frame_dataset import load_frame
+from ocrtoc_dataset_toolkit.utils.logging import set_log_level
+from ocrtoc_dataset_toolkit.utils.profiling import profile_stage, profiling
+import argparse
+import time
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--dataset_root', help='Dataset root directory')
+parser.add_argument('--scene_id', type=int, default=0, help='Scene to load')
+parser.add_argument('--repeats', type=int, default=3, help='Passes over the scene frames')
+parser.add_argument('--json', default=None, help='Save the profile statistics to this path')
+parser.add_argument('--chrome_trace', default=None, help='Save the chrome trace to this path')
+FLAGS = parser.parse_args()
+
+set_log_level('WARNING')
+
+dataset = OCRTOC_Dataset(root = FLAGS.dataset_root)
+image_number = dataset.load_scene_image_number(FLAGS.scene_id)
+
+def load_scene_frames():
+    tic = time.perf_counter()
+    for _ in range(FLAGS.repeats):
+        for image_id in range(image_number):
+            load_frame(dataset, FLAGS.scene_id, image_id)
+    return (time.perf_counter() - tic) / (FLAGS.repeats * image_number)
+
+# cost of a hook while profiling is disabled
+hook_number = 1000000
+tic = time.perf_counter()
+for _ in range(hook_number):
+    with profile_stage('hook'):
+        pass
+print('{:>10}: {:7.1f}ns per hook'.format('disabled', 1e9 * (time.perf_counter() - tic) / hook_number))
+
+load_scene_frames()
+print('{:>10}: {:7.3f}ms per frame'.format('disabled', 1e3 * load_scene_frames()))
+with profiling(trace = FLAGS.chrome_trace is not None) as profiler:
+    print('{:>10}: {:7.3f}ms per frame'.format('enabled', 1e3 * load_scene_frames()))
+
+for name, stage in sorted(profiler.stats()['stages'].items(), key = lambda item: -item[1]['total_seconds']):
+    print('{:>20}: {:6d} calls, {:8.3f}ms mean, {:8.1f}MB'.format(
+        name, stage['calls'], 1e3 * stage['mean_seconds'], stage['bytes'] / 1e6))
+if FLAGS.json is not None:
+    profiler.save_json(FLAGS.json)
+if FLAGS.chrome_trace is not None:
+    profiler.save_chrome_trace(FLAGS.chrome_trace)
@@ -0,0 +1,210 @@
+from ocrtoc_dataset_toolkit import OCRTOC_Dataset
+from ocrtoc_dataset_toolkit.utils.combine import OUTLIER_FILTERS, merge_pcds
+from ocrtoc_dataset_toolkit.utils.logging import set_log_level
+from ocrtoc_dataset_toolkit.utils.synthetic import generate_synthetic_dataset
+import open3d as o3d
+import numpy as np
+import argparse
+import platform
+import tempfile
+import shutil
+import json
+import time
+import sys
+import os
+
+BENCHMARKS = [
+    'startup',
+    'load_raw_image',
+    'load_depth_image',
+    'load_seg_mask',
+    'load_camera_pose',
+    'load_object_pose_dict',
+    'load_point_cloud',
+    'load_scene_point_cloud',
+    'merge_pcds',
+    'vis_6dpose_2d',
+    'vis_6dpose_3d',
+]
+# benchmarks which only run when they are requested with --benchmarks
+OPTIONAL_BENCHMARKS = [
+    # one open3d kNN query of thousands of neighbors per point, minutes per scene
+    'load_scene_point_cloud_statistical',
+]
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--dataset_root', default=None, help='Dataset root directory, a synthetic dataset is generated if not given')
+parser.add_argument('--scene_number', type=int, default=2, help='Scenes of the synthetic dataset')
+parser.add_argument('--image_number', type=int, default=8, help='Images in each synthetic scene')
+parser.add_argument('--object_number', type=int, default=6, help='Object models of the synthetic dataset')
+parser.add_argument('--objects_per_scene', type=int, default=3, help='Objects in each synthetic scene')
+parser.add_argument('--height', type=int, default=480, help='Image height of the synthetic dataset')
+parser.add_argument('--width', type=int, default=640, help='Image width of the synthetic dataset')
+parser.add_argument('--seed', type=int, default=0, help='Random seed of the synthetic dataset')
+parser.add_argument('--outlier_filter', default='voxel_count', choices=OUTLIER_FILTERS, help='Outlier filter of load_scene_point_cloud')
+parser.add_argument('--keep_dataset', action='store_true', help='Keep the generated synthetic dataset')
+parser.add_argument('--benchmarks', nargs='+', default=BENCHMARKS, choices=BENCHMARKS + OPTIONAL_BENCHMARKS, help='Benchmarks to run')
+parser.add_argument('--repeats', type=int, default=3, help='Passes over the frames or scenes of each benchmark')
+parser.add_argument('--output', default=None, help='Save the results as json to this path')
+parser.add_argument('--baseline', default=None, help='Compare against the results saved in this json file')
+parser.add_argument('--max_regression', type=float, default=0.2, help='Fail when a median is this fraction slower than the baseline')
+FLAGS = parser.parse_args()
+
+set_log_level('WARNING')
+
+# open3d is imported lazily by the toolkit, keep the import out of the first timed call
+o3d.geometry.PointCloud()
+
+def summarize(seconds, items=None):
+    """Summarize the durations of the calls of a benchmark, items are processed per call"""
+    seconds = np.asarray(seconds)
+    summary = {
+        'calls': len(seconds),
+        'median_seconds': float(np.median(seconds)),
+        'p90_seconds': float(np.percentile(seconds, 90)),
+        'mean_seconds': float(seconds.mean()),
+        'min_seconds': float(seconds.min()),
+        'calls_per_second': float(1.0 / seconds.mean()),
+    }
+    if items is not None:
+        summary['items_per_second'] = float(np.sum(items) / seconds.sum())
+    return summary
+
+def time_calls(function, args_list, repeats=None):
+    """Time function over every argument tuple, FLAGS.repeats times by default"""
+    seconds = []
+    results = []
+    for _ in range(FLAGS.repeats if repeats is None else repeats):
+        for args in args_list:
+            tic = time.perf_counter()
+            results.append(function(*args))
+            seconds.append(time.perf_counter() - tic)
+    return seconds, results
+
+generated_root = None
+if FLAGS.dataset_root is None:
+    generated_root = tempfile.mkdtemp(prefix='ocrtoc_benchmark_')
+    tic = time.perf_counter()
+    generate_synthetic_dataset(
+        generated_root,
+        scene_number=FLAGS.scene_number,
+        image_number=FLAGS.image_number,
+        object_number=FLAGS.object_number,
+        objects_per_scene=FLAGS.objects_per_scene,
+        height=FLAGS.height,
+        width=FLAGS.width,
+        seed=FLAGS.seed
+    )
+    print('synthetic dataset generated in {:.2f}s at {}'.format(time.perf_counter() - tic, generated_root))
+dataset_root = generated_root if generated_root is not None else FLAGS.dataset_root
+
+# the metadata cache is disabled so that every call reads its files
+dataset = OCRTOC_Dataset(root=dataset_root, metadata_cache_items=0)
+scene_ids = list(range(dataset.load_scene_number()))
+frame_ids = [
+    (scene_id, image_id)
+    for scene_id in scene_ids
+    for image_id in range(dataset.load_scene_image_number(scene_id))
+]
+
+results = dict()
+for name in FLAGS.benchmarks:
+    if name == 'startup':
+        seconds, _ = time_calls(lambda: OCRTOC_Dataset(root=dataset_root), [()])
+        results[name] = summarize(seconds)
+    elif name in ('load_raw_image', 'load_depth_image', 'load_seg_mask', 'load_camera_pose'):
+        seconds, _ = time_calls(getattr(dataset, name), frame_ids)
+        results[name] = summarize(seconds)
+    elif name == 'load_object_pose_dict':
+        seconds, _ = time_calls(dataset.load_object_pose_dict, [(scene_id,) for scene_id in scene_ids])
+        results[name] = summarize(seconds)
+    elif name == 'load_point_cloud':
+        seconds, pcds = time_calls(dataset.load_point_cloud, frame_ids)
+        results[name] = summarize(seconds, [len(pcd.points) for pcd in pcds])
+    elif name == 'load_scene_point_cloud':
+        seconds, pcds = time_calls(
+            lambda scene_id: dataset.load_scene_point_cloud(scene_id, use_cache=False, outlier_filter=FLAGS.outlier_filter),
+            [(scene_id,) for scene_id in scene_ids]
+        )
+        results[name] = summarize(seconds, [len(pcd.points) for pcd in pcds])
+    elif name == 'load_scene_point_cloud_statistical':
+        # a single pass, the statistical filter dominates and barely varies between runs
+        seconds, pcds = time_calls(
+            lambda scene_id: dataset.load_scene_point_cloud(scene_id, use_cache=False, outlier_filter='statistical'),
+            [(scene_id,) for scene_id in scene_ids],
+            repeats=1
+        )
+        results[name] = summarize(seconds, [len(pcd.points) for pcd in pcds])
+    elif name == 'merge_pcds':
+        scene_pcds = [
+            [dataset.load_point_cloud(scene_id, image_id) for image_id in range(dataset.load_scene_image_number(scene_id))]
+            for scene_id in scene_ids
+        ]
+        seconds, pcds = time_calls(merge_pcds, [(pcds,) for pcds in scene_pcds])
+        results[name] = summarize(seconds, [len(pcd.points) for pcd in pcds])
+    elif name == 'vis_6dpose_2d':
+        seconds, _ = time_calls(
+            lambda scene_id, image_id: dataset.vis_6dpose(scene_id, image_id, dimension=2, show=False),
+            frame_ids
+        )
+        results[name] = summarize(seconds)
+    elif name == 'vis_6dpose_3d':
+        seconds, _ = time_calls(
+            lambda scene_id, image_id: dataset.vis_6dpose(scene_id, image_id, dimension=3, show=False),
+            frame_ids
+        )
+        results[name] = summarize(seconds)
+    print('{:>34}: {:6d} calls, {:9.3f}ms median, {:9.3f}ms p90, {:9.1f} calls/s'.format(
+        name, results[name]['calls'], 1e3 * results[name]['median_seconds'],
+        1e3 * results[name]['p90_seconds'], results[name]['calls_per_second']))
+
+if generated_root is not None and not FLAGS.keep_dataset:
+    shutil.rmtree(generated_root)
+
+report = {
+    'config': {
+        'dataset_root': FLAGS.dataset_root,
+        'scene_number': len(scene_ids),
+        'image_number': len(frame_ids),
+        'object_number': dataset.load_object_number(),
+        'synthetic': generated_root is not None,
+        'height': FLAGS.height if generated_root is not None else None,
+        'width': FLAGS.width if generated_root is not None else None,
+        'seed': FLAGS.seed if generated_root is not None else None,
+        'outlier_filter': FLAGS.outlier_filter,
+    },
+    'environment': {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    },
+    'repeats': FLAGS.repeats,
+    'results': results,
+}
+if FLAGS.output is not None:
+    with open(FLAGS.output, 'w') as f:
+        json.dump(report, f, indent=1)
+
+failed = False
+if FLAGS.baseline is not None:
+    with open(FLAGS.baseline) as f:
+        baseline = json.load(f)
+    if baseline['config'] != report['config']:
+        print('WARNING: the baseline was measured with another configuration {}'.format(baseline['config']))
+    print('comparison against {}'.format(FLAGS.baseline))
+    for name, result in results.items():
+        if name not in baseline['results']:
+            print('{:>34}: not in the baseline'.format(name))
+            continue
+        ratio = result['median_seconds'] / baseline['results'][name]['median_seconds']
+        if ratio > 1 + FLAGS.max_regression:
+            status = 'REGRESSION'
+            failed = True
+        elif ratio < 1 / (1 + FLAGS.max_regression):
+            status = 'improved'
+        else:
+            status = 'unchanged'
+        print('{:>34}: {:9.3f}ms -> {:9.3f}ms, x{:5.2f} {}'.format(
+            name, 1e3 * baseline['results'][name]['median_seconds'], 1e3 * result['median_seconds'], ratio, status))
+sys.exit(1 if failed else 0)
@@ -4,4 +4,14 @@ from .ocrtoc_dataset import OCRTOC_Dataset
 
 __all__ = [
     'OCRTOC_Dataset',
-]
\ No newline at end of file
+    'FrameDataset',
+    'FrameIterableDataset',
+    'ShardIterableDataset',
+]
+
+def __getattr__(name):
+    # the frame datasets import torch when it is installed, load them on first use
+    if name in ('FrameDataset', 'FrameIterableDataset', 'ShardIterableDataset'):
+        from . import frame_dataset
+        return getattr(frame_dataset, name)
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
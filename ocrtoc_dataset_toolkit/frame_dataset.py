@@ -0,0 +1,319 @@
+import asyncio
+import threading
+import queue
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+try:
+    from torch.utils.data import Dataset as _MapDatasetBase
+    from torch.utils.data import IterableDataset as _IterableDatasetBase
+    from torch.utils.data import get_worker_info
+except ImportError:
+    _MapDatasetBase = object
+    _IterableDatasetBase = object
+
+    def get_worker_info():
+        return None
+
+FRAME_FIELDS = ('rgb', 'depth', 'mask', 'pose', 'intrinsics')
+
+def load_frame(dataset, scene_id, image_id, fields = FRAME_FIELDS):
+    """Load the fields of a frame into a dict
+
+    Read only arrays returned in packed mode are copied so that the frame can be
+    handed to torch without warnings.
+
+    Args:
+        dataset(OCRTOC_Dataset): the dataset.
+        scene_id(int): scene index.
+        image_id(int): image index.
+        fields(tuple of str): fields among 'rgb', 'depth', 'mask', 'pose' and 'intrinsics'.
+
+    Returns:
+        dict: scene_id, image_id and the requested fields.
+    """
+    frame = {'scene_id': scene_id, 'image_id': image_id}
+    for field in fields:
+        if field == 'rgb':
+            array = dataset.load_raw_image(scene_id, image_id, order = 'RGB')
+        elif field == 'depth':
+            array = dataset.load_depth_image(scene_id, image_id)
+        elif field == 'mask':
+            array = dataset.load_seg_mask(scene_id, image_id)
+        elif field == 'pose':
+            array = dataset.load_camera_pose(scene_id, image_id)
+        elif field == 'intrinsics':
+            array = dataset.load_real_camera_intrinsic(scene_id)
+        else:
+            raise ValueError('Unknown field {}, only {} are allowed.'.format(field, FRAME_FIELDS))
+        if not array.flags.writeable:
+            array = array.copy()
+        frame[field] = array
+    return frame
+
+def prefetch(iterable, depth = 4):
+    """Iterate in a background thread, keeping up to depth items ready
+
+    Exceptions raised by the iterable are re-raised in the consumer.
+
+    Args:
+        iterable(iterable): the iterable.
+        depth(int): queue depth, 0 to iterate in the caller.
+
+    Yields:
+        the items of the iterable.
+    """
+    if depth <= 0:
+        yield from iterable
+        return
+    items = queue.Queue(maxsize = depth)
+    stop = threading.Event()
+    end = object()
+
+    def put(item):
+        # give up when the consumer is gone instead of blocking on a full queue
+        while not stop.is_set():
+            try:
+                items.put(item, timeout = 0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+            put((end, None))
+        except BaseException as e:
+            put((end, e))
+
+    thread = threading.Thread(target = produce, daemon = True)
+    thread.start()
+    try:
+        while True:
+            item, error = items.get()
+            if item is end:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+
+async def aiter_frames(dataset, scene_ids = None, fields = FRAME_FIELDS, concurrency = 16, ordered = True):
+    """Asynchronously iterate over the frames of scenes with many reads in flight
+
+    Frames are read and decoded by :func:`load_frame` in a pool of concurrency
+    threads, so that on a high latency file system up to concurrency frames are
+    being fetched while the event loop keeps running.
+
+    Args:
+        dataset(OCRTOC_Dataset): the dataset.
+        scene_ids(list of int or None): scenes, all scenes by default.
+        fields(tuple of str): fields of each frame, see :func:`load_frame`.
+        concurrency(int): frames loaded at the same time.
+        ordered(bool): yield the frames in scene and image order, otherwise as soon as they are loaded.
+
+    Yields:
+        dict: frames of :func:`load_frame`.
+    """
+    if concurrency < 1:
+        raise ValueError('Concurrency must be at least 1, got {}'.format(concurrency))
+    scene_ids = list(range(dataset.load_scene_number())) if scene_ids is None else list(scene_ids)
+    frame_ids = (
+        (scene_id, image_id)
+        for scene_id in scene_ids
+        for image_id in range(dataset.load_scene_image_number(scene_id))
+    )
+    executor = ThreadPoolExecutor(max_workers = concurrency)
+    pending = deque()
+
+    async def wait_frames():
+        if ordered:
+            return [await pending.popleft()]
+        done, _ = await asyncio.wait(pending, return_when = asyncio.FIRST_COMPLETED)
+        for future in done:
+            pending.remove(future)
+        return [future.result() for future in done]
+
+    try:
+        for scene_id, image_id in frame_ids:
+            pending.append(asyncio.wrap_future(executor.submit(load_frame, dataset, scene_id, image_id, fields)))
+            if len(pending) >= concurrency:
+                for frame in await wait_frames():
+                    yield frame
+        while len(pending) > 0:
+            for frame in await wait_frames():
+                yield frame
+    finally:
+        # frames not consumed yet are dropped when the consumer stops early
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait = False)
+
+class FrameDataset(_MapDatasetBase):
+    """Map style dataset of all frames with a flat frame index
+
+    A torch Dataset when torch is installed, a plain sequence otherwise.
+
+    Args:
+        dataset(OCRTOC_Dataset): the dataset.
+        scene_ids(list of int or None): scenes to use, all scenes by default.
+        fields(tuple of str): fields of each frame, see :func:`load_frame`.
+    """
+    def __init__(self, dataset, scene_ids = None, fields = FRAME_FIELDS):
+        self.dataset = dataset
+        self.scene_ids = list(range(dataset.load_scene_number())) if scene_ids is None else list(scene_ids)
+        self.fields = tuple(fields)
+        self.frame_offsets = [0]
+        for scene_id in self.scene_ids:
+            self.frame_offsets.append(self.frame_offsets[-1] + dataset.load_scene_image_number(scene_id))
+
+    def __len__(self):
+        return self.frame_offsets[-1]
+
+    def get_frame_id(self, index):
+        """Map a flat frame index to a scene and image index
+
+        Args:
+            index(int): flat frame index.
+
+        Returns:
+            int, int: scene index and image index.
+        """
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('Frame index {} out of range for {} frames'.format(index, len(self)))
+        position = bisect_right(self.frame_offsets, index) - 1
+        return self.scene_ids[position], index - self.frame_offsets[position]
+
+    def __getitem__(self, index):
+        scene_id, image_id = self.get_frame_id(index)
+        return load_frame(self.dataset, scene_id, image_id, self.fields)
+
+class FrameIterableDataset(_IterableDatasetBase):
+    """Iterable dataset of frames sharded by scene
+
+    Scenes are split across shards, a shard being one data loader worker of one
+    process. The worker is taken from torch when iterating inside a torch data
+    loader worker, the process shard from `shard_id` and `num_shards`, which are
+    typically the distributed rank and world size.
+
+    Args:
+        dataset(OCRTOC_Dataset): the dataset.
+        scene_ids(list of int or None): scenes to use, all scenes by default.
+        fields(tuple of str): fields of each frame, see :func:`load_frame`.
+        shard_id(int): shard of this process.
+        num_shards(int): shards number across processes.
+        shuffle(bool): shuffle scenes and frames in each scene.
+        seed(int): seed of the shuffling, see :meth:`set_epoch`.
+        prefetch_depth(int): frames loaded ahead in a background thread, 0 to disable.
+    """
+    def __init__(self, dataset, scene_ids = None, fields = FRAME_FIELDS, shard_id = 0, num_shards = 1,
+        shuffle = False, seed = 0, prefetch_depth = 4):
+        self.dataset = dataset
+        self.scene_ids = list(range(dataset.load_scene_number())) if scene_ids is None else list(scene_ids)
+        self.fields = tuple(fields)
+        self.shard_id = shard_id
+        self.num_shards = num_shards
+        self.shuffle = shuffle
+        self.seed = seed
+        self.epoch = 0
+        self.prefetch_depth = prefetch_depth
+
+    def set_epoch(self, epoch):
+        """Set the epoch, which is mixed into the shuffling seed
+
+        Args:
+            epoch(int): epoch.
+        """
+        self.epoch = epoch
+
+    def get_shard_scene_ids(self):
+        """Get the scenes of the current shard
+
+        Returns:
+            list of int: scene indices.
+        """
+        scene_ids = list(self.scene_ids)
+        if self.shuffle:
+            np.random.RandomState(self.seed + self.epoch).shuffle(scene_ids)
+        worker_info = get_worker_info()
+        worker_id, num_workers = (0, 1) if worker_info is None else (worker_info.id, worker_info.num_workers)
+        shard = self.shard_id * num_workers + worker_id
+        return scene_ids[shard::self.num_shards * num_workers]
+
+    def _iter_frames(self):
+        for scene_id in self.get_shard_scene_ids():
+            image_ids = np.arange(self.dataset.load_scene_image_number(scene_id))
+            if self.shuffle:
+                np.random.RandomState([self.seed, self.epoch, scene_id]).shuffle(image_ids)
+            for image_id in image_ids:
+                yield load_frame(self.dataset, scene_id, int(image_id), self.fields)
+
+    def __iter__(self):
+        return prefetch(self._iter_frames(), self.prefetch_depth)
+
+class ShardIterableDataset(_IterableDatasetBase):
+    """Iterable dataset streaming the frames of tar shards written by
+    ocrtoc_dataset_toolkit.tools.export_shards
+
+    Shards are split across shard_id and num_shards and across torch data loader
+    workers like the scenes of :class:`FrameIterableDataset`, and are read
+    sequentially. Shuffling permutes the shards, not the frames inside a shard.
+
+    Args:
+        shard_paths(list of str): shard paths, see :func:`load_shard_paths`.
+        fields(tuple of str): fields of each frame, see :func:`read_shard`.
+        shard_id(int): shard of this process.
+        num_shards(int): shards number across processes.
+        shuffle(bool): shuffle the shard order.
+        seed(int): seed of the shuffling, see :meth:`set_epoch`.
+        prefetch_depth(int): frames loaded ahead in a background thread, 0 to disable.
+    """
+    def __init__(self, shard_paths, fields = FRAME_FIELDS, shard_id = 0, num_shards = 1, shuffle = False,
+        seed = 0, prefetch_depth = 4):
+        self.shard_paths = list(shard_paths)
+        self.fields = tuple(fields)
+        self.shard_id = shard_id
+        self.num_shards = num_shards
+        self.shuffle = shuffle
+        self.seed = seed
+        self.epoch = 0
+        self.prefetch_depth = prefetch_depth
+
+    def set_epoch(self, epoch):
+        """Set the epoch, which is mixed into the shuffling seed
+
+        Args:
+            epoch(int): epoch.
+        """
+        self.epoch = epoch
+
+    def get_worker_shard_paths(self):
+        """Get the shards of the current process and worker
+
+        Returns:
+            list of str: shard paths.
+        """
+        shard_paths = list(self.shard_paths)
+        if self.shuffle:
+            np.random.RandomState(self.seed + self.epoch).shuffle(shard_paths)
+        worker_info = get_worker_info()
+        worker_id, num_workers = (0, 1) if worker_info is None else (worker_info.id, worker_info.num_workers)
+        shard = self.shard_id * num_workers + worker_id
+        return shard_paths[shard::self.num_shards * num_workers]
+
+    def _iter_frames(self):
+        from .utils.shards import read_shard
+        for shard_path in self.get_worker_shard_paths():
+            yield from read_shard(shard_path, self.fields)
+
+    def __iter__(self):
+        return prefetch(self._iter_frames(), self.prefetch_depth)
@@ -1,27 +1,62 @@
 # Author: Minghao Gou.
 
 import numpy as np
-import open3d as o3d
-import matplotlib.pyplot as plt
-from tqdm import tqdm
 import os
-import tempfile
 import cv2
 
 from .utils.logging import get_main_logger
-from .utils.combine import combine, merge_pcds
-from .utils.vis import get_random_color, generate_scene_pointcloud
+from .utils.combine import combine_views, default_voxel_size, \
+    default_outlier_neighbors, default_outlier_std_ratio
+from .utils.vis import overlay_seg_mask, depth_to_points, points_to_pointcloud, transform_points
+from .utils.fusion import FUSION_ENGINES, tsdf_fusion, default_min_weight
+from .utils.parallel import imap_ordered, get_executor
+from .utils.pack import PACKED_FILE_NAME, PackedScene, pack_scene
+from .utils.compress import compress_scene, load_compressed, get_compressed_path
+from .utils.cache import SceneCloudCache, get_source_signature
+from .utils.manifest import load_manifest, get_manifest_intrinsic
+from .utils.lru_cache import LRUCache, cached_loader
+from .utils.visibility import load_visibility_index
+from .utils.profiling import profile_stage, profile_count, read_image, load_npy
+from .utils.projection import PROJECTION_MODES, get_bbox_corners, project_points, get_visibility, get_boxes
 
 logger = get_main_logger()
 
+def _copy_object_pose_dict(object_pose_dict):
+    return {name: None if pose is None else pose.copy() for name, pose in object_pose_dict.items()}
+
+def _copy_mesh(mesh):
+    import open3d as o3d
+    return o3d.geometry.TriangleMesh(mesh)
+
 class OCRTOC_Dataset():
     """OCRTOC Dataset toolkit class
 
     Args:
         root(str): root path for the dataset.
+        packed(bool): serve frames from packed scene files when they exist,
+            see :meth:`pack_scene`.
+        cache_dir(str or None): directory caching reconstructed scene point
+            clouds, None to disable the cache.
+        use_manifest(bool): read scene and object metadata from the manifest
+            file instead of scanning the dataset when it is up to date.
+        metadata_cache_items(int): maximum number of cached object lists,
+            intrinsics, object poses and meshes, 0 to disable the cache.
+        metadata_cache_bytes(int or None): maximum bytes of the cached entries.
     """
-    def __init__(self, root):
+    def __init__(self, root, packed = False, cache_dir = None, use_manifest = True,
+        metadata_cache_items = 1024, metadata_cache_bytes = 512 * 1024 * 1024):
         self.root = root
+        if metadata_cache_items == 0:
+            self.metadata_cache = None
+        else:
+            self.metadata_cache = LRUCache(metadata_cache_items, metadata_cache_bytes)
+        self.manifest = load_manifest(root) if use_manifest else None
+        self.packed = packed
+        self.cache_dir = cache_dir
+        self.scene_cloud_cache = SceneCloudCache(cache_dir) if cache_dir is not None else None
+        self._packed_scenes = dict()
+        self._compressed_scenes = dict()
+        self._visibility_index = None
         self.scene_name_list = self.load_scene_name_list()
         self.object_name_list, self.object_id_dict = self.load_object_list()
         
@@ -32,6 +67,34 @@ class OCRTOC_Dataset():
             )
         )
 
+    # caches which are rebuilt lazily instead of being pickled to worker processes
+    _transient_attributes = {'_packed_scenes': dict, '_compressed_scenes': dict, '_visibility_index': lambda: None}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for attribute, factory in self._transient_attributes.items():
+            state[attribute] = factory()
+        return state
+
+    def clear_cache(self):
+        """Clear the metadata cache, the opened packed scenes, the detected compressed
+        scenes and the loaded visibility index"""
+        if self.metadata_cache is not None:
+            self.metadata_cache.clear()
+        self._packed_scenes = dict()
+        self._compressed_scenes = dict()
+        self._visibility_index = None
+
+    def cache_stats(self):
+        """Get the metadata cache statistics
+
+        Returns:
+            dict: hits, misses, evictions, items and bytes, empty if the cache is disabled.
+        """
+        if self.metadata_cache is None:
+            return dict()
+        return self.metadata_cache.stats()
+
     def load_object_list(self, save = False):
         """Load object list.
         
@@ -41,6 +104,12 @@ class OCRTOC_Dataset():
         Returns:
             list, dict: object names and name-id mapping.
         """
+        if self.manifest is not None:
+            object_name_list = list(self.manifest['object_name_list'])
+            object_id_dict = dict()
+            for i in range(len(object_name_list)):
+                object_id_dict[object_name_list[i]] = i + 1
+            return object_name_list, object_id_dict
         if os.path.exists(os.path.join(self.root, 'object_name_list.txt')):
             f = open(os.path.join(self.root, 'object_name_list.txt'))
             object_name_list = f.readlines()
@@ -75,6 +144,8 @@ class OCRTOC_Dataset():
         Returns:
             list: scene names.
         """
+        if self.manifest is not None:
+            return list(self.manifest['scene_name_list'])
         scene_list_file_path = os.path.join(self.root, 'scene_name_list.txt')
         if not os.path.exists(scene_list_file_path):
             logger.warning("No existed scene list, generate scene list from scenes")
@@ -103,6 +174,12 @@ class OCRTOC_Dataset():
         Returns:
             int: images number in a scene.
         """
+        scene_manifest = self.load_scene_manifest(scene_id)
+        if scene_manifest is not None:
+            return scene_manifest['image_number']
+        packed_scene = self.load_packed_scene(scene_id)
+        if packed_scene is not None:
+            return len(packed_scene)
         return len(os.listdir(os.path.join(
             self.root,
             'scenes',
@@ -110,6 +187,19 @@ class OCRTOC_Dataset():
             'rgb_undistort'
         )))
     
+    def load_scene_manifest(self, scene_id):
+        """Load the manifest entry of a scene
+        
+        Args:
+            scene_id(int): scene index.
+        
+        Returns:
+            dict or None: None if the dataset has no up to date manifest of the scene.
+        """
+        if self.manifest is None:
+            return None
+        return self.manifest['scenes'].get(self.load_scene_name(scene_id))
+
     def load_scene_number(self):
         """Load total scenes number
         
@@ -166,6 +256,7 @@ class OCRTOC_Dataset():
                 'color_camK.npy'
             )
         )
+        import open3d as o3d
         param = o3d.camera.PinholeCameraParameters()
         param.extrinsic = np.eye(4,dtype=np.float64)
         param.intrinsic.set_intrinsics(
@@ -178,6 +269,7 @@ class OCRTOC_Dataset():
         )
         return param
     
+    @cached_loader(copy = np.copy)
     def load_real_camera_intrinsic(self, scene_id):
         """Load camera real intrinsic matrix
         
@@ -187,7 +279,10 @@ class OCRTOC_Dataset():
         Returns:
             np.ndarray: camera intrinsic matrix.
         """
-        return np.load(
+        scene_manifest = self.load_scene_manifest(scene_id)
+        if scene_manifest is not None:
+            return get_manifest_intrinsic(scene_manifest)
+        return load_npy(
             os.path.join(
                 self.root,
                 'scenes',
@@ -196,6 +291,100 @@ class OCRTOC_Dataset():
             )
         )
 
+    def pack_scene(self, scene_id, overwrite = False):
+        """Pack rgb, depth, segmentation masks and camera poses of a scene into
+        one memory mappable file which is used when the dataset is created with
+        packed = True.
+
+        Args:
+            scene_id(int): scene index.
+            overwrite(bool): rebuild the packed file if it already exists.
+
+        Returns:
+            str: path of the packed file.
+        """
+        self._packed_scenes.pop(scene_id, None)
+        return pack_scene(
+            os.path.join(self.root, 'scenes', self.load_scene_name(scene_id)),
+            len(os.listdir(os.path.join(
+                self.root,
+                'scenes',
+                self.load_scene_name(scene_id),
+                'rgb_undistort'
+            ))),
+            overwrite = overwrite
+        )
+
+    def compress_scene(self, scene_id, codec = None, overwrite = False):
+        """Write compressed depth images and segmentation masks next to the
+        original files of a scene, which are then preferred by the loaders.
+
+        Args:
+            scene_id(int): scene index.
+            codec(str or None): 'zstd', 'lz4' or 'zlib', the fastest installed by default.
+            overwrite(bool): rewrite compressed files which already exist.
+
+        Returns:
+            int: number of written files.
+        """
+        written = compress_scene(
+            os.path.join(self.root, 'scenes', self.load_scene_name(scene_id)),
+            self.load_scene_image_number(scene_id),
+            codec = codec,
+            overwrite = overwrite
+        )
+        for field in ['depth', 'mask']:
+            self._compressed_scenes.pop((scene_id, field), None)
+        return written
+
+    def has_compressed_frames(self, scene_id, field):
+        """Check once whether a scene has compressed frames of a field
+
+        The first frame is checked since compress_scene writes the frames in order,
+        the result is kept until clear_cache so that the loaders of uncompressed
+        scenes do not try to open a compressed file for each frame.
+
+        Args:
+            scene_id(int): scene index.
+            field(str): 'depth' or 'mask'.
+
+        Returns:
+            bool: True if the compressed file of the first frame exists.
+        """
+        key = (scene_id, field)
+        if key not in self._compressed_scenes:
+            self._compressed_scenes[key] = os.path.exists(get_compressed_path(
+                os.path.join(self.root, 'scenes', self.load_scene_name(scene_id)),
+                field,
+                0
+            ))
+        return self._compressed_scenes[key]
+
+    def load_packed_scene(self, scene_id):
+        """Load the packed file of a scene
+        
+        Args:
+            scene_id(int): scene index.
+        
+        Returns:
+            PackedScene or None: None if the dataset is not in packed mode or the
+            scene has not been packed.
+        """
+        if not self.packed:
+            return None
+        if scene_id not in self._packed_scenes:
+            pack_path = os.path.join(
+                self.root,
+                'scenes',
+                self.load_scene_name(scene_id),
+                PACKED_FILE_NAME
+            )
+            if os.path.exists(pack_path):
+                self._packed_scenes[scene_id] = PackedScene(pack_path)
+            else:
+                self._packed_scenes[scene_id] = None
+        return self._packed_scenes[scene_id]
+
     def load_raw_image(self, scene_id, image_id, order = 'RGB'):
         """Load color image
         
@@ -205,17 +394,22 @@ class OCRTOC_Dataset():
             order(str): RGB or BGR.
         
         Returns:
-            np.ndarray: color image.
+            np.ndarray: color image, read only for BGR order in packed mode.
         """
-        raw_bgr = cv2.imread(
-            os.path.join(
-                self.root,
-                'scenes',
-                self.load_scene_name(scene_id),
-                'rgb_undistort',
-                '%04d.png' % image_id
+        packed_scene = self.load_packed_scene(scene_id)
+        if packed_scene is not None:
+            with profile_stage('packed_read'):
+                raw_bgr = packed_scene.load('rgb', image_id)
+        else:
+            raw_bgr = read_image(
+                os.path.join(
+                    self.root,
+                    'scenes',
+                    self.load_scene_name(scene_id),
+                    'rgb_undistort',
+                    '%04d.png' % image_id
+                )
             )
-        )
         if order == 'BGR':
             return raw_bgr
         elif order == 'RGB':
@@ -231,9 +425,17 @@ class OCRTOC_Dataset():
             image_id(int): image index.
         
         Returns:
-            np.ndarray: depth image.
+            np.ndarray: depth image, read only in packed mode.
         """
-        depth = cv2.imread(
+        packed_scene = self.load_packed_scene(scene_id)
+        if packed_scene is not None:
+            with profile_stage('packed_read'):
+                return packed_scene.load('depth', image_id)
+        if self.has_compressed_frames(scene_id, 'depth'):
+            depth = load_compressed(os.path.join(self.root, 'scenes', self.load_scene_name(scene_id)), 'depth', image_id)
+            if depth is not None:
+                return depth
+        depth = read_image(
             os.path.join(
                 self.root,
                 'scenes',
@@ -253,9 +455,13 @@ class OCRTOC_Dataset():
             image_id(int): image index.
         
         Returns:
-            np.ndarray: camera pose with world frame.
+            np.ndarray: camera pose with world frame, read only in packed mode.
         """
-        return np.load(os.path.join(
+        packed_scene = self.load_packed_scene(scene_id)
+        if packed_scene is not None:
+            with profile_stage('packed_read'):
+                return packed_scene.load('pose', image_id)
+        return load_npy(os.path.join(
                 self.root,
                 'scenes',
                 self.load_scene_name(scene_id),
@@ -264,6 +470,7 @@ class OCRTOC_Dataset():
             )
         )
 
+    @cached_loader(copy = list)
     def load_scene_object_list(self, scene_id):
         """Load object list in a scene
         
@@ -273,6 +480,9 @@ class OCRTOC_Dataset():
         Returns:
             list: object name list.
         """
+        scene_manifest = self.load_scene_manifest(scene_id)
+        if scene_manifest is not None:
+            return list(scene_manifest['object_list'])
         f = open(
             os.path.join(
                 self.root,
@@ -287,6 +497,7 @@ class OCRTOC_Dataset():
             scene_object_name_list[i] = scene_object_name_list[i].strip()
         return scene_object_name_list
     
+    @cached_loader(copy = _copy_mesh)
     def load_object_mesh(self, model_name):
         """Load model mesh file
         
@@ -294,8 +505,10 @@ class OCRTOC_Dataset():
             model_name(str): model name.
         
         Returns:
-            o3d.geometry.TriangleMesh: model mesh.
+            o3d.geometry.TriangleMesh: model mesh, a copy of the cached mesh
+            which can be transformed freely.
         """
+        import open3d as o3d
         o3d_mesh = o3d.io.read_triangle_mesh(
             os.path.join(
                 self.root,
@@ -306,6 +519,42 @@ class OCRTOC_Dataset():
         return o3d_mesh
     
 
+    @cached_loader(copy = None)
+    def load_object_model_points(self, model_name, sample_number = 10000):
+        """Load points sampled uniformly on a model mesh
+
+        The samples are kept in the metadata cache and shared between calls, they are
+        also stored in the cache directory if the dataset has one. With
+        metadata_cache_items = 0 the samples are no longer reused and each call
+        samples the mesh again unless the cache directory holds them.
+
+        Args:
+            model_name(str): model name.
+            sample_number(int): number of sampled points.
+
+        Returns:
+            np.ndarray(N, 3), np.ndarray(N, 3): read only float32 points and colors,
+            colors are empty if the mesh has no vertex colors.
+        """
+        mesh_path = os.path.join(self.root, 'rgb_pcd', '{}.ply'.format(model_name))
+        params = {'sample_number': sample_number}
+        arrays = None
+        if self.scene_cloud_cache is not None:
+            signature = get_source_signature([mesh_path])
+            arrays = self.scene_cloud_cache.load_arrays('model_{}'.format(model_name), params, signature)
+        if arrays is None:
+            pcd = self.load_object_mesh(model_name).sample_points_uniformly(sample_number)
+            points = np.asarray(pcd.points, dtype = np.float32)
+            colors = np.asarray(pcd.colors, dtype = np.float32).reshape(-1, 3)
+            if self.scene_cloud_cache is not None:
+                self.scene_cloud_cache.save_arrays('model_{}'.format(model_name), params, signature, points, colors)
+        else:
+            points, colors = arrays
+        points.flags.writeable = False
+        colors.flags.writeable = False
+        return points, colors
+
+    @cached_loader(copy = _copy_object_pose_dict)
     def load_object_pose_dict(self, scene_id):
         """load object pose in each image
         
@@ -316,6 +565,7 @@ class OCRTOC_Dataset():
             dict: object poses.
         """
         object_pose_dict = dict()
+        scene_manifest = self.load_scene_manifest(scene_id)
         for object_name in self.load_scene_object_list(scene_id):
             pose_file_path = os.path.join(
                     self.root,
@@ -324,8 +574,12 @@ class OCRTOC_Dataset():
                     'object_poses',
                     object_name+'.npy'
                 )
-            if os.path.exists(pose_file_path):
-                object_pose_dict[object_name] = np.load(pose_file_path)
+            if scene_manifest is not None:
+                pose_exists = object_name in scene_manifest['posed_objects']
+            else:
+                pose_exists = os.path.exists(pose_file_path)
+            if pose_exists:
+                object_pose_dict[object_name] = load_npy(pose_file_path)
             else:
                 object_pose_dict[object_name] = None
         return object_pose_dict
@@ -338,8 +592,16 @@ class OCRTOC_Dataset():
             image_id(int): image index.
 
         Returns:
-            np.ndarray: segmentation mask.
+            np.ndarray: segmentation mask, read only in packed mode.
         """
+        packed_scene = self.load_packed_scene(scene_id)
+        if packed_scene is not None:
+            with profile_stage('packed_read'):
+                return packed_scene.load('mask', image_id)
+        if self.has_compressed_frames(scene_id, 'mask'):
+            seg_mask = load_compressed(os.path.join(self.root, 'scenes', self.load_scene_name(scene_id)), 'mask', image_id)
+            if seg_mask is not None:
+                return seg_mask
         seg_mask_path = os.path.join(
                 self.root,
                 'scenes',
@@ -347,7 +609,303 @@ class OCRTOC_Dataset():
                 'seg_masks',
                 '%04d.npy' % image_id
             )
-        return np.load(seg_mask_path)
+        return load_npy(seg_mask_path)
+
+    def load_visibility_index(self):
+        """Load the visibility index built by ocrtoc_dataset_toolkit.tools.build_visibility_index
+
+        The scenes whose masks changed since the index was built are recomputed.
+
+        Returns:
+            VisibilityIndex: the index.
+        """
+        if self._visibility_index is None:
+            self._visibility_index = load_visibility_index(self.root, dataset = self)
+            if self._visibility_index is None:
+                raise FileNotFoundError('No up to date visibility index in {}, build it with '
+                    'ocrtoc_dataset_toolkit.tools.build_visibility_index'.format(self.root))
+        return self._visibility_index
+
+    def query_object_frames(self, object_name, min_visibility = 0.0, min_pixels = 1, scene_ids = None):
+        """Find the frames showing an object
+
+        Args:
+            object_name(str): object name.
+            min_visibility(float): minimum ratio between the pixel count of the object
+                and its largest pixel count in the scene.
+            min_pixels(int): minimum pixel count.
+            scene_ids(list of int or None): scenes to search, all scenes if None.
+
+        Returns:
+            np.ndarray: records with scene_id, image_id, object_id, pixel_count,
+            bbox as (x_min, y_min, x_max, y_max) and visibility fields.
+        """
+        if object_name not in self.object_id_dict:
+            raise ValueError('Unknown object {}'.format(object_name))
+        return self.load_visibility_index().query(
+            object_id = self.object_id_dict[object_name],
+            min_visibility = min_visibility,
+            min_pixels = min_pixels,
+            scene_ids = scene_ids
+        )
+
+    def load_frame_objects(self, scene_id, image_id):
+        """Load the pixel counts, bounding boxes and visibility of the objects in a frame from the visibility index
+
+        Args:
+            scene_id(int): scene index.
+            image_id(int): image index.
+
+        Returns:
+            dict: object name to a dict of pixel_count, bbox as (x_min, y_min, x_max, y_max) and visibility.
+        """
+        frame_objects = dict()
+        for record in self.load_visibility_index().frame_records(scene_id, image_id):
+            frame_objects[self.object_name_list[record['object_id'] - 1]] = {
+                'pixel_count': int(record['pixel_count']),
+                'bbox': record['bbox'].tolist(),
+                'visibility': float(record['visibility']),
+            }
+        return frame_objects
+
+    def load_object_crops(self, scene_id, image_id, object_names = None, padding = 0):
+        """Load the crops and the partial point clouds of the objects in an image
+
+        The image is decoded once for all the objects and only the pixels of each
+        object bounding box are back-projected.
+
+        Args:
+            scene_id(int): scene index.
+            image_id(int): image index.
+            object_names(list of str or None): objects, all the scene objects if None.
+            padding(int): pixels added around the object bounding boxes.
+
+        Returns:
+            list of dict: one dict per visible object with scene_id, image_id, object_name,
+            bbox as (x_min, y_min, x_max, y_max) with inclusive bounds, rgb, depth and bool mask crops,
+            intrinsics of the crop, camera_pose, float32 points_camera, points_world and colors
+            of the object pixels, and object_pose and object_pose_camera, None if the object has no pose.
+        """
+        object_names = self.load_scene_object_list(scene_id) if object_names is None else object_names
+        for object_name in object_names:
+            if object_name not in self.object_id_dict:
+                raise ValueError('Unknown object {}'.format(object_name))
+        seg_mask = self.load_seg_mask(scene_id, image_id)
+        rgb_image = self.load_raw_image(scene_id, image_id, order = 'RGB')
+        depth = self.load_depth_image(scene_id, image_id)
+        intrinsics = self.load_real_camera_intrinsic(scene_id)
+        camera_pose = self.load_camera_pose(scene_id, image_id)
+        object_pose_dict = self.load_object_pose_dict(scene_id)
+        height, width = seg_mask.shape[:2]
+        crops = []
+        for object_name in object_names:
+            rows, cols = np.nonzero(seg_mask == self.object_id_dict[object_name])
+            if len(rows) == 0:
+                continue
+            x_min, y_min = max(cols.min() - padding, 0), max(rows.min() - padding, 0)
+            x_max, y_max = min(cols.max() + padding, width - 1), min(rows.max() + padding, height - 1)
+            mask = seg_mask[y_min:y_max + 1, x_min:x_max + 1] == self.object_id_dict[object_name]
+            # depth_to_points crops the full frame images to the roi itself
+            points_camera, colors = depth_to_points(
+                depth = depth,
+                intrinsics = intrinsics,
+                depth_scale = 1000.0,
+                rgb = rgb_image,
+                roi = (x_min, y_min, x_max + 1, y_max + 1),
+                pixel_mask = mask
+            )
+            crop_intrinsics = np.array(intrinsics, dtype = np.float64)
+            crop_intrinsics[0, 2] -= x_min
+            crop_intrinsics[1, 2] -= y_min
+            object_pose = object_pose_dict.get(object_name)
+            crops.append({
+                'scene_id': scene_id,
+                'image_id': image_id,
+                'object_name': object_name,
+                'bbox': (int(x_min), int(y_min), int(x_max), int(y_max)),
+                'rgb': np.array(rgb_image[y_min:y_max + 1, x_min:x_max + 1]),
+                'depth': np.array(depth[y_min:y_max + 1, x_min:x_max + 1]),
+                'mask': mask,
+                'intrinsics': crop_intrinsics,
+                'camera_pose': np.array(camera_pose),
+                'points_camera': points_camera,
+                'points_world': transform_points(points_camera, camera_pose),
+                'colors': colors,
+                'object_pose': object_pose,
+                'object_pose_camera': None if object_pose is None else np.linalg.inv(camera_pose) @ object_pose,
+            })
+        return crops
+
+    def load_object_crop(self, scene_id, image_id, object_name, padding = 0):
+        """Load the crops and the partial point cloud of an object in an image
+
+        Args:
+            scene_id(int): scene index.
+            image_id(int): image index.
+            object_name(str): object name.
+            padding(int): pixels added around the object bounding box.
+
+        Returns:
+            dict or None: see :meth:`load_object_crops`, None if the object is not visible.
+        """
+        crops = self.load_object_crops(scene_id, image_id, [object_name], padding = padding)
+        return crops[0] if len(crops) > 0 else None
+
+    def iter_object_crops(self, scene_ids = None, object_names = None, min_visibility = 0.0, min_pixels = 1,
+        padding = 0, workers = None, worker_type = 'thread'):
+        """Iterate over the crops of the objects in all the images
+
+        The visible objects of each image are taken from the visibility index when it
+        has been built, otherwise every object of the scene object list is tried.
+
+        Args:
+            scene_ids(list of int or None): scenes, all scenes if None.
+            object_names(list of str or None): objects, all objects if None.
+            min_visibility(float): minimum visibility ratio, needs the visibility index.
+            min_pixels(int): minimum pixel count of the objects.
+            padding(int): pixels added around the object bounding boxes.
+            workers(int or None): number of workers loading whole images, None for serial loading.
+            worker_type(str): 'thread' or 'process'.
+
+        Yields:
+            dict: crops of :meth:`load_object_crops` in scene and image order.
+        """
+        scene_ids = list(range(self.load_scene_number())) if scene_ids is None else list(scene_ids)
+        if object_names is not None:
+            object_names = list(object_names)
+            for object_name in object_names:
+                if object_name not in self.object_id_dict:
+                    raise ValueError('Unknown object {}'.format(object_name))
+        try:
+            index = self.load_visibility_index()
+        except FileNotFoundError:
+            if min_visibility > 0:
+                raise
+            index = None
+        if index is not None:
+            records = index.query(min_visibility = min_visibility, min_pixels = min_pixels, scene_ids = scene_ids)
+            if object_names is not None:
+                records = records[np.isin(records['object_id'], [self.object_id_dict[name] for name in object_names])]
+            # records are sorted by scene and image, group them by image
+            frame_starts = np.flatnonzero(np.diff(records['scene_id']) | np.diff(records['image_id'])) + 1
+            tasks = (
+                (
+                    int(frame_records['scene_id'][0]),
+                    int(frame_records['image_id'][0]),
+                    [self.object_name_list[object_id - 1] for object_id in frame_records['object_id']],
+                    padding
+                )
+                for frame_records in np.split(records, frame_starts) if len(frame_records) > 0
+            )
+        else:
+            tasks = (
+                (scene_id, image_id, object_names, padding)
+                for scene_id in scene_ids
+                for image_id in range(self.load_scene_image_number(scene_id))
+            )
+        for crops in imap_ordered(self.load_object_crops, tasks, workers = workers, worker_type = worker_type):
+            for crop in crops:
+                if crop['mask'].sum() >= min_pixels:
+                    yield crop
+
+    def _load_frame_field_into(self, scene_id, image_id, field, out, order):
+        """Load a field of an image into a preallocated array"""
+        if field == 'rgb':
+            bgr = self.load_raw_image(scene_id, image_id, order = 'BGR')
+            if bgr.shape != out.shape or out.dtype != bgr.dtype:
+                # cv2 would silently allocate a new destination
+                raise ValueError('Buffer of field rgb has dtype {} and shape {}, expected {} and {}'.format(
+                    out.dtype, out.shape, bgr.dtype, bgr.shape))
+            if order == 'RGB':
+                cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB, dst = out)
+            else:
+                out[...] = bgr
+        elif field == 'depth':
+            out[...] = self.load_depth_image(scene_id, image_id)
+        elif field == 'mask':
+            out[...] = self.load_seg_mask(scene_id, image_id)
+        elif field == 'pose':
+            out[...] = self.load_camera_pose(scene_id, image_id)
+        else:
+            raise ValueError('Unknown field {}, only rgb, depth, mask and pose are allowed.'.format(field))
+
+    def load_frames(self, scene_id, image_ids, fields = ('rgb', 'depth', 'mask', 'pose'), out = None,
+        order = 'RGB', workers = 4):
+        """Load several images of a scene into stacked arrays
+
+        Images are decoded in a thread pool directly into the output arrays.
+
+        Args:
+            scene_id(int): scene index.
+            image_ids(list of int): image indices.
+            fields(tuple of str): fields among 'rgb', 'depth', 'mask' and 'pose'.
+            out(dict or None): preallocated arrays of some fields, with the length
+                of image_ids as first dimension.
+            order(str): RGB or BGR.
+            workers(int or None): number of decoding threads, None for serial loading.
+
+        Returns:
+            dict: field to stacked array, (N, H, W, 3) for rgb, (N, H, W) for
+            depth and mask and (N, 4, 4) for pose.
+        """
+        if order not in ('RGB', 'BGR'):
+            raise ValueError('Unknown order {}, only RGB and BGR are allowed.'.format(order))
+        image_ids = list(image_ids)
+        out = dict() if out is None else dict(out)
+        if len(image_ids) == 0:
+            return out
+        # the first image gives the shape and dtype of the fields without a buffer
+        first_loaders = {
+            'rgb': lambda: self.load_raw_image(scene_id, image_ids[0], order = order),
+            'depth': lambda: self.load_depth_image(scene_id, image_ids[0]),
+            'mask': lambda: self.load_seg_mask(scene_id, image_ids[0]),
+            'pose': lambda: self.load_camera_pose(scene_id, image_ids[0]),
+        }
+        tasks = []
+        for field in fields:
+            if field not in first_loaders:
+                raise ValueError('Unknown field {}, only rgb, depth, mask and pose are allowed.'.format(field))
+            if field in out:
+                if len(out[field]) != len(image_ids):
+                    raise ValueError('Buffer of field {} has length {}, expected {}'.format(
+                        field, len(out[field]), len(image_ids)))
+                start = 0
+            else:
+                first = first_loaders[field]()
+                out[field] = np.empty((len(image_ids),) + first.shape, dtype = first.dtype)
+                out[field][0] = first
+                start = 1
+            for index in range(start, len(image_ids)):
+                tasks.append((scene_id, image_ids[index], field, out[field][index], order))
+
+        if workers is None or workers <= 1:
+            for task in tasks:
+                self._load_frame_field_into(*task)
+        else:
+            with get_executor(workers, 'thread') as executor:
+                for future in [executor.submit(self._load_frame_field_into, *task) for task in tasks]:
+                    future.result()
+        return out
+
+    def aiter_frames(self, scene_ids = None, fields = ('rgb', 'depth', 'mask', 'pose', 'intrinsics'),
+        concurrency = 16, ordered = True):
+        """Asynchronously iterate over frames with many reads in flight
+
+        See :func:`ocrtoc_dataset_toolkit.frame_dataset.aiter_frames`, use it as
+        `async for frame in dataset.aiter_frames(scene_ids)`.
+
+        Args:
+            scene_ids(list of int or None): scenes, all scenes by default.
+            fields(tuple of str): fields among 'rgb', 'depth', 'mask', 'pose' and 'intrinsics'.
+            concurrency(int): frames loaded at the same time.
+            ordered(bool): yield the frames in scene and image order, otherwise as soon as they are loaded.
+
+        Returns:
+            async generator: dicts of scene_id, image_id and the requested fields.
+        """
+        # frame_dataset imports torch when it is installed
+        from .frame_dataset import aiter_frames
+        return aiter_frames(self, scene_ids = scene_ids, fields = fields, concurrency = concurrency, ordered = ordered)
 
     def load_point_cloud(self, scene_id, image_id):
         """Load partial view point cloud
@@ -359,45 +917,326 @@ class OCRTOC_Dataset():
         Returns:
             o3d.geometry.PointCloud: partial view point cloud.
         """
-        pcd = generate_scene_pointcloud(
-            depth_path = os.path.join(
-                self.root,
-                'scenes',
-                self.load_scene_name(scene_id),
-                'depth_undistort',
-                '%04d.png' % image_id
-            ),
-            rgb_path = os.path.join(
-                self.root,
-                'scenes',
-                self.load_scene_name(scene_id),
-                'rgb_undistort',
-                '%04d.png' % image_id
-            ),
+        return points_to_pointcloud(*self.load_point_cloud_array(scene_id, image_id, dtype = np.float64))
+
+    def load_point_cloud_array(self, scene_id, image_id, dtype = np.float32, with_colors = True,
+        organized = False, depth_range = None, roi = None):
+        """Load partial view points and colors as arrays, in camera frame
+
+        The RGB image is not decoded when colors are not requested.
+
+        Args:
+            scene_id(int): scene index.
+            image_id(int): image index.
+            dtype(np.dtype): dtype of the points and colors.
+            with_colors(bool): also return the colors.
+            organized(bool): return (H, W, 3) arrays, invalid pixels get zero points.
+            depth_range(tuple of float or None): (min, max) depth in meters of the kept pixels.
+            roi(tuple of int or None): (x_min, y_min, x_max, y_max) pixel box of the kept pixels.
+
+        Returns:
+            np.ndarray(N, 3), np.ndarray(N, 3) or None: points and colors in [0, 1].
+        """
+        points, colors = depth_to_points(
+            depth = self.load_depth_image(scene_id, image_id),
             intrinsics = self.load_real_camera_intrinsic(scene_id),
-            depth_scale = 1000.0
+            depth_scale = 1000.0,
+            rgb = self.load_raw_image(scene_id, image_id, order = 'RGB') if with_colors else None,
+            depth_range = depth_range,
+            roi = roi,
+            organized = organized
+        )
+        points = points.astype(dtype, copy = False)
+        if colors is not None:
+            colors = colors.astype(dtype, copy = False)
+        return points, colors
+
+    def _load_world_view(self, scene_id, image_id, with_colors = True):
+        """Load the float64 points and colors of an image in world frame"""
+        points, colors = self.load_point_cloud_array(scene_id, image_id, dtype = np.float64, with_colors = with_colors)
+        camera_pose = self.load_camera_pose(scene_id = scene_id, image_id = image_id)
+        return transform_points(points, camera_pose), colors
+
+    def _load_depth_frame(self, scene_id, image_id):
+        """Load the depth, intrinsics and camera pose of an image for the multiview outlier filter"""
+        return (
+            self.load_depth_image(scene_id, image_id),
+            self.load_real_camera_intrinsic(scene_id),
+            self.load_camera_pose(scene_id, image_id)
         )
-        return pcd
 
-    def load_scene_point_cloud(self, scene_id):
+    def _load_fusion_frame(self, scene_id, image_id, with_colors = True):
+        """Load the depth, rgb, intrinsics and camera pose of an image for tsdf fusion"""
+        return (
+            self.load_depth_image(scene_id, image_id),
+            self.load_raw_image(scene_id, image_id, order = 'RGB') if with_colors else None,
+            self.load_real_camera_intrinsic(scene_id),
+            self.load_camera_pose(scene_id, image_id)
+        )
+
+    def _load_scene_source_signature(self, scene_id, image_ids):
+        """Signature of the files a scene point cloud is reconstructed from"""
+        scene_dir = os.path.join(self.root, 'scenes', self.load_scene_name(scene_id))
+        paths = [os.path.join(scene_dir, 'color_camK.npy')]
+        if self.load_packed_scene(scene_id) is not None:
+            paths.append(os.path.join(scene_dir, PACKED_FILE_NAME))
+        else:
+            has_compressed_depth = self.has_compressed_frames(scene_id, 'depth')
+            for image_id in image_ids:
+                paths.append(os.path.join(scene_dir, 'rgb_undistort', '%04d.png' % image_id))
+                paths.append(os.path.join(scene_dir, 'depth_undistort', '%04d.png' % image_id))
+                paths.append(os.path.join(scene_dir, 'camera_poses', '%04d.npy' % image_id))
+                if has_compressed_depth:
+                    # load_depth_image reads the compressed depth when it exists
+                    paths.append(get_compressed_path(scene_dir, 'depth', image_id))
+        signature = get_source_signature(paths)
+        signature['image_number'] = len(image_ids)
+        return signature
+
+    def load_scene_point_cloud(self, scene_id, workers = None, worker_type = 'thread',
+        image_stride = 4, voxel_size = default_voxel_size, outlier_neighbors = default_outlier_neighbors,
+        outlier_std_ratio = default_outlier_std_ratio, use_cache = True, fusion = 'voxel', sdf_trunc = None,
+        min_weight = default_min_weight, outlier_filter = 'statistical', outlier_params = None):
         """Load full view scene point cloud
         
+        See :meth:`load_scene_point_cloud_array` for the arguments.
+
+        Returns:
+            o3d.geometry.PointCloud: Reconstructed point cloud.
+        """
+        points, colors = self.load_scene_point_cloud_array(
+            scene_id,
+            workers = workers,
+            worker_type = worker_type,
+            image_stride = image_stride,
+            voxel_size = voxel_size,
+            outlier_neighbors = outlier_neighbors,
+            outlier_std_ratio = outlier_std_ratio,
+            use_cache = use_cache,
+            dtype = np.float64,
+            fusion = fusion,
+            sdf_trunc = sdf_trunc,
+            min_weight = min_weight,
+            outlier_filter = outlier_filter,
+            outlier_params = outlier_params
+        )
+        return points_to_pointcloud(points, colors)
+
+    def load_scene_point_cloud_array(self, scene_id, workers = None, worker_type = 'thread',
+        image_stride = 4, voxel_size = default_voxel_size, outlier_neighbors = default_outlier_neighbors,
+        outlier_std_ratio = default_outlier_std_ratio, use_cache = True, dtype = np.float32, with_colors = True,
+        fusion = 'voxel', sdf_trunc = None, min_weight = default_min_weight, outlier_filter = 'statistical',
+        outlier_params = None):
+        """Load full view scene points and colors as arrays, in world frame
+
+        With the 'voxel' fusion engine the back-projected views are voxel downsampled
+        and outliers are removed, see :func:`get_inlier_mask` for the filters. With the 'tsdf' engine the frames are
+        integrated into a sparse :class:`TSDFVolume` whose memory is bounded by the
+        occupied scene volume, which makes fusing all the frames practical.
+        
         Args:
             scene_id(int): scene index.
+            workers(int or None): number of workers loading and back-projecting
+                the images in parallel, None for serial loading.
+            worker_type(str): 'thread' or 'process'.
+            image_stride(int): one in image_stride images is used.
+            voxel_size(float): voxel size.
+            outlier_neighbors(int): neighbors of the statistical outlier removal.
+            outlier_std_ratio(float): standard deviation ratio of the statistical outlier removal.
+            use_cache(bool): read and write the scene cloud cache if the dataset has a cache_dir.
+            dtype(np.dtype): dtype of the points and colors.
+            with_colors(bool): also return the colors, the RGB images are not decoded otherwise.
+            fusion(str): fusion engine, 'voxel' or 'tsdf'.
+            sdf_trunc(float or None): tsdf truncation distance, four voxels by default.
+            min_weight(float): minimum number of observations of the tsdf voxels.
+            outlier_filter(str): 'statistical', 'voxel_count', 'radius', 'multiview' or 'none',
+                'voxel_count' is a much faster replacement of the default 'statistical'.
+            outlier_params(dict or None): keyword arguments of the filters other than 'statistical'.
         
         Returns:
-            o3d.geometry.PointCloud: Reconstructed point cloud.
+            np.ndarray(N, 3), np.ndarray(N, 3) or None: points and colors in [0, 1].
         """
-        pcds = []
-        # one in four of the scenes are used to calculate the full scene
-        for image_id in range(0, self.load_scene_image_number(scene_id), 4):
-            income_pcd = self.load_point_cloud(scene_id = scene_id, image_id = image_id)
-            camera_pose = self.load_camera_pose(scene_id = scene_id, image_id = image_id)
-            income_pcd.transform(camera_pose)                
-            pcds.append(income_pcd)
-        full_pcd = combine(pcds)
-        return full_pcd
+        # one in four of the scenes are used to calculate the full scene by default
+        image_ids = range(0, self.load_scene_image_number(scene_id), image_stride)
+        if fusion == 'voxel':
+            fusion_params = {
+                'voxel_size': voxel_size,
+                'outlier_neighbors': outlier_neighbors,
+                'outlier_std_ratio': outlier_std_ratio,
+            }
+            cache_params = dict(fusion_params, image_stride = image_stride)
+            if outlier_filter != 'statistical':
+                # statistical entries keep their parameters so that existing entries stay valid
+                fusion_params.update(outlier_filter = outlier_filter, outlier_params = outlier_params)
+                cache_params = dict(fusion_params, image_stride = image_stride)
+                if outlier_filter == 'voxel_count' and 'min_points' not in (outlier_params or dict()):
+                    # entries of the former fixed default threshold are not reused
+                    cache_params['voxel_count_threshold'] = 'density'
+        elif fusion == 'tsdf':
+            fusion_params = {
+                'voxel_size': voxel_size,
+                'sdf_trunc': sdf_trunc,
+                'min_weight': min_weight,
+            }
+            cache_params = dict(fusion_params, image_stride = image_stride, fusion = fusion)
+        else:
+            raise ValueError('Unknown fusion engine {}, only {} are allowed.'.format(fusion, FUSION_ENGINES))
+        use_cache = use_cache and self.scene_cloud_cache is not None
+        if use_cache:
+            with profile_stage('scene_cache_load'):
+                signature = self._load_scene_source_signature(scene_id, image_ids)
+                arrays = self.scene_cloud_cache.load_arrays(self.load_scene_name(scene_id), cache_params, signature)
+            profile_count('scene_cache_misses' if arrays is None else 'scene_cache_hits')
+            if arrays is not None:
+                points, colors = arrays
+                colors = colors.astype(dtype, copy = False) if with_colors and len(colors) > 0 else None
+                return points.astype(dtype, copy = False), colors
+        # views and frames are fused one by one in image order, so the result does
+        # not depend on the number of workers
+        if fusion == 'voxel':
+            views = imap_ordered(
+                self._load_world_view,
+                ((scene_id, image_id, with_colors) for image_id in image_ids),
+                workers = workers,
+                worker_type = worker_type
+            )
+            frames = None
+            if outlier_filter == 'multiview':
+                frames = imap_ordered(
+                    self._load_depth_frame,
+                    ((scene_id, image_id) for image_id in image_ids),
+                    workers = workers,
+                    worker_type = worker_type
+                )
+            points, colors = combine_views(views, frames = frames, **fusion_params)
+        else:
+            frames = imap_ordered(
+                self._load_fusion_frame,
+                ((scene_id, image_id, with_colors) for image_id in image_ids),
+                workers = workers,
+                worker_type = worker_type
+            )
+            points, colors = tsdf_fusion(frames, **fusion_params)
+        # depth only reconstructions are not cached as they would shadow the colored entry
+        if use_cache and with_colors:
+            with profile_stage('scene_cache_save'):
+                self.scene_cloud_cache.save_arrays(self.load_scene_name(scene_id), cache_params, signature,
+                    points, np.zeros((0, 3)) if colors is None else colors)
+        points = points.astype(dtype, copy = False)
+        if colors is not None:
+            colors = colors.astype(dtype, copy = False)
+        return points, colors
     
+    def project_scene_objects(self, scene_id, image_ids = None, mode = 'points', keypoints = None,
+        sample_number = 1000, occlusion = False, depth_tolerance = 0.01):
+        """Project the posed objects of a scene into its images
+
+        All the images of an object are projected in one batched computation,
+        without rendering.
+
+        Args:
+            scene_id(int): scene index.
+            image_ids(list of int or None): images, all the images if None.
+            mode(str): 'points' projects points sampled on the models, 'corners' the
+                corners of the model bounding boxes and 'keypoints' the given keypoints.
+            keypoints(dict or None): object name to (K, 3) keypoints in object frame for the 'keypoints' mode.
+            sample_number(int): points sampled on the models for the 'points' and 'corners' modes.
+            occlusion(bool): test the projected points against the depth images.
+            depth_tolerance(float): points up to this distance behind the measured depth are visible.
+
+        Returns:
+            dict: object name to a dict of uv(F, K, 2) pixel coordinates, depths(F, K) in meters,
+            visible(F, K) bool, boxes(F, 4) of the points in front of the camera and visible_boxes(F, 4)
+            of the visible points, boxes are (x_min, y_min, x_max, y_max) and nan for empty frames.
+        """
+        if mode not in PROJECTION_MODES:
+            raise ValueError('Unknown mode {}, only {} are allowed.'.format(mode, PROJECTION_MODES))
+        if mode == 'keypoints' and keypoints is None:
+            raise ValueError('The keypoints mode needs keypoints')
+        image_ids = list(range(self.load_scene_image_number(scene_id))) if image_ids is None else list(image_ids)
+        camera_poses = np.stack([self.load_camera_pose(scene_id, image_id) for image_id in image_ids])
+        intrinsics = self.load_real_camera_intrinsic(scene_id)
+        if occlusion:
+            depth_images = self.load_frames(scene_id, image_ids, fields = ('depth',))['depth']
+            image_shape = depth_images.shape[1:]
+        else:
+            depth_images = None
+            image_shape = self.load_depth_image(scene_id, image_ids[0]).shape
+        projections = dict()
+        for object_name, object_pose in self.load_object_pose_dict(scene_id).items():
+            if object_pose is None:
+                continue
+            if mode == 'keypoints':
+                if object_name not in keypoints:
+                    continue
+                points = np.asarray(keypoints[object_name])
+            else:
+                points = self.load_object_model_points(object_name, sample_number = sample_number)[0]
+                if mode == 'corners':
+                    points = get_bbox_corners(points)
+            uv, depths = project_points(points, object_pose, camera_poses, intrinsics)
+            visible = get_visibility(uv, depths, image_shape, depth_images, depth_tolerance = depth_tolerance)
+            projections[object_name] = {
+                'uv': uv,
+                'depths': depths,
+                'visible': visible,
+                'boxes': get_boxes(uv, depths > 0, image_shape),
+                'visible_boxes': get_boxes(uv, visible, image_shape),
+            }
+        return projections
+
+    def render_2d_pose(self, scene_id, image_id):
+        """Render the segmentation mask of the scene objects over an image
+
+        Args:
+            scene_id(int): the id of the scene.
+            image_id(int): the id of the image.
+
+        Returns:
+            np.array: BGR image, each object blended with a fixed color.
+        """
+        object_ids = [
+            self.object_id_dict[scene_object_name]
+            for scene_object_name in self.load_scene_object_list(scene_id)
+        ]
+        return overlay_seg_mask(
+            self.load_raw_image(scene_id, image_id, order = 'BGR'),
+            self.load_seg_mask(scene_id, image_id),
+            object_ids
+        )
+
+    def render_3d_pose(self, scene_id, image_id = None, sample_number = 10000):
+        """Build a point cloud of a scene or an image with the posed object models
+
+        Args:
+            scene_id(int): the id of the scene.
+            image_id(int or None): the id of the image, None for the whole scene.
+            sample_number(int): points sampled on each object model.
+
+        Returns:
+            o3d.geometry.PointCloud: the point cloud in world frame.
+        """
+        if image_id is not None:
+            points, colors = self._load_world_view(scene_id, image_id)
+        else:
+            scene_pcd = self.load_scene_point_cloud(scene_id)
+            points, colors = np.asarray(scene_pcd.points), np.asarray(scene_pcd.colors)
+        points_list, colors_list = [points], [colors]
+        object_pose_dict = self.load_object_pose_dict(scene_id)
+        for scene_object_name in self.load_scene_object_list(scene_id):
+            if object_pose_dict.get(scene_object_name) is None:
+                continue
+            model_points, model_colors = self.load_object_model_points(scene_object_name, sample_number)
+            points_list.append(transform_points(model_points, object_pose_dict[scene_object_name]))
+            if len(model_colors) == 0:
+                model_colors = np.zeros(model_points.shape, dtype = np.float32)
+            colors_list.append(model_colors)
+        # one allocation for the merged cloud
+        return points_to_pointcloud(
+            np.concatenate(points_list, dtype = np.float64),
+            np.concatenate(colors_list, dtype = np.float64)
+        )
+
     def vis_6dpose(self, scene_id, image_id = None, dimension = 3, show = True):
         """Visualize 6d pose annotation in a scene or in an image
 
@@ -413,39 +1252,19 @@ class OCRTOC_Dataset():
         """
         if dimension == 2:
             if image_id is not None:
-                bgr = self.load_raw_image(scene_id, image_id, order = 'BGR')
-                mask = self.load_seg_mask(scene_id, image_id)
-                scene_object_list = self.load_scene_object_list(scene_id)
-                for scene_object_name in scene_object_list:
-                    object_id = self.object_id_dict[scene_object_name]
-                    instance_mask = mask == object_id
-                    bgr[instance_mask] = bgr[instance_mask] // 2 + get_random_color() // 2
+                bgr = self.render_2d_pose(scene_id, image_id)
                 if show:
+                    # pyplot selects a GUI backend, import it only when showing
+                    import matplotlib.pyplot as plt
                     plt.imshow(cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB))
                     plt.show()
                 return bgr
             else:
                 raise ValueError('The image id must be given for 2d visualization')
         elif dimension == 3:
-            geometry_list = []
-            if image_id is not None:
-                image_pcd = self.load_point_cloud(scene_id, image_id)
-                camera_pose = self.load_camera_pose(scene_id, image_id)
-                image_pcd.transform(camera_pose)
-                geometry_list.append(image_pcd)
-            else:
-                scene_pcd = self.load_scene_point_cloud(scene_id)
-                geometry_list.append(scene_pcd)
-            object_pose_dict = self.load_object_pose_dict(scene_id)
-            scene_object_list = self.load_scene_object_list(scene_id)
-            for scene_object_name in scene_object_list:
-                if (scene_object_name in object_pose_dict.keys()) and (object_pose_dict[scene_object_name] is not None):
-                    o3d_mesh = self.load_object_mesh(scene_object_name)
-                    sixd_pose = object_pose_dict[scene_object_name]
-                    o3d_mesh.transform(sixd_pose)
-                    geometry_list.append(o3d_mesh.sample_points_uniformly(10000))
-            full_pcd = merge_pcds(geometry_list)
+            full_pcd = self.render_3d_pose(scene_id, image_id)
             if show:
+                import open3d as o3d
                 o3d.visualization.draw_geometries([full_pcd])
             return full_pcd
         else:
@@ -0,0 +1,19 @@
+import argparse
+
+from ..ocrtoc_dataset import OCRTOC_Dataset
+from ..utils.logging import get_main_logger
+from ..utils.manifest import build_manifest, save_manifest
+
+logger = get_main_logger()
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Build the dataset manifest used to skip directory scans at startup')
+    parser.add_argument('--dataset_root', required = True, help = 'Dataset root directory')
+    FLAGS = parser.parse_args()
+
+    dataset = OCRTOC_Dataset(root = FLAGS.dataset_root, use_manifest = False)
+    manifest_path = save_manifest(FLAGS.dataset_root, build_manifest(dataset))
+    logger.info('manifest of {} scenes saved to {}'.format(dataset.load_scene_number(), manifest_path))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+import os
+import argparse
+
+from ..ocrtoc_dataset import OCRTOC_Dataset
+from ..utils.logging import get_main_logger
+from ..utils.parallel import imap_ordered
+from ..utils.fusion import FUSION_ENGINES
+
+logger = get_main_logger()
+
+def build_scene_cache(dataset, scene_id, image_stride, fusion):
+    pcd = dataset.load_scene_point_cloud(scene_id, image_stride = image_stride, fusion = fusion)
+    return scene_id, len(pcd.points)
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Prebuild the scene point cloud cache')
+    parser.add_argument('--dataset_root', required = True, help = 'Dataset root directory')
+    parser.add_argument('--cache_dir', required = True, help = 'Cache directory')
+    parser.add_argument('--workers', type = int, default = os.cpu_count(), help = 'Number of worker processes')
+    parser.add_argument('--packed', action = 'store_true', help = 'Read frames from packed scene files')
+    parser.add_argument('--image_stride', type = int, default = 4, help = 'One in image_stride images is fused')
+    parser.add_argument('--fusion', default = 'voxel', choices = FUSION_ENGINES, help = 'Fusion engine')
+    FLAGS = parser.parse_args()
+
+    dataset = OCRTOC_Dataset(root = FLAGS.dataset_root, packed = FLAGS.packed, cache_dir = FLAGS.cache_dir)
+    results = imap_ordered(
+        build_scene_cache,
+        ((dataset, scene_id, FLAGS.image_stride, FLAGS.fusion) for scene_id in range(dataset.load_scene_number())),
+        workers = FLAGS.workers,
+        worker_type = 'process'
+    )
+    for scene_id, point_number in results:
+        logger.info('scene {} cached with {} points'.format(dataset.load_scene_name(scene_id), point_number))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,23 @@
+import os
+import argparse
+
+from ..ocrtoc_dataset import OCRTOC_Dataset
+from ..utils.logging import get_main_logger
+from ..utils.visibility import build_visibility_index, save_visibility_index
+
+logger = get_main_logger()
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Build the per frame object visibility index')
+    parser.add_argument('--dataset_root', required = True, help = 'Dataset root directory')
+    parser.add_argument('--workers', type = int, default = os.cpu_count(), help = 'Number of worker processes')
+    parser.add_argument('--packed', action = 'store_true', help = 'Read masks from packed scene files')
+    FLAGS = parser.parse_args()
+
+    dataset = OCRTOC_Dataset(root = FLAGS.dataset_root, packed = FLAGS.packed)
+    index = build_visibility_index(dataset, workers = FLAGS.workers)
+    index_path = save_visibility_index(FLAGS.dataset_root, index)
+    logger.info('visibility index of {} object instances saved to {}'.format(len(index), index_path))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+import os
+import time
+import argparse
+
+from ..ocrtoc_dataset import OCRTOC_Dataset
+from ..utils.logging import get_main_logger
+from ..utils.parallel import imap_ordered
+from ..utils.pack import PACK_FIELDS, read_frame_file
+from ..utils.compress import CODECS, COMPRESSED_FIELDS, get_compressed_path, load_compressed
+
+logger = get_main_logger()
+
+def compress_scene(dataset, scene_id, codec, overwrite):
+    return scene_id, dataset.compress_scene(scene_id, codec = codec, overwrite = overwrite)
+
+def measure_scene(scene_dir, image_number):
+    """Measure the sizes and the read and decode times of the original and compressed frames
+
+    Returns:
+        dict: field to [original bytes, compressed bytes, original seconds, compressed seconds].
+    """
+    report = dict()
+    for field in COMPRESSED_FIELDS:
+        sub_dir, ext = PACK_FIELDS[field]
+        original_bytes = compressed_bytes = 0
+        original_seconds = compressed_seconds = 0.0
+        for image_id in range(image_number):
+            original_bytes += os.path.getsize(os.path.join(scene_dir, sub_dir, '%04d.%s' % (image_id, ext)))
+            compressed_bytes += os.path.getsize(get_compressed_path(scene_dir, field, image_id))
+            tic = time.perf_counter()
+            read_frame_file(scene_dir, field, image_id)
+            original_seconds += time.perf_counter() - tic
+            tic = time.perf_counter()
+            load_compressed(scene_dir, field, image_id)
+            compressed_seconds += time.perf_counter() - tic
+        report[field] = [original_bytes, compressed_bytes, original_seconds, compressed_seconds]
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Compress OCRTOC depth images and segmentation masks')
+    parser.add_argument('--dataset_root', required = True, help = 'Dataset root directory')
+    parser.add_argument('--scene_ids', type = int, nargs = '*', default = None, help = 'Scene indices, all scenes by default')
+    parser.add_argument('--codec', default = None, choices = CODECS, help = 'Codec, the fastest installed by default')
+    parser.add_argument('--workers', type = int, default = os.cpu_count(), help = 'Number of worker processes')
+    parser.add_argument('--overwrite', action = 'store_true', help = 'Rewrite existing compressed files')
+    parser.add_argument('--report', action = 'store_true', help = 'Report sizes and decode speed against the original files')
+    FLAGS = parser.parse_args()
+
+    dataset = OCRTOC_Dataset(root = FLAGS.dataset_root)
+    scene_ids = FLAGS.scene_ids if FLAGS.scene_ids else range(dataset.load_scene_number())
+    results = imap_ordered(
+        compress_scene,
+        ((dataset, scene_id, FLAGS.codec, FLAGS.overwrite) for scene_id in scene_ids),
+        workers = FLAGS.workers,
+        worker_type = 'process'
+    )
+    for scene_id, written in results:
+        logger.info('scene {} compressed, {} files written'.format(dataset.load_scene_name(scene_id), written))
+
+    if FLAGS.report:
+        totals = {field: [0, 0, 0.0, 0.0] for field in COMPRESSED_FIELDS}
+        image_number = 0
+        for scene_id in scene_ids:
+            scene_image_number = dataset.load_scene_image_number(scene_id)
+            report = measure_scene(
+                os.path.join(dataset.root, 'scenes', dataset.load_scene_name(scene_id)),
+                scene_image_number
+            )
+            image_number += scene_image_number
+            for field, values in report.items():
+                totals[field] = [total + value for total, value in zip(totals[field], values)]
+        for field, (original_bytes, compressed_bytes, original_seconds, compressed_seconds) in totals.items():
+            logger.info('{:>5}: {:9.1f}MB -> {:9.1f}MB ({:5.1f}%), {:6.2f}ms -> {:6.2f}ms per frame'.format(
+                field, original_bytes / 1e6, compressed_bytes / 1e6, 100.0 * compressed_bytes / max(original_bytes, 1),
+                1e3 * original_seconds / max(image_number, 1), 1e3 * compressed_seconds / max(image_number, 1)))
+            if compressed_bytes > original_bytes:
+                logger.warning('The compressed {} files are {:.1f}% larger than the original files, '
+                    'try another --codec or remove the compressed files'.format(
+                    field, 100.0 * (compressed_bytes - original_bytes) / max(original_bytes, 1)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+import os
+import io
+import time
+import argparse
+from concurrent.futures import as_completed
+import numpy as np
+import open3d as o3d
+
+from ..ocrtoc_dataset import OCRTOC_Dataset
+from ..utils.logging import get_main_logger
+from ..utils.parallel import get_executor
+
+logger = get_main_logger()
+
+EXPORT_KINDS = ('scene', 'frames', 'annotated')
+EXPORT_FORMATS = ('ply', 'npz')
+
+def save_point_cloud(path, pcd):
+    """Save a point cloud to a ply or npz file atomically
+
+    The file is written under a temporary name and renamed, so an interrupted
+    export never leaves a partial file behind.
+
+    Args:
+        path(str): output path ending with .ply or .npz.
+        pcd(o3d.geometry.PointCloud): the point cloud.
+    """
+    root, ext = os.path.splitext(path)
+    tmp_path = '{}.{}.tmp{}'.format(root, os.getpid(), ext)
+    if ext == '.ply':
+        if not o3d.io.write_point_cloud(tmp_path, pcd):
+            raise IOError('Failed to write {}'.format(tmp_path))
+    elif ext == '.npz':
+        buffer = io.BytesIO()
+        np.savez(
+            buffer,
+            points = np.asarray(pcd.points, dtype = np.float32),
+            colors = np.asarray(pcd.colors, dtype = np.float32)
+        )
+        with open(tmp_path, 'wb') as f:
+            f.write(buffer.getbuffer())
+    else:
+        raise ValueError('Unknown format {}, only {} are allowed.'.format(ext, EXPORT_FORMATS))
+    os.replace(tmp_path, path)
+
+def export_scene(dataset, scene_id, kind, output_dir, file_format = 'ply', overwrite = False):
+    """Export the point clouds of one kind for a scene
+
+    'scene' is the fused scene cloud, 'frames' the partial cloud of every image
+    in camera frame and 'annotated' the fused scene cloud with the posed object
+    models, all under <output_dir>/<scene_name>/. Existing files are skipped.
+
+    Args:
+        dataset(OCRTOC_Dataset): the dataset.
+        scene_id(int): scene index.
+        kind(str): one of 'scene', 'frames' and 'annotated'.
+        output_dir(str): output directory.
+        file_format(str): 'ply' or 'npz'.
+        overwrite(bool): export files which already exist.
+
+    Returns:
+        int, str, int: scene index, kind and number of written files.
+    """
+    scene_dir = os.path.join(output_dir, dataset.load_scene_name(scene_id))
+    if kind == 'scene':
+        jobs = [(os.path.join(scene_dir, 'scene.' + file_format), lambda: dataset.load_scene_point_cloud(scene_id))]
+    elif kind == 'annotated':
+        jobs = [(os.path.join(scene_dir, 'annotated.' + file_format), lambda: dataset.render_3d_pose(scene_id))]
+    elif kind == 'frames':
+        jobs = [
+            (
+                os.path.join(scene_dir, 'frames', '%04d.%s' % (image_id, file_format)),
+                lambda image_id = image_id: dataset.load_point_cloud(scene_id, image_id)
+            )
+            for image_id in range(dataset.load_scene_image_number(scene_id))
+        ]
+    else:
+        raise ValueError('Unknown kind {}, only {} are allowed.'.format(kind, EXPORT_KINDS))
+    written_number = 0
+    for path, load in jobs:
+        if os.path.exists(path) and not overwrite:
+            continue
+        os.makedirs(os.path.dirname(path), exist_ok = True)
+        save_point_cloud(path, load())
+        written_number += 1
+    return scene_id, kind, written_number
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Export OCRTOC point clouds without any GUI')
+    parser.add_argument('--dataset_root', required = True, help = 'Dataset root directory')
+    parser.add_argument('--output_dir', required = True, help = 'Output directory')
+    parser.add_argument('--scene_ids', type = int, nargs = '*', default = None, help = 'Scene indices, all scenes by default')
+    parser.add_argument('--kinds', nargs = '+', default = list(EXPORT_KINDS), choices = EXPORT_KINDS, help = 'What to export')
+    parser.add_argument('--format', default = 'ply', choices = EXPORT_FORMATS, help = 'Output file format')
+    parser.add_argument('--workers', type = int, default = os.cpu_count(), help = 'Number of worker processes')
+    parser.add_argument('--packed', action = 'store_true', help = 'Read frames from packed scene files')
+    parser.add_argument('--cache_dir', default = None, help = 'Scene point cloud cache directory')
+    parser.add_argument('--overwrite', action = 'store_true', help = 'Export files which already exist')
+    FLAGS = parser.parse_args()
+
+    dataset = OCRTOC_Dataset(root = FLAGS.dataset_root, packed = FLAGS.packed, cache_dir = FLAGS.cache_dir)
+    scene_ids = FLAGS.scene_ids if FLAGS.scene_ids else range(dataset.load_scene_number())
+    tasks = [
+        (dataset, scene_id, kind, FLAGS.output_dir, FLAGS.format, FLAGS.overwrite)
+        for scene_id in scene_ids for kind in FLAGS.kinds
+    ]
+    tic = time.time()
+    total_number = 0
+
+    def report(done_number, result):
+        nonlocal total_number
+        scene_id, kind, written_number = result
+        total_number += written_number
+        elapsed = time.time() - tic
+        logger.info('[{}/{}] scene {} {}: {} files, {:.1f} files/s overall'.format(
+            done_number, len(tasks), dataset.load_scene_name(scene_id), kind, written_number,
+            total_number / max(elapsed, 1e-6)))
+
+    if FLAGS.workers is None or FLAGS.workers <= 1:
+        for done_number, task in enumerate(tasks, 1):
+            report(done_number, export_scene(*task))
+    else:
+        with get_executor(FLAGS.workers, 'process') as executor:
+            futures = [executor.submit(export_scene, *task) for task in tasks]
+            for done_number, future in enumerate(as_completed(futures), 1):
+                report(done_number, future.result())
+    logger.info('{} files exported in {:.1f}s'.format(total_number, time.time() - tic))
+
+if __name__ == '__main__':
+    main()
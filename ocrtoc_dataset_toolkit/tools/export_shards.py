@@ -0,0 +1,45 @@
+import os
+import argparse
+
+from ..ocrtoc_dataset import OCRTOC_Dataset
+from ..utils.logging import get_main_logger
+from ..utils.parallel import imap_ordered
+from ..utils.shards import plan_shards, write_shard, save_shard_index
+
+logger = get_main_logger()
+
+SHARD_NAME_FORMAT = 'shard-%06d.tar'
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Export OCRTOC frames into WebDataset style tar shards')
+    parser.add_argument('--dataset_root', required = True, help = 'Dataset root directory')
+    parser.add_argument('--output_dir', required = True, help = 'Shard directory')
+    parser.add_argument('--scene_ids', type = int, nargs = '*', default = None, help = 'Scene indices, all scenes by default')
+    parser.add_argument('--frames_per_shard', type = int, default = 1000, help = 'Frames in each shard')
+    parser.add_argument('--workers', type = int, default = os.cpu_count(), help = 'Number of worker processes')
+    FLAGS = parser.parse_args()
+
+    if FLAGS.frames_per_shard < 1:
+        raise ValueError('frames_per_shard must be positive, got {}'.format(FLAGS.frames_per_shard))
+    dataset = OCRTOC_Dataset(root = FLAGS.dataset_root)
+    os.makedirs(FLAGS.output_dir, exist_ok = True)
+    shards = plan_shards(dataset, frames_per_shard = FLAGS.frames_per_shard, scene_ids = FLAGS.scene_ids or None)
+    shard_names = [SHARD_NAME_FORMAT % shard_id for shard_id in range(len(shards))]
+    results = imap_ordered(
+        write_shard,
+        (
+            (dataset, os.path.join(FLAGS.output_dir, shard_name), frame_ids)
+            for shard_name, frame_ids in zip(shard_names, shards)
+        ),
+        workers = FLAGS.workers,
+        worker_type = 'process'
+    )
+    frame_numbers = []
+    for shard_path, frame_number in results:
+        frame_numbers.append(frame_number)
+        logger.info('{} frames written to {}'.format(frame_number, shard_path))
+    index_path = save_shard_index(FLAGS.output_dir, shard_names, frame_numbers)
+    logger.info('{} shards of {} frames indexed in {}'.format(len(shard_names), sum(frame_numbers), index_path))
+
+if __name__ == '__main__':
+    main()
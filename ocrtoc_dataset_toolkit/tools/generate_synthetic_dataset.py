@@ -0,0 +1,32 @@
+import os
+import argparse
+
+from ..utils.synthetic import generate_synthetic_dataset
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Generate a synthetic dataset with the OCRTOC layout')
+    parser.add_argument('--dataset_root', required = True, help = 'Output dataset root directory')
+    parser.add_argument('--scene_number', type = int, default = 2, help = 'Number of scenes')
+    parser.add_argument('--image_number', type = int, default = 16, help = 'Images in each scene')
+    parser.add_argument('--object_number', type = int, default = 6, help = 'Number of object models')
+    parser.add_argument('--objects_per_scene', type = int, default = 3, help = 'Objects in each scene')
+    parser.add_argument('--height', type = int, default = 720, help = 'Image height')
+    parser.add_argument('--width', type = int, default = 1280, help = 'Image width')
+    parser.add_argument('--seed', type = int, default = 0, help = 'Random seed')
+    parser.add_argument('--workers', type = int, default = os.cpu_count(), help = 'Number of worker processes')
+    FLAGS = parser.parse_args()
+
+    generate_synthetic_dataset(
+        FLAGS.dataset_root,
+        scene_number = FLAGS.scene_number,
+        image_number = FLAGS.image_number,
+        object_number = FLAGS.object_number,
+        objects_per_scene = FLAGS.objects_per_scene,
+        height = FLAGS.height,
+        width = FLAGS.width,
+        seed = FLAGS.seed,
+        workers = FLAGS.workers
+    )
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,22 @@
+import argparse
+
+from ..ocrtoc_dataset import OCRTOC_Dataset
+from ..utils.logging import get_main_logger
+
+logger = get_main_logger()
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Pack OCRTOC scenes into memory mappable frame stores')
+    parser.add_argument('--dataset_root', required = True, help = 'Dataset root directory')
+    parser.add_argument('--scene_ids', type = int, nargs = '*', default = None, help = 'Scene indices, all scenes by default')
+    parser.add_argument('--overwrite', action = 'store_true', help = 'Rebuild existing packed files')
+    FLAGS = parser.parse_args()
+
+    dataset = OCRTOC_Dataset(root = FLAGS.dataset_root)
+    scene_ids = FLAGS.scene_ids if FLAGS.scene_ids else range(dataset.load_scene_number())
+    for scene_id in scene_ids:
+        pack_path = dataset.pack_scene(scene_id, overwrite = FLAGS.overwrite)
+        logger.info('scene {} packed to {}'.format(scene_id, pack_path))
+
+if __name__ == '__main__':
+    main()
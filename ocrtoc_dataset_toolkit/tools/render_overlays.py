@@ -0,0 +1,65 @@
+import os
+import time
+import argparse
+import cv2
+
+from ..ocrtoc_dataset import OCRTOC_Dataset
+from ..utils.logging import get_main_logger
+from ..utils.parallel import imap_ordered
+
+logger = get_main_logger()
+
+def render_scene_overlays(dataset, scene_id, output_dir, overwrite = False):
+    """Render the 2d pose overlays of all images of a scene to png files
+
+    Args:
+        dataset(OCRTOC_Dataset): the dataset.
+        scene_id(int): scene index.
+        output_dir(str): output directory, images go to <output_dir>/<scene_name>/xxxx.png.
+        overwrite(bool): render images whose file already exists.
+
+    Returns:
+        int, int: scene index and number of rendered images.
+    """
+    scene_dir = os.path.join(output_dir, dataset.load_scene_name(scene_id))
+    os.makedirs(scene_dir, exist_ok = True)
+    rendered_number = 0
+    for image_id in range(dataset.load_scene_image_number(scene_id)):
+        image_path = os.path.join(scene_dir, '%04d.png' % image_id)
+        if os.path.exists(image_path) and not overwrite:
+            continue
+        # write to a temporary file first so that an interrupted run never leaves a partial image
+        tmp_path = '{}.{}.tmp.png'.format(os.path.splitext(image_path)[0], os.getpid())
+        if not cv2.imwrite(tmp_path, dataset.render_2d_pose(scene_id, image_id)):
+            raise IOError('Failed to write {}'.format(tmp_path))
+        os.replace(tmp_path, image_path)
+        rendered_number += 1
+    return scene_id, rendered_number
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Render 2d pose overlays of OCRTOC scenes to png files')
+    parser.add_argument('--dataset_root', required = True, help = 'Dataset root directory')
+    parser.add_argument('--output_dir', required = True, help = 'Output directory')
+    parser.add_argument('--scene_ids', type = int, nargs = '*', default = None, help = 'Scene indices, all scenes by default')
+    parser.add_argument('--workers', type = int, default = os.cpu_count(), help = 'Number of worker processes')
+    parser.add_argument('--packed', action = 'store_true', help = 'Read frames from packed scene files')
+    parser.add_argument('--overwrite', action = 'store_true', help = 'Render images which already exist')
+    FLAGS = parser.parse_args()
+
+    dataset = OCRTOC_Dataset(root = FLAGS.dataset_root, packed = FLAGS.packed)
+    scene_ids = FLAGS.scene_ids if FLAGS.scene_ids else range(dataset.load_scene_number())
+    tic = time.time()
+    total_number = 0
+    results = imap_ordered(
+        render_scene_overlays,
+        ((dataset, scene_id, FLAGS.output_dir, FLAGS.overwrite) for scene_id in scene_ids),
+        workers = FLAGS.workers,
+        worker_type = 'process'
+    )
+    for scene_id, rendered_number in results:
+        total_number += rendered_number
+        logger.info('scene {}: {} images rendered'.format(dataset.load_scene_name(scene_id), rendered_number))
+    logger.info('{} images rendered in {:.1f}s'.format(total_number, time.time() - tic))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+import os
+import sys
+import json
+import argparse
+
+from ..ocrtoc_dataset import OCRTOC_Dataset
+from ..utils.logging import get_main_logger
+from ..utils.scan import SCAN_STATE_FILE_NAME, get_scan_params, check_dataset, iter_scan, summarize_scan, \
+    save_scan_state, load_scan_state
+
+logger = get_main_logger()
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Check the integrity of an OCRTOC dataset and compute its statistics')
+    parser.add_argument('--dataset_root', required = True, help = 'Dataset root directory')
+    parser.add_argument('--workers', type = int, default = os.cpu_count(), help = 'Number of worker processes')
+    parser.add_argument('--state', default = None, help = 'Scan state path, {} in the dataset root by default'.format(SCAN_STATE_FILE_NAME))
+    parser.add_argument('--full', action = 'store_true', help = 'Rescan every scene, even the unchanged ones')
+    parser.add_argument('--output', default = None, help = 'Json lines output path, stdout by default')
+    parser.add_argument('--depth_bins', type = int, default = 64, help = 'Bins of the depth histogram')
+    parser.add_argument('--max_depth', type = float, default = 4.0, help = 'Upper bound in meters of the depth histogram')
+    FLAGS = parser.parse_args()
+
+    dataset = OCRTOC_Dataset(root = FLAGS.dataset_root, use_manifest = False, metadata_cache_items = 0)
+    state_path = FLAGS.state if FLAGS.state is not None else os.path.join(FLAGS.dataset_root, SCAN_STATE_FILE_NAME)
+    previous_records = dict() if FLAGS.full else load_scan_state(state_path)
+    params = get_scan_params(dataset, depth_bins = FLAGS.depth_bins, max_depth = FLAGS.max_depth)
+
+    output = sys.stdout if FLAGS.output is None else open(FLAGS.output, 'w')
+    try:
+        dataset_errors = check_dataset(dataset)
+        for error in dataset_errors:
+            logger.error(error)
+        records = []
+        # records are written as soon as each scene is done
+        for record in iter_scan(dataset, params, previous_records, workers = FLAGS.workers):
+            records.append(record)
+            output.write(json.dumps({key: value for key, value in record.items() if key != 'params'}) + '\n')
+            output.flush()
+            for error in record['errors']:
+                logger.error('scene {}: {}'.format(record['scene_name'], error))
+            logger.info('scene {} {}, {} errors'.format(
+                record['scene_name'], 'unchanged' if record['reused'] else 'scanned', len(record['errors'])))
+        summary = summarize_scan(records, dataset_errors)
+        output.write(json.dumps({'summary': summary}) + '\n')
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    save_scan_state(state_path, records)
+    logger.info('{} scenes, {} rescanned, {} frames, {} errors'.format(
+        summary['scene_number'], summary['rescanned_scene_number'], summary['frame_number'], summary['error_number']))
+    sys.exit(1 if summary['error_number'] > 0 else 0)
+
+if __name__ == '__main__':
+    main()
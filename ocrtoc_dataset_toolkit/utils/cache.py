@@ -0,0 +1,122 @@
+import os
+import io
+import json
+import hashlib
+import numpy as np
+
+from .logging import get_main_logger
+
+logger = get_main_logger()
+
+CACHE_VERSION = 1
+
+class SceneCloudCache():
+    """On disk cache of reconstructed scene point clouds.
+
+    Each entry is an uncompressed npz file holding float32 points and colors and a
+    json record of the reconstruction parameters and the source signature. An entry
+    is only returned when both match the request.
+
+    Args:
+        cache_dir(str): cache directory, created if it does not exist.
+    """
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok = True)
+
+    def get_path(self, scene_name, params):
+        """Get the cache file path of a scene and a set of parameters
+
+        Args:
+            scene_name(str): scene name.
+            params(dict): json serializable reconstruction parameters.
+
+        Returns:
+            str: cache file path.
+        """
+        digest = hashlib.sha1(json.dumps(params, sort_keys = True).encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.cache_dir, '{}_{}.npz'.format(scene_name, digest))
+
+    def load_arrays(self, scene_name, params, signature):
+        """Load cached points and colors
+
+        Args:
+            scene_name(str): scene name.
+            params(dict): json serializable reconstruction parameters.
+            signature(dict): json serializable signature of the source files.
+
+        Returns:
+            np.ndarray(N, 3), np.ndarray(N, 3) or None: float32 points and colors,
+            None if there is no valid entry.
+        """
+        cache_path = self.get_path(scene_name, params)
+        if not os.path.exists(cache_path):
+            return None
+        try:
+            with np.load(cache_path) as data:
+                meta = json.loads(data['meta'].tobytes().decode('utf-8'))
+                if meta != self._meta(scene_name, params, signature):
+                    logger.debug('stale scene cloud cache {}'.format(cache_path))
+                    return None
+                return data['points'], data['colors']
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning('Broken scene cloud cache {}: {}'.format(cache_path, e))
+            return None
+
+    def save_arrays(self, scene_name, params, signature, points, colors):
+        """Save points and colors to the cache as float32
+
+        Args:
+            scene_name(str): scene name.
+            params(dict): json serializable reconstruction parameters.
+            signature(dict): json serializable signature of the source files.
+            points(np.ndarray(N, 3)): points.
+            colors(np.ndarray(N, 3)): colors, may be empty.
+
+        Returns:
+            str: cache file path.
+        """
+        cache_path = self.get_path(scene_name, params)
+        meta = json.dumps(self._meta(scene_name, params, signature)).encode('utf-8')
+        buffer = io.BytesIO()
+        np.savez(
+            buffer,
+            points = np.asarray(points, dtype = np.float32),
+            colors = np.asarray(colors, dtype = np.float32),
+            meta = np.frombuffer(meta, dtype = np.uint8)
+        )
+        # write to a temporary file first so concurrent readers never see a partial entry
+        tmp_path = '{}.{}.tmp'.format(cache_path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            f.write(buffer.getbuffer())
+        os.replace(tmp_path, cache_path)
+        return cache_path
+
+    @staticmethod
+    def _meta(scene_name, params, signature):
+        return {
+            'version': CACHE_VERSION,
+            'scene_name': scene_name,
+            'params': params,
+            'signature': signature,
+        }
+
+def get_source_signature(paths):
+    """Get the signature of a set of source files
+
+    Args:
+        paths(list of str): file paths, missing files are skipped.
+
+    Returns:
+        dict: number of existing files and their latest mtime in ns.
+    """
+    number = 0
+    mtime_ns = 0
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        number += 1
+        mtime_ns = max(mtime_ns, stat.st_mtime_ns)
+    return {'number': number, 'mtime_ns': mtime_ns}
@@ -1,41 +1,402 @@
-import open3d as o3d
 import numpy as np
 from .logging import get_main_logger
+from .profiling import profile_stage, profile_count
 
 logger = get_main_logger()
 
 default_voxel_size = 0.002
+default_outlier_neighbors = 3000
+default_outlier_std_ratio = 0.5
+default_density_ratio = 0.75
 
-def combine(pcds, voxel_size = default_voxel_size):
+OUTLIER_FILTERS = ('statistical', 'voxel_count', 'radius', 'multiview', 'none')
+
+# voxel indices are packed into one int64 key with 21 bits per axis
+_KEY_BITS = 21
+_KEY_OFFSET = 1 << (_KEY_BITS - 1)
+_KEY_MASK = (1 << _KEY_BITS) - 1
+
+def pack_voxel_index(index):
+    """Pack integer voxel indices into sortable int64 keys
+
+    Args:
+        index(np.ndarray(N, 3)): int64 voxel indices.
+
+    Returns:
+        np.ndarray(N): int64 keys.
+    """
+    index = index + _KEY_OFFSET
+    if index.size > 0 and (index.min() < 0 or index.max() > _KEY_MASK):
+        raise ValueError('Points exceed the voxel grid range of {} voxels per axis'.format(_KEY_OFFSET))
+    return (index[:, 0] << (2 * _KEY_BITS)) | (index[:, 1] << _KEY_BITS) | index[:, 2]
+
+def unpack_voxel_keys(keys):
+    """Unpack int64 keys into integer voxel indices
+
+    Args:
+        keys(np.ndarray(N)): int64 keys.
+
+    Returns:
+        np.ndarray(N, 3): int64 voxel indices.
+    """
+    index = np.empty(shape = (len(keys), 3), dtype = np.int64)
+    index[:, 0] = keys >> (2 * _KEY_BITS)
+    index[:, 1] = (keys >> _KEY_BITS) & _KEY_MASK
+    index[:, 2] = keys & _KEY_MASK
+    return index - _KEY_OFFSET
+
+class VoxelAccumulator():
+    """Streaming voxel downsampler.
+
+    Views are added one at a time and reduced into per voxel sums immediately, so
+    memory is bounded by the number of occupied voxels plus one view instead of the
+    total number of points. The grid is anchored at the origin, each output point is
+    the mean of the points and colors falling into its voxel.
+
+    Args:
+        voxel_size(float): voxel size.
+    """
+    def __init__(self, voxel_size = default_voxel_size):
+        self.voxel_size = voxel_size
+        self.keys = np.zeros(shape = (0,), dtype = np.int64)
+        self.point_sums = np.zeros(shape = (0, 3), dtype = np.float64)
+        self.color_sums = np.zeros(shape = (0, 3), dtype = np.float64)
+        self.counts = np.zeros(shape = (0,), dtype = np.int64)
+        self.has_colors = None
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _voxel_keys(self, points):
+        return pack_voxel_index(np.floor(points / self.voxel_size).astype(np.int64))
+
+    @staticmethod
+    def _reduce(inverse, size, values):
+        sums = np.empty(shape = (size, 3), dtype = np.float64)
+        for axis in range(3):
+            sums[:, axis] = np.bincount(inverse, weights = values[:, axis], minlength = size)
+        return sums
+
+    def add(self, points, colors = None):
+        """Add a view.
+
+        Args:
+            points(np.ndarray(N, 3)): points.
+            colors(np.ndarray(N, 3) or None): colors.
+        """
+        if len(points) == 0:
+            return
+        with profile_stage('voxel_merge'):
+            has_colors = colors is not None
+            if self.has_colors is None:
+                self.has_colors = has_colors
+            elif self.has_colors != has_colors:
+                raise ValueError('Either all or none of the views must have colors')
+            view_keys, inverse = np.unique(self._voxel_keys(points), return_inverse = True)
+            inverse = inverse.reshape(-1)
+            view_point_sums = self._reduce(inverse, len(view_keys), points)
+            view_counts = np.bincount(inverse, minlength = len(view_keys))
+            if has_colors:
+                view_color_sums = self._reduce(inverse, len(view_keys), colors)
+
+            # the stored keys are sorted, existing voxels are updated in place and new
+            # voxels are inserted at their sorted position
+            position = np.searchsorted(self.keys, view_keys)
+            exists = position < len(self.keys)
+            exists[exists] = self.keys[position[exists]] == view_keys[exists]
+            self.point_sums[position[exists]] += view_point_sums[exists]
+            self.counts[position[exists]] += view_counts[exists]
+            if has_colors:
+                self.color_sums[position[exists]] += view_color_sums[exists]
+            new = ~exists
+            if new.any():
+                self.keys = np.insert(self.keys, position[new], view_keys[new])
+                self.point_sums = np.insert(self.point_sums, position[new], view_point_sums[new], axis = 0)
+                self.counts = np.insert(self.counts, position[new], view_counts[new])
+                if has_colors:
+                    self.color_sums = np.insert(self.color_sums, position[new], view_color_sums[new], axis = 0)
+        profile_count('points_merged', len(points))
+
+    def add_pcd(self, pcd):
+        """Add a view.
+
+        Args:
+            pcd(open3d.geometry.PointCloud): the point cloud.
+        """
+        colors = np.asarray(pcd.colors) if pcd.has_colors() else None
+        self.add(np.asarray(pcd.points), colors)
+
+    def get_arrays(self):
+        """Get the downsampled points and colors.
+
+        Returns:
+            np.ndarray(M, 3), np.ndarray(M, 3) or None: points and colors.
+        """
+        points = self.point_sums / self.counts[:, np.newaxis]
+        colors = self.color_sums / self.counts[:, np.newaxis] if self.has_colors else None
+        return points, colors
+
+    def get_pcd(self):
+        """Get the downsampled point cloud.
+
+        Returns:
+            open3d.geometry.PointCloud: the downsampled point cloud.
+        """
+        points, colors = self.get_arrays()
+        import open3d as o3d
+        with profile_stage('vector3d_conversion'):
+            out_pcd = o3d.geometry.PointCloud()
+            out_pcd.points = o3d.utility.Vector3dVector(points)
+            if colors is not None:
+                out_pcd.colors = o3d.utility.Vector3dVector(colors)
+        return out_pcd
+
+def statistical_inlier_mask(points, neighbors = default_outlier_neighbors, std_ratio = default_outlier_std_ratio):
+    """Statistical outlier removal of open3d.
+
+    Points whose mean distance to their neighbors is above the average by more
+    than std_ratio standard deviations are outliers.
+
+    Args:
+        points(np.ndarray(N, 3)): points.
+        neighbors(int): number of neighbors.
+        std_ratio(float): standard deviation ratio.
+
+    Returns:
+        np.ndarray(N): bool inlier mask.
+    """
+    import open3d as o3d
+    pcd = o3d.geometry.PointCloud()
+    pcd.points = o3d.utility.Vector3dVector(np.asarray(points, dtype = np.float64))
+    mask = np.zeros(shape = (len(points),), dtype = bool)
+    mask[np.asarray(pcd.remove_statistical_outlier(neighbors, std_ratio)[1], dtype = np.int64)] = True
+    return mask
+
+def get_voxel_count_threshold(counts, density_ratio = default_density_ratio):
+    """Derive the minimum raw points of the voxel_count filter from the point density.
+
+    The mean number of raw points per voxel depends on the voxel size, the pixel
+    footprint at the scene depth and the number of views. Voxels holding less than
+    density_ratio of it are outliers, but at least one point is always required, so
+    nothing is removed when each voxel receives about one point.
+
+    Args:
+        counts(np.ndarray(N)): raw points of each voxel, see :class:`VoxelAccumulator`.
+        density_ratio(float): fraction of the mean raw points per voxel.
+
+    Returns:
+        int: minimum raw points.
+    """
+    if len(counts) == 0:
+        return 1
+    return max(1, int(np.ceil(density_ratio * np.mean(counts))))
+
+def voxel_count_inlier_mask(counts, min_points = None, density_ratio = default_density_ratio):
+    """Keep the voxels which received enough raw points.
+
+    Args:
+        counts(np.ndarray(N)): raw points of each voxel, see :class:`VoxelAccumulator`.
+        min_points(int or None): minimum raw points, derived from the point density
+            by :func:`get_voxel_count_threshold` if None.
+        density_ratio(float): fraction of the mean raw points per voxel used when
+            min_points is None.
+
+    Returns:
+        np.ndarray(N): bool inlier mask.
+    """
+    if min_points is None:
+        min_points = get_voxel_count_threshold(counts, density_ratio)
+    return counts >= min_points
+
+def radius_inlier_mask(points, radius = 0.01, min_neighbors = 16):
+    """Approximate radius outlier removal on a grid.
+
+    Points are counted in cubic cells of size radius, the neighbors of a point are
+    the other points of its cell and of the 26 adjacent cells, which covers a
+    radius between radius and twice the radius.
+
+    Args:
+        points(np.ndarray(N, 3)): points.
+        radius(float): cell size.
+        min_neighbors(int): minimum neighbors.
+
+    Returns:
+        np.ndarray(N): bool inlier mask.
+    """
+    if len(points) == 0:
+        return np.zeros(shape = (0,), dtype = bool)
+    cell_keys, inverse, cell_counts = np.unique(
+        pack_voxel_index(np.floor(points / radius).astype(np.int64)),
+        return_inverse = True,
+        return_counts = True
+    )
+    cell_index = unpack_voxel_keys(cell_keys)
+    neighbor_counts = np.zeros(shape = (len(cell_keys),), dtype = np.int64)
+    for offset in np.stack(np.meshgrid([-1, 0, 1], [-1, 0, 1], [-1, 0, 1]), axis = -1).reshape(-1, 3):
+        neighbor_keys = pack_voxel_index(cell_index + offset)
+        position = np.minimum(np.searchsorted(cell_keys, neighbor_keys), len(cell_keys) - 1)
+        found = cell_keys[position] == neighbor_keys
+        neighbor_counts[found] += cell_counts[position[found]]
+    return neighbor_counts[inverse.reshape(-1)] - 1 >= min_neighbors
+
+def multiview_inlier_mask(points, frames, min_views = 2, depth_tolerance = 0.01, depth_scale = 1000.0):
+    """Keep the points consistent with the depth images of several views.
+
+    A view supports a point when the point projects into the image with a depth
+    within depth_tolerance of the measured depth.
+
+    Args:
+        points(np.ndarray(N, 3)): points in world frame.
+        frames(iterable of (depth, intrinsics, pose)): depth images, camera intrinsics
+            matrices and camera poses in world frame, may be a generator.
+        min_views(int): minimum supporting views.
+        depth_tolerance(float): depth tolerance in meters.
+        depth_scale(float): the depth factor.
+
+    Returns:
+        np.ndarray(N): bool inlier mask.
+    """
+    points = np.asarray(points, dtype = np.float64)
+    views = np.zeros(shape = (len(points),), dtype = np.int64)
+    for depth, intrinsics, pose in frames:
+        pose = np.asarray(pose, dtype = np.float64)
+        camera_points = (points - pose[:3, 3]) @ pose[:3, :3]
+        index = np.nonzero(camera_points[:, 2] > 0)[0]
+        z = camera_points[index, 2]
+        u = np.round(camera_points[index, 0] * intrinsics[0, 0] / z + intrinsics[0, 2]).astype(np.int64)
+        v = np.round(camera_points[index, 1] * intrinsics[1, 1] / z + intrinsics[1, 2]).astype(np.int64)
+        inside = (u >= 0) & (u < depth.shape[1]) & (v >= 0) & (v < depth.shape[0])
+        index, z, u, v = index[inside], z[inside], u[inside], v[inside]
+        measured = depth[v, u] / depth_scale
+        views[index[(measured > 0) & (np.abs(measured - z) <= depth_tolerance)]] += 1
+    return views >= min_views
+
+def get_inlier_mask(points, outlier_filter = 'statistical', outlier_params = None, counts = None, frames = None):
+    """Apply an outlier filter.
+
+    Args:
+        points(np.ndarray(N, 3)): points.
+        outlier_filter(str): one of 'statistical', 'voxel_count', 'radius', 'multiview' and 'none'.
+        outlier_params(dict or None): keyword arguments of the filter function.
+        counts(np.ndarray(N) or None): raw points of each voxel, needed by 'voxel_count'.
+        frames(iterable or None): depth images, intrinsics and poses, needed by 'multiview'.
+
+    Returns:
+        np.ndarray(N): bool inlier mask.
+    """
+    outlier_params = dict() if outlier_params is None else outlier_params
+    if outlier_filter == 'statistical':
+        return statistical_inlier_mask(points, **outlier_params)
+    elif outlier_filter == 'voxel_count':
+        if counts is None:
+            raise ValueError('The voxel_count filter needs the voxel counts')
+        return voxel_count_inlier_mask(counts, **outlier_params)
+    elif outlier_filter == 'radius':
+        return radius_inlier_mask(points, **outlier_params)
+    elif outlier_filter == 'multiview':
+        if frames is None:
+            raise ValueError('The multiview filter needs the frames')
+        return multiview_inlier_mask(points, frames, **outlier_params)
+    elif outlier_filter == 'none':
+        return np.ones(shape = (len(points),), dtype = bool)
+    else:
+        raise ValueError('Unknown outlier filter {}, only {} are allowed.'.format(outlier_filter, OUTLIER_FILTERS))
+
+def combine_views(views, voxel_size = default_voxel_size, outlier_neighbors = default_outlier_neighbors,
+    outlier_std_ratio = default_outlier_std_ratio, outlier_filter = 'statistical', outlier_params = None,
+    frames = None):
+    """Combine several views given as arrays, apply voxel downsample and remove outliers.
+
+    Each view is voxel downsampled into a :class:`VoxelAccumulator` as it arrives,
+    so `views` can be a generator and the raw views are never merged.
+
+    Args:
+        views(iterable of (np.ndarray(N, 3), np.ndarray(N, 3) or None)): points and colors.
+        voxel_size(float): voxel size.
+        outlier_neighbors(int): neighbors of the statistical outlier removal.
+        outlier_std_ratio(float): standard deviation ratio of the statistical outlier removal.
+        outlier_filter(str): outlier filter, see :func:`get_inlier_mask`.
+        outlier_params(dict or None): keyword arguments of the other filters.
+        frames(iterable or None): depth images, intrinsics and poses for the 'multiview' filter.
+
+    Returns:
+        np.ndarray(M, 3), np.ndarray(M, 3) or None: float64 points and colors.
+    """
+    logger.debug('full scene pcd: begin preprocess')
+    accumulator = VoxelAccumulator(voxel_size)
+    for points, colors in views:
+        accumulator.add(points, colors)
+    points, colors = accumulator.get_arrays()
+    if outlier_filter == 'statistical':
+        outlier_params = {'neighbors': outlier_neighbors, 'std_ratio': outlier_std_ratio}
+    with profile_stage('outlier_removal'):
+        mask = get_inlier_mask(points, outlier_filter, outlier_params, counts = accumulator.counts, frames = frames)
+    profile_count('outliers_removed', int(len(mask) - np.count_nonzero(mask)))
+    return points[mask], None if colors is None else colors[mask]
+
+def combine_arrays(views, voxel_size = default_voxel_size, outlier_neighbors = default_outlier_neighbors,
+    outlier_std_ratio = default_outlier_std_ratio, outlier_filter = 'statistical', outlier_params = None,
+    frames = None):
+    """Combine several views given as arrays and apply voxel downsample.
+
+    See :func:`combine_views` for the arguments.
+
+    Returns:
+        open3d.geometry.PointCloud: the combined point cloud.
+    """
+    from .vis import points_to_pointcloud
+    return points_to_pointcloud(*combine_views(
+        views, voxel_size, outlier_neighbors, outlier_std_ratio, outlier_filter, outlier_params, frames))
+
+def combine(pcds, voxel_size = default_voxel_size, outlier_filter = 'statistical', outlier_params = None,
+    frames = None):
     """Combine several point cloud and apply voxel downsample.
 
     Args:
-        pcds(list of open3d.geometry.PointCloud): list of point cloud.
+        pcds(iterable of open3d.geometry.PointCloud): point clouds.
         voxel_size(float): voxel size.
-    
+        outlier_filter(str): outlier filter, see :func:`get_inlier_mask`.
+        outlier_params(dict or None): keyword arguments of the filter other than 'statistical'.
+        frames(iterable or None): depth images, intrinsics and poses for the 'multiview' filter.
+
     Returns:
         open3d.geometry.PointCloud: the combined point cloud.
     """
-    logger.debug('full scene pcd: begin preprocess')
-    out_pcd = merge_pcds(pcds).voxel_down_sample(voxel_size)
-    out_pcd = out_pcd.remove_statistical_outlier(3000, 0.5)[0]
-    return out_pcd
+    return combine_arrays(
+        (
+            (np.asarray(pcd.points), np.asarray(pcd.colors) if pcd.has_colors() else None)
+            for pcd in pcds
+        ),
+        voxel_size = voxel_size,
+        outlier_filter = outlier_filter,
+        outlier_params = outlier_params,
+        frames = frames
+    )
 
 def merge_pcds(pcds):
     """Merge several point cloud.
 
     Args:
         pcds(list of open3d.geometry.PointCloud): list of point cloud.
-    
+
     Returns:
         open3d.geometry.PointCloud: the merged point cloud.
     """
-    points = np.zeros(shape = (0, 3), dtype = np.float64)
-    colors = np.zeros(shape = (0, 3), dtype = np.float64)
-    for pcd in pcds:
-        points = np.vstack((points, np.asarray(pcd.points)))
-        colors = np.vstack((colors, np.asarray(pcd.colors)))
-    out_pcd = o3d.geometry.PointCloud()
-    out_pcd.points = o3d.utility.Vector3dVector(points)
-    out_pcd.colors = o3d.utility.Vector3dVector(colors)
-    return out_pcd
\ No newline at end of file
+    pcds = list(pcds)
+    with profile_stage('merge'):
+        total_number = sum(len(pcd.points) for pcd in pcds)
+        points = np.empty(shape = (total_number, 3), dtype = np.float64)
+        colors = np.zeros(shape = (total_number, 3), dtype = np.float64)
+        start = 0
+        for pcd in pcds:
+            end = start + len(pcd.points)
+            points[start:end] = np.asarray(pcd.points)
+            if pcd.has_colors():
+                colors[start:end] = np.asarray(pcd.colors)
+            start = end
+    import open3d as o3d
+    with profile_stage('vector3d_conversion'):
+        out_pcd = o3d.geometry.PointCloud()
+        out_pcd.points = o3d.utility.Vector3dVector(points)
+        out_pcd.colors = o3d.utility.Vector3dVector(colors)
+    return out_pcd
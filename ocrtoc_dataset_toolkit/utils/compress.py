@@ -0,0 +1,236 @@
+import os
+import json
+import zlib
+import struct
+import numpy as np
+
+from .logging import get_main_logger
+from .pack import read_frame_file
+from .profiling import profile_stage
+
+logger = get_main_logger()
+
+COMPRESSED_MAGIC = b'OCRTOCZ1'
+CODECS = ('zstd', 'lz4', 'zlib')
+
+# field name -> (sub directory, file extension) of the compressed files, which
+# live next to the original files
+COMPRESSED_FIELDS = {
+    'depth': ('depth_undistort', 'zdepth'),
+    'mask': ('seg_masks', 'rle'),
+}
+
+def _import_codec(codec):
+    # zstd and lz4 are optional, zlib is always available
+    if codec == 'zstd':
+        import zstandard
+        return zstandard
+    elif codec == 'lz4':
+        import lz4.frame
+        return lz4.frame
+    elif codec == 'zlib':
+        return zlib
+    raise ValueError('Unknown codec {}, only {} are allowed.'.format(codec, CODECS))
+
+def get_default_codec():
+    """Get the fastest installed codec
+
+    Returns:
+        str: 'zstd' if zstandard is installed, else 'lz4' if lz4 is installed, else 'zlib'.
+    """
+    for codec in CODECS:
+        try:
+            _import_codec(codec)
+            return codec
+        except ImportError:
+            pass
+
+def compress_bytes(data, codec):
+    """Compress bytes with a codec
+
+    Args:
+        data(bytes-like): the data.
+        codec(str): 'zstd', 'lz4' or 'zlib'.
+
+    Returns:
+        bytes: compressed data.
+    """
+    module = _import_codec(codec)
+    if codec == 'zstd':
+        return module.ZstdCompressor(level = 3).compress(data)
+    elif codec == 'lz4':
+        return module.compress(data)
+    return module.compress(data, 1)
+
+def decompress_bytes(data, codec):
+    """Decompress bytes compressed by :func:`compress_bytes`
+
+    Args:
+        data(bytes-like): compressed data.
+        codec(str): 'zstd', 'lz4' or 'zlib'.
+
+    Returns:
+        bytes: the data.
+    """
+    module = _import_codec(codec)
+    if codec == 'zstd':
+        return module.ZstdDecompressor().decompress(data)
+    return module.decompress(data)
+
+def encode_mask(mask, codec = None):
+    """Run length encode a segmentation mask and compress the runs
+
+    Args:
+        mask(np.ndarray): integer segmentation mask.
+        codec(str or None): codec, :func:`get_default_codec` by default.
+
+    Returns:
+        bytes: the encoded mask.
+    """
+    codec = get_default_codec() if codec is None else codec
+    flat = np.ascontiguousarray(mask).reshape(-1)
+    starts = np.concatenate(([0], np.flatnonzero(flat[1:] != flat[:-1]) + 1))
+    lengths = np.diff(np.append(starts, len(flat))).astype(np.uint32)
+    values = flat[starts]
+    header = {
+        'encoding': 'rle',
+        'codec': codec,
+        'dtype': mask.dtype.str,
+        'shape': list(mask.shape),
+        'runs': len(starts),
+    }
+    return _serialize(header, compress_bytes(values.tobytes() + lengths.tobytes(), codec))
+
+def encode_depth(depth, codec = None):
+    """Delta encode a depth image along its rows and compress it
+
+    The deltas are split into low and high byte planes before compression, the
+    high bytes being mostly zero.
+
+    Args:
+        depth(np.ndarray(H, W)): uint16 depth image.
+        codec(str or None): codec, :func:`get_default_codec` by default.
+
+    Returns:
+        bytes: the encoded depth image.
+    """
+    if depth.dtype != np.uint16 or depth.ndim != 2:
+        raise ValueError('Depth must be a 2d uint16 array, got {} of shape {}'.format(depth.dtype, depth.shape))
+    codec = get_default_codec() if codec is None else codec
+    delta = np.empty_like(depth, dtype = '<u2')
+    delta[:, 0] = depth[:, 0]
+    np.subtract(depth[:, 1:], depth[:, :-1], out = delta[:, 1:])
+    planes = delta.view(np.uint8).reshape(-1, 2).T
+    header = {
+        'encoding': 'delta',
+        'codec': codec,
+        'dtype': '<u2',
+        'shape': list(depth.shape),
+    }
+    return _serialize(header, compress_bytes(np.ascontiguousarray(planes).tobytes(), codec))
+
+def decode(data):
+    """Decode a mask or depth image encoded by :func:`encode_mask` or :func:`encode_depth`
+
+    Args:
+        data(bytes-like): the encoded data.
+
+    Returns:
+        np.ndarray: the mask or depth image.
+    """
+    data = memoryview(data)
+    if bytes(data[:len(COMPRESSED_MAGIC)]) != COMPRESSED_MAGIC:
+        raise ValueError('Not a compressed frame')
+    header_start = len(COMPRESSED_MAGIC) + 4
+    header_length = struct.unpack('<I', data[len(COMPRESSED_MAGIC):header_start])[0]
+    header = json.loads(bytes(data[header_start:header_start + header_length]).decode('utf-8'))
+    payload = decompress_bytes(data[header_start + header_length:], header['codec'])
+    dtype = np.dtype(header['dtype'])
+    shape = tuple(header['shape'])
+    if header['encoding'] == 'rle':
+        runs = header['runs']
+        values = np.frombuffer(payload, dtype = dtype, count = runs)
+        lengths = np.frombuffer(payload, dtype = np.uint32, count = runs, offset = runs * dtype.itemsize)
+        return np.repeat(values, lengths).reshape(shape)
+    elif header['encoding'] == 'delta':
+        planes = np.frombuffer(payload, dtype = np.uint8).reshape(2, -1)
+        delta = (planes[1].astype(np.uint16) << 8) | planes[0]
+        # uint16 additions wrap around like the encoding subtractions
+        return np.cumsum(delta.reshape(shape), axis = 1, dtype = np.uint16)
+    raise ValueError('Unknown encoding {}'.format(header['encoding']))
+
+def _serialize(header, payload):
+    header_bytes = json.dumps(header).encode('utf-8')
+    return COMPRESSED_MAGIC + struct.pack('<I', len(header_bytes)) + header_bytes + payload
+
+def get_compressed_path(scene_dir, field, image_id):
+    """Get the path of a compressed frame
+
+    Args:
+        scene_dir(str): scene directory.
+        field(str): 'depth' or 'mask'.
+        image_id(int): image index.
+
+    Returns:
+        str: path of the compressed file.
+    """
+    sub_dir, ext = COMPRESSED_FIELDS[field]
+    return os.path.join(scene_dir, sub_dir, '%04d.%s' % (image_id, ext))
+
+def load_compressed(scene_dir, field, image_id):
+    """Load a compressed frame if it exists
+
+    Args:
+        scene_dir(str): scene directory.
+        field(str): 'depth' or 'mask'.
+        image_id(int): image index.
+
+    Returns:
+        np.ndarray or None: the decoded frame, None if there is no compressed file.
+    """
+    try:
+        f = open(get_compressed_path(scene_dir, field, image_id), 'rb')
+    except FileNotFoundError:
+        return None
+    with f, profile_stage('file_read') as stage:
+        data = f.read()
+        stage.add_bytes(len(data))
+    with profile_stage('compressed_decode'):
+        return decode(data)
+
+def compress_scene(scene_dir, image_number, codec = None, overwrite = False):
+    """Write the compressed depth images and segmentation masks of a scene
+
+    The original files are kept, each compressed frame is checked to decode to
+    the original array before it is written.
+
+    Args:
+        scene_dir(str): scene directory.
+        image_number(int): images number in the scene.
+        codec(str or None): codec, :func:`get_default_codec` by default.
+        overwrite(bool): rewrite compressed files which already exist.
+
+    Returns:
+        int: number of written files.
+    """
+    codec = get_default_codec() if codec is None else codec
+    encoders = {'depth': encode_depth, 'mask': encode_mask}
+    written = 0
+    for image_id in range(image_number):
+        for field, encoder in encoders.items():
+            compressed_path = get_compressed_path(scene_dir, field, image_id)
+            if os.path.exists(compressed_path) and not overwrite:
+                continue
+            array = read_frame_file(scene_dir, field, image_id)
+            data = encoder(array, codec)
+            decoded = decode(data)
+            if decoded.dtype != array.dtype or not np.array_equal(decoded, array):
+                raise ValueError('Compressed frame {} of field {} in {} does not decode to the original'.format(
+                    image_id, field, scene_dir))
+            tmp_path = '{}.{}.tmp'.format(compressed_path, os.getpid())
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, compressed_path)
+            written += 1
+    logger.debug('compressed {} files in {} with {}'.format(written, scene_dir, codec))
+    return written
@@ -0,0 +1,164 @@
+import numpy as np
+
+from .logging import get_main_logger
+from .combine import pack_voxel_index, unpack_voxel_keys, default_voxel_size
+from .vis import depth_to_points, transform_points
+from .profiling import profile_stage
+
+logger = get_main_logger()
+
+FUSION_ENGINES = ('voxel', 'tsdf')
+default_min_weight = 1.0
+
+_UNIT_INDEX = np.eye(3, dtype = np.int64)
+
+class TSDFVolume():
+    """Sparse truncated signed distance volume.
+
+    Frames are integrated one at a time. Only the voxels within the truncation band
+    of an observed surface are stored, as sorted int64 keys like in
+    :class:`VoxelAccumulator`, so memory is bounded by the occupied scene volume
+    instead of the number of frames. The signed distance is measured along the
+    camera axis and each observation has a weight of one.
+
+    Args:
+        voxel_size(float): voxel size.
+        sdf_trunc(float or None): truncation distance, four voxels by default.
+    """
+    def __init__(self, voxel_size = default_voxel_size, sdf_trunc = None):
+        self.voxel_size = voxel_size
+        self.sdf_trunc = 4 * voxel_size if sdf_trunc is None else sdf_trunc
+        self.keys = np.zeros(shape = (0,), dtype = np.int64)
+        self.tsdf = np.zeros(shape = (0,), dtype = np.float32)
+        self.weights = np.zeros(shape = (0,), dtype = np.float32)
+        self.colors = np.zeros(shape = (0, 3), dtype = np.float32)
+        self.has_colors = None
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _band_keys(self, points, camera_center):
+        # sample the rays through the observed surface voxels every half voxel
+        # within the truncation band
+        surface_keys = np.unique(pack_voxel_index(np.floor(points / self.voxel_size).astype(np.int64)))
+        centers = (unpack_voxel_keys(surface_keys) + 0.5) * self.voxel_size
+        directions = centers - camera_center
+        directions /= np.linalg.norm(directions, axis = 1, keepdims = True)
+        step_number = int(np.ceil(2 * self.sdf_trunc / self.voxel_size))
+        steps = np.arange(-step_number, step_number + 1) * (0.5 * self.voxel_size)
+        samples = centers[:, np.newaxis, :] + steps[np.newaxis, :, np.newaxis] * directions[:, np.newaxis, :]
+        return np.unique(pack_voxel_index(np.floor(samples.reshape(-1, 3) / self.voxel_size).astype(np.int64)))
+
+    def integrate(self, depth, intrinsics, pose, rgb = None, depth_scale = 1000.0):
+        """Integrate a frame.
+
+        Args:
+            depth(np.ndarray(H, W)): depth image.
+            intrinsics(np.ndarray): camera intrinsics matrix.
+            pose(np.ndarray(4, 4)): camera pose in world frame.
+            rgb(np.ndarray(H, W, 3) or None): RGB image.
+            depth_scale(float): the depth factor.
+        """
+        has_colors = rgb is not None
+        if self.has_colors is None:
+            self.has_colors = has_colors
+        elif self.has_colors != has_colors:
+            raise ValueError('Either all or none of the frames must have colors')
+        points, _ = depth_to_points(depth, intrinsics, depth_scale)
+        if len(points) == 0:
+            return
+        pose = np.asarray(pose, dtype = np.float64)
+        points = transform_points(points.astype(np.float64), pose)
+        keys = self._band_keys(points, pose[:3, 3])
+
+        # project the band voxel centers into the frame
+        camera_points = ((unpack_voxel_keys(keys) + 0.5) * self.voxel_size - pose[:3, 3]) @ pose[:3, :3]
+        in_front = camera_points[:, 2] > 0
+        keys, camera_points = keys[in_front], camera_points[in_front]
+        z = camera_points[:, 2]
+        u = np.round(camera_points[:, 0] * intrinsics[0, 0] / z + intrinsics[0, 2]).astype(np.int64)
+        v = np.round(camera_points[:, 1] * intrinsics[1, 1] / z + intrinsics[1, 2]).astype(np.int64)
+        valid = (u >= 0) & (u < depth.shape[1]) & (v >= 0) & (v < depth.shape[0])
+        keys, z, u, v = keys[valid], z[valid], u[valid], v[valid]
+        sdf = depth[v, u] / depth_scale - z
+        # voxels far behind the surface are occluded and not updated
+        valid = (depth[v, u] > 0) & (sdf >= -self.sdf_trunc)
+        keys, u, v = keys[valid], u[valid], v[valid]
+        frame_tsdf = np.minimum(1.0, sdf[valid] / self.sdf_trunc).astype(np.float32)
+        frame_colors = rgb[v, u].astype(np.float32) / np.float32(255.0) if has_colors else None
+        self._update(keys, frame_tsdf, frame_colors)
+
+    def _update(self, keys, frame_tsdf, frame_colors):
+        # same sorted merge as VoxelAccumulator.add, observed voxels get a running
+        # weighted average and new voxels are inserted at their sorted position
+        position = np.searchsorted(self.keys, keys)
+        exists = position < len(self.keys)
+        exists[exists] = self.keys[position[exists]] == keys[exists]
+        index = position[exists]
+        weights = self.weights[index]
+        self.tsdf[index] = (self.tsdf[index] * weights + frame_tsdf[exists]) / (weights + 1)
+        if frame_colors is not None:
+            self.colors[index] = (self.colors[index] * weights[:, np.newaxis] + frame_colors[exists]) / \
+                (weights[:, np.newaxis] + 1)
+        self.weights[index] = weights + 1
+        new = ~exists
+        if new.any():
+            self.keys = np.insert(self.keys, position[new], keys[new])
+            self.tsdf = np.insert(self.tsdf, position[new], frame_tsdf[new])
+            self.weights = np.insert(self.weights, position[new], np.float32(1))
+            if frame_colors is not None:
+                self.colors = np.insert(self.colors, position[new], frame_colors[new], axis = 0)
+
+    def extract_arrays(self, min_weight = default_min_weight):
+        """Extract the surface points at the zero crossings between neighbouring voxels.
+
+        Args:
+            min_weight(float): minimum integration weight of both voxels of a crossing.
+
+        Returns:
+            np.ndarray(M, 3), np.ndarray(M, 3) or None: float64 points and colors.
+        """
+        # voxels at the truncation distance cannot bound a surface crossing
+        observed = (self.weights >= min_weight) & (np.abs(self.tsdf) < 1)
+        keys, tsdf = self.keys[observed], self.tsdf[observed].astype(np.float64)
+        colors = self.colors[observed].astype(np.float64) if self.has_colors else None
+        index = unpack_voxel_keys(keys)
+        points_list, colors_list = [], []
+        for axis in range(3):
+            neighbor_keys = pack_voxel_index(index + _UNIT_INDEX[axis])
+            position = np.searchsorted(keys, neighbor_keys)
+            found = position < len(keys)
+            found[found] = keys[position[found]] == neighbor_keys[found]
+            first, second = np.nonzero(found)[0], position[found]
+            crossing = (tsdf[first] > 0) != (tsdf[second] > 0)
+            first, second = first[crossing], second[crossing]
+            ratio = tsdf[first] / (tsdf[first] - tsdf[second])
+            points = (index[first] + 0.5) * self.voxel_size
+            points[:, axis] += ratio * self.voxel_size
+            points_list.append(points)
+            if colors is not None:
+                colors_list.append(colors[first] + ratio[:, np.newaxis] * (colors[second] - colors[first]))
+        points = np.concatenate(points_list, axis = 0)
+        return points, np.concatenate(colors_list, axis = 0) if colors is not None else None
+
+def tsdf_fusion(frames, voxel_size = default_voxel_size, sdf_trunc = None, min_weight = default_min_weight,
+    depth_scale = 1000.0):
+    """Fuse frames into a :class:`TSDFVolume` and extract the surface points.
+
+    Args:
+        frames(iterable of (depth, rgb or None, intrinsics, pose)): frames, may be a generator.
+        voxel_size(float): voxel size.
+        sdf_trunc(float or None): truncation distance, four voxels by default.
+        min_weight(float): minimum integration weight of the extracted voxels.
+        depth_scale(float): the depth factor.
+
+    Returns:
+        np.ndarray(M, 3), np.ndarray(M, 3) or None: float64 points and colors.
+    """
+    volume = TSDFVolume(voxel_size, sdf_trunc)
+    for frame_number, (depth, rgb, intrinsics, pose) in enumerate(frames):
+        with profile_stage('tsdf_integrate'):
+            volume.integrate(depth, intrinsics, pose, rgb, depth_scale)
+        logger.debug('tsdf fusion: {} frames, {} voxels'.format(frame_number + 1, len(volume)))
+    with profile_stage('tsdf_extract'):
+        return volume.extract_arrays(min_weight)
@@ -0,0 +1,152 @@
+import sys
+import inspect
+import functools
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+def estimate_nbytes(value):
+    """Estimate the memory used by a cached value
+
+    Args:
+        value: numpy array, open3d geometry, container or plain python object.
+
+    Returns:
+        int: estimated bytes.
+    """
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(estimate_nbytes(k) + estimate_nbytes(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_nbytes(v) for v in value)
+    nbytes = 0
+    # open3d geometries expose their buffers as Vector*Vector attributes
+    for attribute in ('points', 'colors', 'normals', 'vertices', 'vertex_colors', 'vertex_normals', 'triangles'):
+        buffer = getattr(value, attribute, None)
+        if buffer is not None and not callable(buffer):
+            nbytes += np.asarray(buffer).nbytes
+    return nbytes if nbytes > 0 else sys.getsizeof(value)
+
+class LRUCache():
+    """Thread safe least recently used cache bounded in items and bytes
+
+    Pickling a cache gives an empty cache with the same bounds.
+
+    Args:
+        max_items(int or None): maximum number of entries, None for no bound.
+        max_bytes(int or None): maximum estimated bytes, None for no bound.
+    """
+    def __init__(self, max_items = None, max_bytes = None):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.clear()
+
+    def __getstate__(self):
+        return {'max_items': self.max_items, 'max_bytes': self.max_bytes}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        """Remove all entries and reset the statistics"""
+        with self._lock:
+            self._entries = OrderedDict()
+            self.nbytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def get(self, key, default = None):
+        """Get an entry and mark it as recently used
+
+        Args:
+            key: hashable key.
+            default: returned on a miss.
+
+        Returns:
+            the cached value or default.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        """Add an entry, evicting least recently used entries to stay in bounds
+
+        Values larger than max_bytes are not cached.
+
+        Args:
+            key: hashable key.
+            value: the value.
+        """
+        nbytes = estimate_nbytes(value)
+        if self.max_items == 0 or (self.max_bytes is not None and nbytes > self.max_bytes):
+            return
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, nbytes)
+            self.nbytes += nbytes
+            while (self.max_items is not None and len(self._entries) > self.max_items) or \
+                (self.max_bytes is not None and self.nbytes > self.max_bytes):
+                self.nbytes -= self._entries.popitem(last = False)[1][1]
+                self.evictions += 1
+
+    def stats(self):
+        """Get the cache statistics
+
+        Returns:
+            dict: hits, misses, evictions, items and bytes.
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'items': len(self._entries),
+                'bytes': self.nbytes,
+            }
+
+def cached_loader(copy):
+    """Decorate a loader method to cache its results in `self.metadata_cache`
+
+    The key is the method name with its bound arguments, so positional and keyword
+    calls share entries. Callers get `copy(value)` and never the cached object,
+    unless copy is None for read only values which are shared.
+
+    Args:
+        copy(callable or None): function copying a cached value, None to return
+            the cached value itself.
+
+    Returns:
+        callable: the decorator.
+    """
+    def decorator(function):
+        signature = inspect.signature(function)
+        missing = object()
+
+        @functools.wraps(function)
+        def wrapper(self, *args, **kwargs):
+            cache = self.metadata_cache
+            if cache is None:
+                return function(self, *args, **kwargs)
+            arguments = signature.bind(self, *args, **kwargs)
+            arguments.apply_defaults()
+            key = (function.__name__,) + tuple(arguments.arguments.values())[1:]
+            value = cache.get(key, missing)
+            if value is missing:
+                value = function(self, *args, **kwargs)
+                cache.put(key, value)
+            return value if copy is None else copy(value)
+        return wrapper
+    return decorator
@@ -0,0 +1,153 @@
+import os
+import json
+import numpy as np
+
+from .logging import get_main_logger
+
+logger = get_main_logger()
+
+MANIFEST_FILE_NAME = 'manifest.json'
+MANIFEST_VERSION = 2
+
+# entries of a scene directory the manifest is built from, '.' is the scene directory itself
+SCENE_SIGNATURE_ENTRIES = ('.', 'rgb_undistort', 'object_poses', 'object_list.txt', 'color_camK.npy')
+
+def get_mtime_signature(directory, names):
+    """Get the modification times of entries of a directory
+
+    Args:
+        directory(str): directory.
+        names(list of str): entry names, '.' for the directory itself.
+
+    Returns:
+        dict: entry name to mtime in ns, None for missing entries.
+    """
+    signature = dict()
+    for name in names:
+        try:
+            signature[name] = os.stat(os.path.join(directory, name)).st_mtime_ns
+        except FileNotFoundError:
+            signature[name] = None
+    return signature
+
+def get_root_signature(root):
+    """Get the modification times of the top level dataset entries
+
+    Adding or removing a scene changes the mtime of the scenes directory, editing
+    the name lists changes their own mtime.
+
+    Args:
+        root(str): dataset root.
+
+    Returns:
+        dict: entry name to mtime in ns, None for missing entries.
+    """
+    return get_mtime_signature(root, ['scenes', 'object_name_list.txt', 'scene_name_list.txt'])
+
+def get_scene_signature(root, scene_name):
+    """Get the modification times of the scene entries the manifest is built from
+
+    Adding or removing an image or a pose file changes the mtime of its directory.
+
+    Args:
+        root(str): dataset root.
+        scene_name(str): scene name.
+
+    Returns:
+        dict: entry name to mtime in ns, None for missing entries.
+    """
+    return get_mtime_signature(os.path.join(root, 'scenes', scene_name), SCENE_SIGNATURE_ENTRIES)
+
+def build_manifest(dataset):
+    """Build the manifest of a dataset by scanning it
+
+    Args:
+        dataset(OCRTOC_Dataset): a dataset created with use_manifest = False.
+
+    Returns:
+        dict: the manifest.
+    """
+    if dataset.manifest is not None:
+        raise ValueError('The manifest must be built from a dataset created with use_manifest = False')
+    scenes = dict()
+    for scene_id, scene_name in enumerate(dataset.scene_name_list):
+        intrinsic = dataset.load_real_camera_intrinsic(scene_id)
+        object_pose_dict = dataset.load_object_pose_dict(scene_id)
+        scenes[scene_name] = {
+            'image_number': dataset.load_scene_image_number(scene_id),
+            'object_list': dataset.load_scene_object_list(scene_id),
+            'posed_objects': [name for name, pose in object_pose_dict.items() if pose is not None],
+            'intrinsic': intrinsic.tolist(),
+            'intrinsic_dtype': intrinsic.dtype.str,
+            'signature': get_scene_signature(dataset.root, scene_name),
+        }
+    return {
+        'version': MANIFEST_VERSION,
+        'root_signature': get_root_signature(dataset.root),
+        'scene_name_list': dataset.scene_name_list,
+        'object_name_list': dataset.object_name_list,
+        'scenes': scenes,
+    }
+
+def save_manifest(root, manifest):
+    """Save the manifest to the dataset root
+
+    Args:
+        root(str): dataset root.
+        manifest(dict): the manifest.
+
+    Returns:
+        str: manifest path.
+    """
+    manifest_path = os.path.join(root, MANIFEST_FILE_NAME)
+    tmp_path = '{}.{}.tmp'.format(manifest_path, os.getpid())
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, manifest_path)
+    return manifest_path
+
+def load_manifest(root):
+    """Load the manifest of a dataset
+
+    The entries of the scenes changed since the manifest was built are removed, the
+    dataset scans these scenes instead.
+
+    Args:
+        root(str): dataset root.
+
+    Returns:
+        dict or None: the manifest, None if it is missing or its top level entries are stale.
+    """
+    manifest_path = os.path.join(root, MANIFEST_FILE_NAME)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if manifest.get('version') != MANIFEST_VERSION:
+        logger.warning('Ignore manifest of version {}'.format(manifest.get('version')))
+        return None
+    if manifest['root_signature'] != get_root_signature(root):
+        logger.warning('Stale manifest, rebuild it with ocrtoc_dataset_toolkit.tools.build_manifest')
+        return None
+    stale_scene_names = [
+        scene_name for scene_name, scene_manifest in manifest['scenes'].items()
+        if scene_manifest['signature'] != get_scene_signature(root, scene_name)
+    ]
+    if len(stale_scene_names) > 0:
+        logger.warning('Stale manifest of {} scenes, they are scanned instead: {}, '
+            'rebuild it with ocrtoc_dataset_toolkit.tools.build_manifest'.format(
+            len(stale_scene_names), ', '.join(stale_scene_names)))
+        for scene_name in stale_scene_names:
+            del manifest['scenes'][scene_name]
+    return manifest
+
+def get_manifest_intrinsic(scene_manifest):
+    """Get the camera intrinsic matrix stored in a scene manifest
+
+    Args:
+        scene_manifest(dict): manifest entry of a scene.
+
+    Returns:
+        np.ndarray: camera intrinsic matrix.
+    """
+    return np.array(scene_manifest['intrinsic'], dtype = np.dtype(scene_manifest['intrinsic_dtype']))
@@ -0,0 +1,171 @@
+import os
+import json
+import struct
+import numpy as np
+import cv2
+
+from .logging import get_main_logger
+
+logger = get_main_logger()
+
+PACKED_FILE_NAME = 'frames.pack'
+PACK_MAGIC = b'OCRTOCPK'
+PACK_VERSION = 1
+# every frame record starts on a page boundary so that slicing a memory map never
+# straddles more pages than necessary.
+PACK_ALIGNMENT = 4096
+
+# field name -> (sub directory, file extension)
+PACK_FIELDS = {
+    'rgb': ('rgb_undistort', 'png'),
+    'depth': ('depth_undistort', 'png'),
+    'mask': ('seg_masks', 'npy'),
+    'pose': ('camera_poses', 'npy'),
+}
+
+def _align(offset, alignment = PACK_ALIGNMENT):
+    return (offset + alignment - 1) // alignment * alignment
+
+def read_frame_file(scene_dir, field, image_id):
+    """Read one frame of a field exactly as the per-file loaders do.
+
+    Args:
+        scene_dir(str): scene directory.
+        field(str): one of 'rgb', 'depth', 'mask' and 'pose'.
+        image_id(int): image index.
+
+    Returns:
+        np.ndarray: the decoded array, rgb is kept in BGR order.
+    """
+    sub_dir, ext = PACK_FIELDS[field]
+    path = os.path.join(scene_dir, sub_dir, '%04d.%s' % (image_id, ext))
+    if ext == 'png':
+        flag = cv2.IMREAD_UNCHANGED if field == 'depth' else cv2.IMREAD_COLOR
+        array = cv2.imread(path, flag)
+        if array is None:
+            raise IOError('Failed to read {}'.format(path))
+        return array
+    return np.load(path)
+
+def pack_scene(scene_dir, image_number, overwrite = False):
+    """Pack rgb, depth, segmentation masks and camera poses of a scene into one file.
+
+    The file starts with a magic, a little endian uint64 header length and a json
+    header holding the byte offset, dtype and shape of every frame of every field.
+    Frames are stored one after another with all fields of a frame next to each other.
+
+    Args:
+        scene_dir(str): scene directory.
+        image_number(int): images number in the scene.
+        overwrite(bool): rebuild the file even if it already exists.
+
+    Returns:
+        str: path of the packed file.
+    """
+    pack_path = os.path.join(scene_dir, PACKED_FILE_NAME)
+    if os.path.exists(pack_path) and not overwrite:
+        logger.info('{} already exists, skip packing'.format(pack_path))
+        return pack_path
+    if image_number == 0:
+        raise ValueError('No image in scene {}'.format(scene_dir))
+
+    # the layout is computed from the first frame, all frames must share it
+    first_frame = dict()
+    for field in PACK_FIELDS:
+        first_frame[field] = read_frame_file(scene_dir, field, 0)
+    record_size = 0
+    field_offsets = dict()
+    for field, array in first_frame.items():
+        field_offsets[field] = record_size
+        record_size = _align(record_size + array.nbytes, 64)
+    record_size = _align(record_size)
+
+    header = {
+        'version': PACK_VERSION,
+        'image_number': image_number,
+        'record_size': record_size,
+        'fields': dict(),
+    }
+    for field, array in first_frame.items():
+        header['fields'][field] = {
+            'dtype': array.dtype.str,
+            'shape': list(array.shape),
+            'offset': field_offsets[field],
+        }
+    # the data offset depends on the header length, which depends on the data offset
+    data_offset = 0
+    while True:
+        header['data_offset'] = data_offset
+        header_bytes = json.dumps(header).encode('utf-8')
+        needed = _align(len(PACK_MAGIC) + 8 + len(header_bytes))
+        if needed == data_offset:
+            break
+        data_offset = needed
+
+    tmp_path = pack_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(PACK_MAGIC)
+        f.write(struct.pack('<Q', len(header_bytes)))
+        f.write(header_bytes)
+        for image_id in range(image_number):
+            record_offset = data_offset + image_id * record_size
+            for field, layout in header['fields'].items():
+                if image_id == 0:
+                    array = first_frame[field]
+                else:
+                    array = read_frame_file(scene_dir, field, image_id)
+                if array.dtype.str != layout['dtype'] or list(array.shape) != layout['shape']:
+                    raise ValueError('Frame {} of field {} in {} has dtype {} and shape {}, expected {} and {}'.format(
+                        image_id, field, scene_dir, array.dtype.str, array.shape, layout['dtype'], layout['shape']))
+                f.seek(record_offset + layout['offset'])
+                f.write(np.ascontiguousarray(array).tobytes())
+        f.truncate(data_offset + image_number * record_size)
+    os.replace(tmp_path, pack_path)
+    return pack_path
+
+class PackedScene():
+    """Read only memory mapped view of a packed scene file.
+
+    Arrays are returned as zero copy, read only slices of the memory map.
+
+    Args:
+        pack_path(str): path of the packed file.
+    """
+    def __init__(self, pack_path):
+        self.pack_path = pack_path
+        with open(pack_path, 'rb') as f:
+            magic = f.read(len(PACK_MAGIC))
+            if magic != PACK_MAGIC:
+                raise ValueError('{} is not a packed scene file'.format(pack_path))
+            header_length = struct.unpack('<Q', f.read(8))[0]
+            self.header = json.loads(f.read(header_length).decode('utf-8'))
+        if self.header['version'] != PACK_VERSION:
+            raise ValueError('Unsupported packed scene version {} in {}'.format(
+                self.header['version'], pack_path))
+        self.image_number = self.header['image_number']
+        self.record_size = self.header['record_size']
+        self.data_offset = self.header['data_offset']
+        self.fields = dict()
+        for field, layout in self.header['fields'].items():
+            self.fields[field] = (np.dtype(layout['dtype']), tuple(layout['shape']), layout['offset'])
+        self._buffer = np.memmap(pack_path, dtype = np.uint8, mode = 'r')
+
+    def __len__(self):
+        return self.image_number
+
+    def load(self, field, image_id):
+        """Load one frame of a field.
+
+        Args:
+            field(str): one of 'rgb', 'depth', 'mask' and 'pose'.
+            image_id(int): image index.
+
+        Returns:
+            np.ndarray: read only array as stored, rgb is in BGR order.
+        """
+        if not 0 <= image_id < self.image_number:
+            raise IndexError('Image id {} out of range for {} images in {}'.format(
+                image_id, self.image_number, self.pack_path))
+        dtype, shape, offset = self.fields[field]
+        start = self.data_offset + image_id * self.record_size + offset
+        return np.ndarray(shape, dtype = dtype, buffer = self._buffer, offset = start)
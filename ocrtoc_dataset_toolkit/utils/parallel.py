@@ -0,0 +1,56 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+WORKER_TYPES = ('thread', 'process')
+
+def get_executor(workers, worker_type = 'thread'):
+    """Create a pool executor
+
+    Args:
+        workers(int): number of workers.
+        worker_type(str): 'thread' or 'process'.
+
+    Returns:
+        concurrent.futures.Executor: the executor.
+    """
+    if worker_type == 'thread':
+        return ThreadPoolExecutor(max_workers = workers)
+    elif worker_type == 'process':
+        return ProcessPoolExecutor(max_workers = workers)
+    else:
+        raise ValueError('Unknown worker type {}, only {} are allowed.'.format(worker_type, WORKER_TYPES))
+
+def imap_ordered(function, args_iterable, workers = None, worker_type = 'thread', prefetch = None):
+    """Apply a function over argument tuples in a pool and yield results in input order
+
+    At most `prefetch` calls are in flight, so results are never buffered for the
+    whole input. With `workers` None or 1 the calls run serially in the caller.
+
+    Args:
+        function(callable): the function, must be picklable for process workers.
+        args_iterable(iterable of tuple): positional arguments of each call.
+        workers(int or None): number of workers.
+        worker_type(str): 'thread' or 'process'.
+        prefetch(int or None): calls in flight, twice the workers by default.
+
+    Yields:
+        the results of the calls in input order.
+    """
+    if workers is None or workers <= 1:
+        for args in args_iterable:
+            yield function(*args)
+        return
+    if prefetch is None:
+        prefetch = 2 * workers
+    with get_executor(workers, worker_type) as executor:
+        pending = deque()
+        try:
+            for args in args_iterable:
+                pending.append(executor.submit(function, *args))
+                if len(pending) >= prefetch:
+                    yield pending.popleft().result()
+            while len(pending) > 0:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
@@ -0,0 +1,316 @@
+import os
+import json
+import time
+import logging
+import threading
+import contextlib
+import numpy as np
+import cv2
+
+from .logging import get_main_logger
+
+logger = get_main_logger()
+
+# the active profiler, None when profiling is disabled so that the hooks only
+# cost a global lookup
+_profiler = None
+
+class _NullStage():
+    """Stage returned while profiling is disabled, all its methods do nothing"""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def add_bytes(self, nbytes):
+        pass
+
+_NULL_STAGE = _NullStage()
+
+class _Stage():
+    """Timer of one stage execution, recorded into its profiler on exit"""
+    __slots__ = ('profiler', 'name', 'nbytes', 'start')
+
+    def __init__(self, profiler, name, nbytes = 0):
+        self.profiler = profiler
+        self.name = name
+        self.nbytes = nbytes
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.profiler.record(self.name, self.start, time.perf_counter(), self.nbytes)
+        return False
+
+    def add_bytes(self, nbytes):
+        """Add bytes read during the stage
+
+        Args:
+            nbytes(int): bytes.
+        """
+        self.nbytes += nbytes
+
+class Profiler():
+    """Thread safe aggregation of stage timings, bytes read and counters
+
+    Only the current process is profiled, the work of process workers is not recorded.
+
+    Args:
+        trace(bool): also keep every stage execution for :meth:`save_chrome_trace`.
+        max_events(int): maximum number of kept executions, later ones are dropped.
+    """
+    def __init__(self, trace = False, max_events = 1000000):
+        self.trace = trace
+        self.max_events = max_events
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Remove all the recorded stages, events and counters"""
+        with self._lock:
+            self.origin = time.perf_counter()
+            # stage name -> [calls, total seconds, max seconds, bytes]
+            self._stages = dict()
+            self._counters = dict()
+            self._events = []
+            self.dropped_events = 0
+
+    def stage(self, name, nbytes = 0):
+        """Time a stage
+
+        Args:
+            name(str): stage name.
+            nbytes(int): bytes read by the stage, more can be added with add_bytes.
+
+        Returns:
+            context manager timing the stage.
+        """
+        return _Stage(self, name, nbytes)
+
+    def record(self, name, start, end, nbytes = 0):
+        """Record a stage execution
+
+        Args:
+            name(str): stage name.
+            start(float): time.perf_counter() at the start.
+            end(float): time.perf_counter() at the end.
+            nbytes(int): bytes read.
+        """
+        duration = end - start
+        with self._lock:
+            stage = self._stages.get(name)
+            if stage is None:
+                stage = self._stages[name] = [0, 0.0, 0.0, 0]
+            stage[0] += 1
+            stage[1] += duration
+            stage[2] = max(stage[2], duration)
+            stage[3] += nbytes
+            if self.trace:
+                if len(self._events) < self.max_events:
+                    self._events.append((name, start, duration, nbytes, threading.get_ident()))
+                else:
+                    self.dropped_events += 1
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('{}: {:.3f}ms{}'.format(
+                name, 1e3 * duration, ', {} bytes'.format(nbytes) if nbytes > 0 else ''))
+
+    def count(self, name, value = 1):
+        """Increment a counter
+
+        Args:
+            name(str): counter name.
+            value(int or float): increment.
+        """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def stats(self):
+        """Get the aggregated statistics
+
+        Returns:
+            dict: 'stages' maps stage names to their calls, total, mean and max seconds
+            and bytes, 'counters' maps counter names to their values.
+        """
+        with self._lock:
+            stages = {
+                name: {
+                    'calls': calls,
+                    'total_seconds': total,
+                    'mean_seconds': total / calls,
+                    'max_seconds': max_seconds,
+                    'bytes': nbytes,
+                }
+                for name, (calls, total, max_seconds, nbytes) in self._stages.items()
+            }
+            return {
+                'wall_seconds': time.perf_counter() - self.origin,
+                'stages': stages,
+                'counters': dict(self._counters),
+            }
+
+    def save_json(self, path):
+        """Save the statistics of :meth:`stats` as json
+
+        Args:
+            path(str): output path.
+        """
+        with open(path, 'w') as f:
+            json.dump(self.stats(), f, indent = 1)
+
+    def save_chrome_trace(self, path):
+        """Save the recorded stage executions in the chrome trace event format
+
+        The trace opens in chrome://tracing or https://ui.perfetto.dev, it is empty
+        unless the profiler was created with trace enabled.
+
+        Args:
+            path(str): output path.
+        """
+        pid = os.getpid()
+        with self._lock:
+            events = [
+                {
+                    'name': name,
+                    'cat': 'ocrtoc',
+                    'ph': 'X',
+                    'ts': 1e6 * (start - self.origin),
+                    'dur': 1e6 * duration,
+                    'pid': pid,
+                    'tid': tid,
+                    'args': {'bytes': nbytes},
+                }
+                for name, start, duration, nbytes, tid in self._events
+            ]
+            other_data = {'counters': dict(self._counters), 'dropped_events': self.dropped_events}
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms', 'otherData': other_data}, f)
+
+    def log_stats(self):
+        """Log the statistics sorted by total time at DEBUG level"""
+        stats = self.stats()
+        lines = ['profile of {:.3f}s'.format(stats['wall_seconds'])]
+        for name, stage in sorted(stats['stages'].items(), key = lambda item: -item[1]['total_seconds']):
+            lines.append('{:>24}: {:8d} calls, {:9.3f}s total, {:8.3f}ms mean, {:8.3f}ms max, {:10.1f}MB'.format(
+                name, stage['calls'], stage['total_seconds'], 1e3 * stage['mean_seconds'],
+                1e3 * stage['max_seconds'], stage['bytes'] / 1e6))
+        for name, value in sorted(stats['counters'].items()):
+            lines.append('{:>24}: {}'.format(name, value))
+        logger.debug('\n'.join(lines))
+
+def get_profiler():
+    """Get the active profiler
+
+    Returns:
+        Profiler or None: the profiler, None if profiling is disabled.
+    """
+    return _profiler
+
+def enable_profiling(trace = False, max_events = 1000000):
+    """Start profiling the loaders with a new profiler
+
+    Args:
+        trace(bool): keep every stage execution for the chrome trace.
+        max_events(int): maximum number of kept executions.
+
+    Returns:
+        Profiler: the active profiler.
+    """
+    global _profiler
+    _profiler = Profiler(trace = trace, max_events = max_events)
+    return _profiler
+
+def disable_profiling():
+    """Stop profiling
+
+    Returns:
+        Profiler or None: the profiler which was active.
+    """
+    global _profiler
+    profiler, _profiler = _profiler, None
+    return profiler
+
+@contextlib.contextmanager
+def profiling(trace = False, max_events = 1000000):
+    """Profile a block, the previously active profiler is restored afterwards
+
+    Args:
+        trace(bool): keep every stage execution for the chrome trace.
+        max_events(int): maximum number of kept executions.
+
+    Yields:
+        Profiler: the profiler of the block.
+    """
+    global _profiler
+    previous = _profiler
+    profiler = enable_profiling(trace = trace, max_events = max_events)
+    try:
+        yield profiler
+    finally:
+        _profiler = previous
+
+def profile_stage(name, nbytes = 0):
+    """Time a stage with the active profiler
+
+    Args:
+        name(str): stage name.
+        nbytes(int): bytes read by the stage.
+
+    Returns:
+        context manager timing the stage, doing nothing if profiling is disabled.
+    """
+    profiler = _profiler
+    if profiler is None:
+        return _NULL_STAGE
+    return _Stage(profiler, name, nbytes)
+
+def profile_count(name, value = 1):
+    """Increment a counter of the active profiler, nothing is done if profiling is disabled
+
+    Args:
+        name(str): counter name.
+        value(int or float): increment.
+    """
+    profiler = _profiler
+    if profiler is not None:
+        profiler.count(name, value)
+
+def read_image(path, flags = cv2.IMREAD_COLOR):
+    """Read an image like cv2.imread, timing the file read and the decoding separately when profiling
+
+    Args:
+        path(str): image path.
+        flags(int): cv2 imread flags.
+
+    Returns:
+        np.ndarray or None: the image, None if it cannot be read.
+    """
+    profiler = _profiler
+    if profiler is None:
+        return cv2.imread(path, flags)
+    with profiler.stage('file_read') as stage:
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        stage.add_bytes(len(data))
+    with profiler.stage('image_decode'):
+        return cv2.imdecode(np.frombuffer(data, dtype = np.uint8), flags)
+
+def load_npy(path):
+    """Load a npy file like np.load, timed when profiling
+
+    Args:
+        path(str): npy path.
+
+    Returns:
+        np.ndarray: the array.
+    """
+    profiler = _profiler
+    if profiler is None:
+        return np.load(path)
+    with profiler.stage('npy_load', os.path.getsize(path)):
+        return np.load(path)
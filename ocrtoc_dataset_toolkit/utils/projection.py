@@ -0,0 +1,111 @@
+import numpy as np
+
+PROJECTION_MODES = ('points', 'corners', 'keypoints')
+
+def get_bbox_corners(points):
+    """Get the 8 corners of the axis aligned bounding box of points
+
+    Args:
+        points(np.ndarray(N, 3)): points.
+
+    Returns:
+        np.ndarray(8, 3): corners, the i-th corner takes the max along axis k when bit k of i is set.
+    """
+    bounds = np.stack([points.min(axis = 0), points.max(axis = 0)])
+    bits = (np.arange(8)[:, np.newaxis] >> np.arange(3)[np.newaxis, :]) & 1
+    return bounds[bits, np.arange(3)[np.newaxis, :]]
+
+def invert_poses(poses):
+    """Invert rigid transformations
+
+    Args:
+        poses(np.ndarray(F, 4, 4)): transformation matrices.
+
+    Returns:
+        np.ndarray(F, 4, 4): inverse matrices.
+    """
+    rotations = np.swapaxes(poses[:, :3, :3], 1, 2)
+    inverses = np.zeros_like(poses)
+    inverses[:, :3, :3] = rotations
+    inverses[:, :3, 3] = -np.einsum('fij,fj->fi', rotations, poses[:, :3, 3])
+    inverses[:, 3, 3] = 1
+    return inverses
+
+def project_points(points, object_pose, camera_poses, intrinsics):
+    """Project object points into several frames in one batched computation
+
+    Args:
+        points(np.ndarray(N, 3)): points in object frame.
+        object_pose(np.ndarray(4, 4)): object pose in world frame.
+        camera_poses(np.ndarray(F, 4, 4)): camera poses in world frame.
+        intrinsics(np.ndarray): camera intrinsics matrix.
+
+    Returns:
+        np.ndarray(F, N, 2), np.ndarray(F, N): pixel coordinates (u, v) and depths
+        in meters, coordinates are nan for points behind the camera.
+    """
+    object_to_camera = invert_poses(np.asarray(camera_poses, dtype = np.float64)) @ np.asarray(object_pose, dtype = np.float64)
+    camera_points = np.einsum('fij,nj->fni', object_to_camera[:, :3, :3], np.asarray(points, dtype = np.float64))
+    camera_points += object_to_camera[:, np.newaxis, :3, 3]
+    depths = camera_points[..., 2]
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        inverse_depths = np.where(depths > 0, 1.0 / depths, np.nan)
+    uv = np.empty(shape = depths.shape + (2,), dtype = np.float64)
+    uv[..., 0] = camera_points[..., 0] * inverse_depths * intrinsics[0, 0] + intrinsics[0, 2]
+    uv[..., 1] = camera_points[..., 1] * inverse_depths * intrinsics[1, 1] + intrinsics[1, 2]
+    return uv, depths
+
+def get_visibility(uv, depths, image_shape, depth_images = None, depth_scale = 1000.0, depth_tolerance = 0.01):
+    """Test which projected points fall in the image and are not occluded
+
+    Args:
+        uv(np.ndarray(F, N, 2)): pixel coordinates.
+        depths(np.ndarray(F, N)): depths in meters.
+        image_shape(tuple of int): (height, width).
+        depth_images(np.ndarray(F, H, W) or None): depth images for the occlusion test,
+            no occlusion test if None.
+        depth_scale(float): the depth factor.
+        depth_tolerance(float): points up to this distance behind the measured depth are visible.
+
+    Returns:
+        np.ndarray(F, N): bool visibility.
+    """
+    height, width = image_shape[:2]
+    visible = (depths > 0) & (uv[..., 0] >= 0) & (uv[..., 0] < width) & (uv[..., 1] >= 0) & (uv[..., 1] < height)
+    if depth_images is None:
+        return visible
+    frame_index, point_index = np.nonzero(visible)
+    u = uv[frame_index, point_index, 0].astype(np.int64)
+    v = uv[frame_index, point_index, 1].astype(np.int64)
+    measured = depth_images[frame_index, v, u] / depth_scale
+    # pixels without depth cannot occlude
+    occluded = (measured > 0) & (depths[frame_index, point_index] > measured + depth_tolerance)
+    visible[frame_index[occluded], point_index[occluded]] = False
+    return visible
+
+def get_boxes(uv, mask, image_shape):
+    """Get the per frame 2d bounding boxes of the masked points
+
+    Args:
+        uv(np.ndarray(F, N, 2)): pixel coordinates.
+        mask(np.ndarray(F, N)): bool mask of the points to bound.
+        image_shape(tuple of int): (height, width), boxes are clipped to the image.
+
+    Returns:
+        np.ndarray(F, 4): (x_min, y_min, x_max, y_max) boxes, nan for frames without masked
+        points or whose box is outside the image.
+    """
+    height, width = image_shape[:2]
+    u = np.where(mask, uv[..., 0], np.nan)
+    v = np.where(mask, uv[..., 1], np.nan)
+    boxes = np.full(shape = (uv.shape[0], 4), fill_value = np.nan)
+    has_points = mask.any(axis = 1)
+    boxes[has_points, 0] = np.nanmin(u[has_points], axis = 1)
+    boxes[has_points, 1] = np.nanmin(v[has_points], axis = 1)
+    boxes[has_points, 2] = np.nanmax(u[has_points], axis = 1)
+    boxes[has_points, 3] = np.nanmax(v[has_points], axis = 1)
+    outside = (boxes[:, 2] < 0) | (boxes[:, 0] > width - 1) | (boxes[:, 3] < 0) | (boxes[:, 1] > height - 1)
+    boxes[outside] = np.nan
+    boxes[:, [0, 2]] = np.clip(boxes[:, [0, 2]], 0, width - 1)
+    boxes[:, [1, 3]] = np.clip(boxes[:, [1, 3]], 0, height - 1)
+    return boxes
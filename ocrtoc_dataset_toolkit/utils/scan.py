@@ -0,0 +1,327 @@
+import os
+import json
+import hashlib
+import numpy as np
+
+from .logging import get_main_logger
+from .pack import read_frame_file
+from .parallel import imap_ordered
+
+logger = get_main_logger()
+
+SCAN_STATE_FILE_NAME = 'scan_state.json'
+SCAN_VERSION = 2
+
+# frame folder -> file extension, all folders must hold the same frames
+SCAN_FRAME_FOLDERS = {
+    'rgb_undistort': 'png',
+    'depth_undistort': 'png',
+    'seg_masks': 'npy',
+    'camera_poses': 'npy',
+}
+# the other scene entries whose changes trigger a rescan
+_SCENE_FILES = ('object_list.txt', 'color_camK.npy')
+
+def get_scan_params(dataset, depth_bins = 64, max_depth = 4.0):
+    """Get the parameters a scan depends on
+
+    Args:
+        dataset(OCRTOC_Dataset): the dataset.
+        depth_bins(int): bins of the depth histogram.
+        max_depth(float): upper bound in meters of the depth histogram, deeper pixels fall in the last bin.
+
+    Returns:
+        dict: json serializable parameters.
+    """
+    return {
+        'version': SCAN_VERSION,
+        'depth_bins': depth_bins,
+        'max_depth': max_depth,
+        'object_name_list': list(dataset.object_name_list),
+    }
+
+def _list_frame_ids(folder, ext):
+    try:
+        names = os.listdir(folder)
+    except FileNotFoundError:
+        return None
+    frame_ids = []
+    for name in names:
+        stem, _, name_ext = name.partition('.')
+        if name_ext == ext and stem.isdigit():
+            frame_ids.append(int(stem))
+    return sorted(frame_ids)
+
+def get_scene_signature(scene_dir):
+    """Get a digest of the names, sizes and modification times of the files of a scene
+
+    Args:
+        scene_dir(str): scene directory.
+
+    Returns:
+        str: hex digest, it changes when a scanned file is added, removed or modified.
+    """
+    entries = []
+    for sub_dir in list(SCAN_FRAME_FOLDERS) + ['object_poses']:
+        try:
+            with os.scandir(os.path.join(scene_dir, sub_dir)) as iterator:
+                for entry in iterator:
+                    stat = entry.stat()
+                    entries.append((sub_dir, entry.name, stat.st_size, stat.st_mtime_ns))
+        except FileNotFoundError:
+            entries.append((sub_dir, None, None, None))
+    for name in _SCENE_FILES:
+        try:
+            stat = os.stat(os.path.join(scene_dir, name))
+            entries.append(('', name, stat.st_size, stat.st_mtime_ns))
+        except FileNotFoundError:
+            entries.append(('', name, None, None))
+    entries.sort(key = lambda entry: (entry[0], entry[1] or ''))
+    return hashlib.sha1(json.dumps(entries).encode('utf-8')).hexdigest()
+
+def scan_scene(dataset, scene_id, params, previous = None):
+    """Check the integrity of a scene and compute its statistics
+
+    The checks are:
+        - every frame folder holds the same frame indices,
+        - the listed objects are known and have a pose file,
+        - the frames decode, their shapes agree, depths are uint16 and poses are finite 4x4 matrices,
+        - the mask ids belong to the listed objects.
+
+    The original frame files are read, not the compressed copies the loaders prefer.
+
+    Args:
+        dataset(OCRTOC_Dataset): a dataset created with use_manifest = False and packed = False,
+            so that the files themselves are read.
+        scene_id(int): scene index.
+        params(dict): parameters of :func:`get_scan_params`.
+        previous(dict or None): a previous record of the scene, returned as it is if the
+            scene files and the parameters did not change.
+
+    Returns:
+        dict: the scene record with the scene name, the signature, the errors,
+        the frame counts of each folder, the depth histogram, the per object pixel
+        and frame counts and the posed objects. 'reused' tells whether the scene was skipped.
+    """
+    scene_name = dataset.load_scene_name(scene_id)
+    scene_dir = os.path.join(dataset.root, 'scenes', scene_name)
+    signature = get_scene_signature(scene_dir)
+    if previous is not None and previous.get('signature') == signature and previous.get('params') == params:
+        return dict(previous, reused = True)
+    errors = []
+    object_names = dataset.object_name_list
+    object_pixels = np.zeros(shape = (len(object_names) + 1,), dtype = np.int64)
+    object_frames = np.zeros(shape = (len(object_names) + 1,), dtype = np.int64)
+    depth_histogram = np.zeros(shape = (params['depth_bins'],), dtype = np.int64)
+    depth_valid_pixels = 0
+
+    folder_frame_ids = dict()
+    for folder, ext in SCAN_FRAME_FOLDERS.items():
+        frame_ids = _list_frame_ids(os.path.join(scene_dir, folder), ext)
+        if frame_ids is None:
+            errors.append('missing folder {}'.format(folder))
+            frame_ids = []
+        folder_frame_ids[folder] = frame_ids
+    all_frame_ids = sorted(set().union(*folder_frame_ids.values()))
+    for folder, frame_ids in folder_frame_ids.items():
+        missing = sorted(set(all_frame_ids) - set(frame_ids))
+        if len(missing) > 0:
+            errors.append('{} misses frames {}'.format(folder, missing))
+    if len(all_frame_ids) > 0 and all_frame_ids != list(range(len(all_frame_ids))):
+        errors.append('frame indices are not contiguous from 0')
+
+    try:
+        scene_object_names = dataset.load_scene_object_list(scene_id)
+    except OSError as e:
+        errors.append('cannot read object_list.txt: {}'.format(e))
+        scene_object_names = []
+    scene_object_ids = set()
+    posed_objects = []
+    for object_name in scene_object_names:
+        if object_name not in dataset.object_id_dict:
+            errors.append('unknown object {} in object_list.txt'.format(object_name))
+            continue
+        scene_object_ids.add(dataset.object_id_dict[object_name])
+        if os.path.exists(os.path.join(scene_dir, 'object_poses', object_name + '.npy')):
+            posed_objects.append(object_name)
+        else:
+            errors.append('missing pose of object {}'.format(object_name))
+
+    try:
+        intrinsics = dataset.load_real_camera_intrinsic(scene_id)
+        if intrinsics.shape != (3, 3) or not np.isfinite(intrinsics).all():
+            errors.append('invalid intrinsics of shape {}'.format(intrinsics.shape))
+    except (OSError, ValueError) as e:
+        errors.append('cannot read color_camK.npy: {}'.format(e))
+
+    max_depth_mm = params['max_depth'] * 1000.0
+    unknown_mask_ids = set()
+    for image_id in sorted(set.intersection(*(set(frame_ids) for frame_ids in folder_frame_ids.values()))):
+        try:
+            rgb, depth, seg_mask, pose = [
+                read_frame_file(scene_dir, field, image_id) for field in ['rgb', 'depth', 'mask', 'pose']
+            ]
+        except Exception as e:
+            errors.append('frame {} cannot be read: {}'.format(image_id, e))
+            continue
+        if depth.dtype != np.uint16:
+            errors.append('frame {} depth is {} instead of uint16'.format(image_id, depth.dtype))
+        if not (rgb.shape[:2] == depth.shape == seg_mask.shape):
+            errors.append('frame {} shapes differ: rgb {}, depth {}, mask {}'.format(
+                image_id, rgb.shape, depth.shape, seg_mask.shape))
+            continue
+        if pose.shape != (4, 4) or not np.isfinite(pose).all():
+            errors.append('frame {} invalid camera pose'.format(image_id))
+
+        valid_depth = depth[depth > 0]
+        depth_valid_pixels += len(valid_depth)
+        bins = np.minimum((valid_depth * (params['depth_bins'] / max_depth_mm)).astype(np.int64), params['depth_bins'] - 1)
+        depth_histogram += np.bincount(bins, minlength = params['depth_bins'])
+
+        counts = np.bincount(seg_mask.reshape(-1).astype(np.int64))
+        mask_ids = np.flatnonzero(counts)
+        mask_ids = mask_ids[mask_ids != 0]
+        unknown = [int(mask_id) for mask_id in mask_ids if mask_id not in scene_object_ids]
+        if len(unknown) > 0:
+            unknown_mask_ids.update(unknown)
+        known_ids = mask_ids[mask_ids < len(object_pixels)]
+        object_pixels[known_ids] += counts[known_ids]
+        object_frames[known_ids] += 1
+    if len(unknown_mask_ids) > 0:
+        errors.append('mask ids {} are not objects of the scene'.format(sorted(unknown_mask_ids)))
+
+    return {
+        'scene_name': scene_name,
+        'signature': signature,
+        'params': params,
+        'reused': False,
+        'errors': errors,
+        'frame_counts': {folder: len(frame_ids) for folder, frame_ids in folder_frame_ids.items()},
+        'depth_histogram': depth_histogram.tolist(),
+        'depth_valid_pixels': int(depth_valid_pixels),
+        'object_pixels': {
+            object_names[object_id - 1]: int(object_pixels[object_id]) for object_id in np.flatnonzero(object_pixels[1:]) + 1
+        },
+        'object_frames': {
+            object_names[object_id - 1]: int(object_frames[object_id]) for object_id in np.flatnonzero(object_frames[1:]) + 1
+        },
+        'object_list': list(scene_object_names),
+        'posed_objects': posed_objects,
+    }
+
+def check_dataset(dataset):
+    """Check the dataset level files
+
+    Args:
+        dataset(OCRTOC_Dataset): the dataset.
+
+    Returns:
+        list of str: errors, the scenes of the scene list must exist and every object must have a model.
+    """
+    errors = []
+    for scene_name in dataset.scene_name_list:
+        if not os.path.isdir(os.path.join(dataset.root, 'scenes', scene_name)):
+            errors.append('missing scene {}'.format(scene_name))
+    for object_name in dataset.object_name_list:
+        if not os.path.exists(os.path.join(dataset.root, 'rgb_pcd', '{}.ply'.format(object_name))):
+            errors.append('missing model of object {}'.format(object_name))
+    return errors
+
+def iter_scan(dataset, params, previous_records = None, workers = None, worker_type = 'process'):
+    """Scan the scenes of a dataset in parallel and yield their records as they are done
+
+    Args:
+        dataset(OCRTOC_Dataset): the dataset, see :func:`scan_scene`.
+        params(dict): parameters of :func:`get_scan_params`.
+        previous_records(dict or None): scene name to record of a previous scan,
+            unchanged scenes are not scanned again.
+        workers(int or None): number of workers, each processing whole scenes.
+        worker_type(str): 'thread' or 'process'.
+
+    Yields:
+        dict: scene records in scene order.
+    """
+    if dataset.manifest is not None or dataset.packed:
+        raise ValueError('The scan must read the files of a dataset created with use_manifest = False and packed = False')
+    previous_records = dict() if previous_records is None else previous_records
+    scene_ids = [
+        scene_id for scene_id in range(dataset.load_scene_number())
+        if os.path.isdir(os.path.join(dataset.root, 'scenes', dataset.load_scene_name(scene_id)))
+    ]
+    yield from imap_ordered(
+        scan_scene,
+        (
+            (dataset, scene_id, params, previous_records.get(dataset.load_scene_name(scene_id)))
+            for scene_id in scene_ids
+        ),
+        workers = workers,
+        worker_type = worker_type
+    )
+
+def summarize_scan(records, dataset_errors = ()):
+    """Aggregate the scene records of a scan
+
+    Args:
+        records(list of dict): scene records.
+        dataset_errors(list of str): errors of :func:`check_dataset`.
+
+    Returns:
+        dict: error numbers, frame number, depth histogram and per object pixel counts,
+        frame counts and pose coverage, the ratio of the scenes listing an object which have its pose.
+    """
+    depth_histogram = None
+    object_pixels, object_frames, listed, posed = dict(), dict(), dict(), dict()
+    for record in records:
+        histogram = np.asarray(record['depth_histogram'], dtype = np.int64)
+        depth_histogram = histogram if depth_histogram is None else depth_histogram + histogram
+        for object_name, pixels in record['object_pixels'].items():
+            object_pixels[object_name] = object_pixels.get(object_name, 0) + pixels
+        for object_name, frames in record['object_frames'].items():
+            object_frames[object_name] = object_frames.get(object_name, 0) + frames
+        for object_name in record['object_list']:
+            listed[object_name] = listed.get(object_name, 0) + 1
+        for object_name in record['posed_objects']:
+            posed[object_name] = posed.get(object_name, 0) + 1
+    return {
+        'scene_number': len(records),
+        'rescanned_scene_number': sum(1 for record in records if not record['reused']),
+        'frame_number': sum(min(record['frame_counts'].values(), default = 0) for record in records),
+        'error_number': len(dataset_errors) + sum(len(record['errors']) for record in records),
+        'dataset_errors': list(dataset_errors),
+        'depth_histogram': [] if depth_histogram is None else depth_histogram.tolist(),
+        'depth_valid_pixels': sum(record['depth_valid_pixels'] for record in records),
+        'object_pixels': object_pixels,
+        'object_frames': object_frames,
+        'pose_coverage': {object_name: posed.get(object_name, 0) / number for object_name, number in listed.items()},
+    }
+
+def save_scan_state(path, records):
+    """Save the scene records for the next incremental scan
+
+    Args:
+        path(str): state path.
+        records(list of dict): scene records.
+    """
+    state = {'version': SCAN_VERSION, 'records': {record['scene_name']: record for record in records}}
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+def load_scan_state(path):
+    """Load the scene records of a previous scan
+
+    Args:
+        path(str): state path.
+
+    Returns:
+        dict: scene name to record, empty if there is no usable state.
+    """
+    if not os.path.exists(path):
+        return dict()
+    with open(path) as f:
+        state = json.load(f)
+    if state.get('version') != SCAN_VERSION:
+        logger.warning('Ignore scan state of version {}'.format(state.get('version')))
+        return dict()
+    return state['records']
@@ -0,0 +1,189 @@
+import os
+import io
+import json
+import tarfile
+import numpy as np
+import cv2
+
+from .logging import get_main_logger
+from .pack import PACK_FIELDS
+
+logger = get_main_logger()
+
+SHARD_INDEX_FILE_NAME = 'shards.json'
+SHARD_FIELDS = ('rgb', 'depth', 'mask', 'pose', 'intrinsics', 'object_poses')
+
+# field name -> member extension, the frame files are stored as they are on disk
+_MEMBER_EXTENSIONS = {
+    'rgb': 'rgb.png',
+    'depth': 'depth.png',
+    'mask': 'mask.npy',
+    'pose': 'pose.npy',
+    'intrinsics': 'intrinsics.npy',
+    'object_poses': 'object_poses.npz',
+}
+
+def _split_member_name(name):
+    """Split a member name into its frame key and its known extension
+
+    The key may contain dots, so the extension is matched against the known ones
+    instead of being taken after the first dot.
+
+    Returns:
+        str, str or None, None: frame key and extension, None if the extension is unknown.
+    """
+    for extension in ['json'] + list(_MEMBER_EXTENSIONS.values()):
+        if name.endswith('.' + extension) and len(name) > len(extension) + 1:
+            return name[:-len(extension) - 1], extension
+    return None, None
+
+def _npy_bytes(array):
+    buffer = io.BytesIO()
+    np.save(buffer, array)
+    return buffer.getvalue()
+
+def _add_member(tar, name, data):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    tar.addfile(info, io.BytesIO(data))
+
+def plan_shards(dataset, frames_per_shard = 1000, scene_ids = None):
+    """Split the frames of the dataset into shards following scene_name_list
+
+    Args:
+        dataset(OCRTOC_Dataset): the dataset.
+        frames_per_shard(int): frames in each shard, the last one may hold less.
+        scene_ids(list of int or None): scenes, all scenes by default.
+
+    Returns:
+        list of list of (int, int): scene and image indices of each shard.
+    """
+    scene_ids = range(dataset.load_scene_number()) if scene_ids is None else scene_ids
+    frame_ids = [
+        (scene_id, image_id)
+        for scene_id in scene_ids
+        for image_id in range(dataset.load_scene_image_number(scene_id))
+    ]
+    return [frame_ids[start:start + frames_per_shard] for start in range(0, len(frame_ids), frames_per_shard)]
+
+def write_shard(dataset, shard_path, frame_ids):
+    """Write complete frames into a tar shard
+
+    Each frame is stored as consecutive members named <scene_name>_<image_id>.<field>
+    in the WebDataset layout. Images and masks are copied without decoding.
+
+    Args:
+        dataset(OCRTOC_Dataset): the dataset.
+        shard_path(str): output tar path.
+        frame_ids(list of (int, int)): scene and image indices.
+
+    Returns:
+        str, int: shard path and number of frames.
+    """
+    tmp_path = '{}.{}.tmp'.format(shard_path, os.getpid())
+    with tarfile.open(tmp_path, 'w') as tar:
+        for scene_id, image_id in frame_ids:
+            scene_name = dataset.load_scene_name(scene_id)
+            scene_dir = os.path.join(dataset.root, 'scenes', scene_name)
+            key = '{}_{:04d}'.format(scene_name, image_id)
+            _add_member(tar, key + '.json', json.dumps({
+                'scene_id': scene_id,
+                'image_id': image_id,
+                'scene_name': scene_name,
+            }).encode('utf-8'))
+            for field in ('rgb', 'depth', 'mask', 'pose'):
+                sub_dir, ext = PACK_FIELDS[field]
+                with open(os.path.join(scene_dir, sub_dir, '%04d.%s' % (image_id, ext)), 'rb') as f:
+                    _add_member(tar, '{}.{}'.format(key, _MEMBER_EXTENSIONS[field]), f.read())
+            _add_member(tar, '{}.{}'.format(key, _MEMBER_EXTENSIONS['intrinsics']),
+                _npy_bytes(dataset.load_real_camera_intrinsic(scene_id)))
+            object_poses = {
+                name: pose for name, pose in dataset.load_object_pose_dict(scene_id).items() if pose is not None
+            }
+            buffer = io.BytesIO()
+            np.savez(buffer, **object_poses)
+            _add_member(tar, '{}.{}'.format(key, _MEMBER_EXTENSIONS['object_poses']), buffer.getvalue())
+    os.replace(tmp_path, shard_path)
+    return shard_path, len(frame_ids)
+
+def save_shard_index(output_dir, shard_names, frame_numbers):
+    """Save the list of shards and their frame numbers
+
+    Args:
+        output_dir(str): shard directory.
+        shard_names(list of str): shard file names.
+        frame_numbers(list of int): frames in each shard.
+
+    Returns:
+        str: index path.
+    """
+    index_path = os.path.join(output_dir, SHARD_INDEX_FILE_NAME)
+    with open(index_path, 'w') as f:
+        json.dump({'shards': [
+            {'name': name, 'frame_number': frame_number}
+            for name, frame_number in zip(shard_names, frame_numbers)
+        ]}, f, indent = 1)
+    return index_path
+
+def load_shard_paths(shard_dir):
+    """Load the shard paths listed in the index of a shard directory
+
+    Args:
+        shard_dir(str): shard directory.
+
+    Returns:
+        list of str: shard paths in export order.
+    """
+    with open(os.path.join(shard_dir, SHARD_INDEX_FILE_NAME)) as f:
+        index = json.load(f)
+    return [os.path.join(shard_dir, shard['name']) for shard in index['shards']]
+
+def _decode_member(field, data):
+    if field == 'rgb':
+        bgr = cv2.imdecode(np.frombuffer(data, dtype = np.uint8), cv2.IMREAD_COLOR)
+        return cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+    if field == 'depth':
+        return cv2.imdecode(np.frombuffer(data, dtype = np.uint8), cv2.IMREAD_UNCHANGED)
+    if field == 'object_poses':
+        with np.load(io.BytesIO(data)) as poses:
+            return {name: poses[name] for name in poses.files}
+    return np.load(io.BytesIO(data))
+
+def read_shard(shard_path, fields = SHARD_FIELDS):
+    """Stream the frames of a shard sequentially
+
+    Args:
+        shard_path(str): shard path.
+        fields(tuple of str): fields among 'rgb', 'depth', 'mask', 'pose', 'intrinsics' and 'object_poses'.
+
+    Yields:
+        dict: scene_id, image_id and the requested fields, as returned by :func:`load_frame`,
+        object_poses being a dict of object name to pose of the posed objects.
+    """
+    for field in fields:
+        if field not in SHARD_FIELDS:
+            raise ValueError('Unknown field {}, only {} are allowed.'.format(field, SHARD_FIELDS))
+    extension_fields = {_MEMBER_EXTENSIONS[field]: field for field in fields}
+    frame = None
+    frame_key = None
+    with tarfile.open(shard_path, 'r|') as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            key, extension = _split_member_name(member.name)
+            if key is None:
+                raise ValueError('Malformed member {} in shard {}'.format(member.name, shard_path))
+            if extension == 'json':
+                if frame is not None:
+                    yield frame
+                meta = json.loads(tar.extractfile(member).read().decode('utf-8'))
+                frame = {'scene_id': meta['scene_id'], 'image_id': meta['image_id']}
+                frame_key = key
+            elif key != frame_key:
+                raise ValueError('Member {} in shard {} does not follow the json member of its frame'.format(
+                    member.name, shard_path))
+            elif extension in extension_fields:
+                field = extension_fields[extension]
+                frame[field] = _decode_member(field, tar.extractfile(member).read())
+    if frame is not None:
+        yield frame
@@ -0,0 +1,275 @@
+import os
+import numpy as np
+import cv2
+
+from .logging import get_main_logger
+from .parallel import imap_ordered
+
+logger = get_main_logger()
+
+SYNTHETIC_SCENE_NAME_OFFSET = 20210000000000
+# half size of the square table in meters, pixels outside the table and the objects have no depth
+_TABLE_HALF_SIZE = 0.5
+
+def get_synthetic_object_names(object_number):
+    """Get the names of the synthetic objects
+
+    Args:
+        object_number(int): number of objects.
+
+    Returns:
+        list of str: object names.
+    """
+    return ['object_{:03d}'.format(object_index) for object_index in range(object_number)]
+
+def get_synthetic_object_models(object_number, seed = 0):
+    """Get the colors and radii of the synthetic sphere models
+
+    Args:
+        object_number(int): number of objects.
+        seed(int): random seed of the dataset.
+
+    Returns:
+        np.ndarray(K, 3), np.ndarray(K): RGB colors in [0, 1] and radii in meters.
+    """
+    rng = np.random.RandomState(seed)
+    return rng.uniform(0.1, 1.0, size = (object_number, 3)), rng.uniform(0.02, 0.06, size = object_number)
+
+def write_sphere_ply(path, radius, color, latitudes = 16, longitudes = 32):
+    """Write a colored uv sphere mesh centered at the origin as an ascii ply file
+
+    Args:
+        path(str): output path.
+        radius(float): sphere radius in meters.
+        color(np.ndarray(3)): RGB color in [0, 1].
+        latitudes(int): rings of the sphere.
+        longitudes(int): segments of the rings.
+    """
+    theta = np.linspace(0, np.pi, latitudes + 1)[1:-1]
+    phi = np.linspace(0, 2 * np.pi, longitudes, endpoint = False)
+    theta, phi = np.meshgrid(theta, phi, indexing = 'ij')
+    vertices = np.concatenate([
+        [[0, 0, radius]],
+        np.stack([
+            radius * np.sin(theta) * np.cos(phi),
+            radius * np.sin(theta) * np.sin(phi),
+            radius * np.cos(theta),
+        ], axis = -1).reshape(-1, 3),
+        [[0, 0, -radius]],
+    ])
+    rings = latitudes - 1
+    faces = []
+    for segment in range(longitudes):
+        next_segment = (segment + 1) % longitudes
+        faces.append((0, 1 + segment, 1 + next_segment))
+        for ring in range(rings - 1):
+            a = 1 + ring * longitudes + segment
+            b = 1 + ring * longitudes + next_segment
+            faces.append((a, a + longitudes, b + longitudes))
+            faces.append((a, b + longitudes, b))
+        bottom = 1 + (rings - 1) * longitudes
+        faces.append((bottom + segment, len(vertices) - 1, bottom + next_segment))
+    rgb = np.round(np.asarray(color) * 255).astype(np.uint8)
+    lines = [
+        'ply',
+        'format ascii 1.0',
+        'element vertex {}'.format(len(vertices)),
+        'property float x',
+        'property float y',
+        'property float z',
+        'property uchar red',
+        'property uchar green',
+        'property uchar blue',
+        'element face {}'.format(len(faces)),
+        'property list uchar int vertex_indices',
+        'end_header',
+    ]
+    lines += ['{:.6f} {:.6f} {:.6f} {} {} {}'.format(*vertex, *rgb) for vertex in vertices]
+    lines += ['3 {} {} {}'.format(*face) for face in faces]
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+def get_look_at_pose(camera_center, target):
+    """Get the camera to world pose of a camera looking at a target, z forward and y down
+
+    Args:
+        camera_center(np.ndarray(3)): camera center in world frame.
+        target(np.ndarray(3)): looked at point in world frame.
+
+    Returns:
+        np.ndarray(4, 4): camera pose.
+    """
+    z_axis = target - camera_center
+    z_axis /= np.linalg.norm(z_axis)
+    x_axis = np.cross(z_axis, [0.0, 0.0, 1.0])
+    x_axis /= np.linalg.norm(x_axis)
+    y_axis = np.cross(z_axis, x_axis)
+    pose = np.eye(4)
+    pose[:3, :3] = np.stack([x_axis, y_axis, z_axis], axis = 1)
+    pose[:3, 3] = camera_center
+    return pose
+
+def render_synthetic_frame(intrinsics, pose, height, width, spheres, rng):
+    """Ray cast a frame of a table with spheres lying on it
+
+    Args:
+        intrinsics(np.ndarray(3, 3)): camera intrinsics matrix.
+        pose(np.ndarray(4, 4)): camera pose in world frame.
+        height(int): image height.
+        width(int): image width.
+        spheres(list of (int, np.ndarray(3), float, np.ndarray(3))): object id, center,
+            radius and RGB color in [0, 1] of the spheres.
+        rng(np.random.RandomState): random state of the depth noise.
+
+    Returns:
+        np.ndarray(H, W, 3), np.ndarray(H, W), np.ndarray(H, W): BGR image,
+        uint16 depth in millimeters and uint8 segmentation mask.
+    """
+    u, v = np.meshgrid(np.arange(width), np.arange(height))
+    # ray directions with a unit camera z, the ray parameter is then the depth
+    rays = np.stack([
+        (u - intrinsics[0, 2]) / intrinsics[0, 0],
+        (v - intrinsics[1, 2]) / intrinsics[1, 1],
+        np.ones((height, width)),
+    ], axis = -1) @ pose[:3, :3].T
+    origin = pose[:3, 3]
+    depth = np.full((height, width), np.inf)
+    mask = np.zeros((height, width), dtype = np.uint8)
+    bgr = np.zeros((height, width, 3), dtype = np.float64)
+
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        table_depth = -origin[2] / rays[..., 2]
+    table_points = origin + table_depth[..., np.newaxis] * rays
+    on_table = (table_depth > 0) & (np.abs(table_points[..., 0]) < _TABLE_HALF_SIZE) & \
+        (np.abs(table_points[..., 1]) < _TABLE_HALF_SIZE)
+    depth[on_table] = table_depth[on_table]
+    checker = ((np.floor(table_points[..., 0] / 0.05) + np.floor(table_points[..., 1] / 0.05)) % 2)[on_table]
+    bgr[on_table] = (0.45 + 0.2 * checker)[:, np.newaxis] * np.array([0.8, 0.9, 1.0])
+
+    light = np.array([0.3, -0.2, 1.0]) / np.linalg.norm([0.3, -0.2, 1.0])
+    for object_id, center, radius, color in spheres:
+        offset = origin - center
+        b = np.einsum('hwk,k->hw', rays, offset)
+        a = np.einsum('hwk,hwk->hw', rays, rays)
+        discriminant = b * b - a * (offset @ offset - radius * radius)
+        hit = discriminant > 0
+        sphere_depth = np.full((height, width), np.inf)
+        sphere_depth[hit] = (-b[hit] - np.sqrt(discriminant[hit])) / a[hit]
+        front = hit & (sphere_depth > 0) & (sphere_depth < depth)
+        depth[front] = sphere_depth[front]
+        mask[front] = object_id
+        normals = (origin + sphere_depth[front][:, np.newaxis] * rays[front] - center) / radius
+        shading = 0.3 + 0.7 * np.clip(normals @ light, 0, 1)
+        bgr[front] = shading[:, np.newaxis] * np.asarray(color)[::-1]
+
+    valid = np.isfinite(depth)
+    depth_mm = np.zeros((height, width), dtype = np.uint16)
+    noisy_depth = depth[valid] * 1000.0 + rng.normal(0, 1.0, size = int(valid.sum()))
+    depth_mm[valid] = np.clip(np.round(noisy_depth), 1, 65535).astype(np.uint16)
+    # sensor holes
+    depth_mm[rng.rand(height, width) < 0.01] = 0
+    bgr = np.clip(bgr * 255 + rng.normal(0, 2.0, size = bgr.shape), 0, 255).astype(np.uint8)
+    return bgr, depth_mm, mask
+
+def generate_synthetic_scene(root, scene_id, image_number, object_names, objects_per_scene, height, width, seed):
+    """Generate the files of one synthetic scene
+
+    Args:
+        root(str): dataset root.
+        scene_id(int): scene index.
+        image_number(int): images in the scene.
+        object_names(list of str): names of all the objects, ids follow this order from 1.
+        objects_per_scene(int): objects in the scene.
+        height(int): image height.
+        width(int): image width.
+        seed(int): random seed of the dataset.
+
+    Returns:
+        str: scene name.
+    """
+    rng = np.random.RandomState(seed + 1 + scene_id)
+    scene_name = '{:014d}'.format(SYNTHETIC_SCENE_NAME_OFFSET + scene_id)
+    scene_dir = os.path.join(root, 'scenes', scene_name)
+    for sub_dir in ('camera_poses', 'depth_undistort', 'rgb_undistort', 'end_effector_pose', 'seg_masks', 'object_poses'):
+        os.makedirs(os.path.join(scene_dir, sub_dir), exist_ok = True)
+
+    intrinsics = np.array([
+        [0.72 * width, 0, (width - 1) / 2.0],
+        [0, 0.72 * width, (height - 1) / 2.0],
+        [0, 0, 1],
+    ])
+    np.save(os.path.join(scene_dir, 'color_camK.npy'), intrinsics)
+    np.save(os.path.join(scene_dir, 'pcd_camK.npy'), intrinsics)
+
+    object_colors, object_radii = get_synthetic_object_models(len(object_names), seed)
+    object_indices = np.sort(rng.choice(len(object_names), size = min(objects_per_scene, len(object_names)), replace = False))
+    spheres = []
+    with open(os.path.join(scene_dir, 'object_list.txt'), 'w') as f:
+        for object_index in object_indices:
+            f.write(object_names[object_index] + '\n')
+            radius = object_radii[object_index]
+            object_pose = np.eye(4)
+            yaw = rng.uniform(0, 2 * np.pi)
+            object_pose[:3, :3] = cv2.Rodrigues(np.array([0.0, 0.0, yaw]))[0]
+            object_pose[:3, 3] = [rng.uniform(-0.25, 0.25), rng.uniform(-0.25, 0.25), radius]
+            np.save(os.path.join(scene_dir, 'object_poses', object_names[object_index] + '.npy'), object_pose)
+            spheres.append((object_index + 1, object_pose[:3, 3], radius, object_colors[object_index]))
+
+    phase = rng.uniform(0, 2 * np.pi)
+    for image_id in range(image_number):
+        angle = phase + 2 * np.pi * image_id / max(image_number, 1)
+        camera_center = np.array([0.6 * np.cos(angle), 0.6 * np.sin(angle), rng.uniform(0.4, 0.6)])
+        pose = get_look_at_pose(camera_center, np.zeros(3))
+        bgr, depth, mask = render_synthetic_frame(intrinsics, pose, height, width, spheres, rng)
+        cv2.imwrite(os.path.join(scene_dir, 'rgb_undistort', '%04d.png' % image_id), bgr)
+        cv2.imwrite(os.path.join(scene_dir, 'depth_undistort', '%04d.png' % image_id), depth)
+        np.save(os.path.join(scene_dir, 'seg_masks', '%04d.npy' % image_id), mask)
+        np.save(os.path.join(scene_dir, 'camera_poses', '%04d.npy' % image_id), pose)
+        np.save(os.path.join(scene_dir, 'end_effector_pose', '%04d.npy' % image_id), pose)
+    return scene_name
+
+def generate_synthetic_dataset(root, scene_number = 2, image_number = 16, object_number = 6, objects_per_scene = 3,
+    height = 720, width = 1280, seed = 0, workers = None):
+    """Generate a synthetic dataset with the layout of the OCRTOC dataset
+
+    Each scene holds spheres of random colors and sizes lying on a checkered table,
+    seen by a camera orbiting around the table. The depth images, segmentation
+    masks and poses are consistent, so reconstructions and projections are
+    meaningful. The vis_masks folder is not generated.
+
+    Args:
+        root(str): dataset root, created if needed.
+        scene_number(int): number of scenes.
+        image_number(int): images in each scene.
+        object_number(int): number of object models.
+        objects_per_scene(int): objects in each scene.
+        height(int): image height.
+        width(int): image width.
+        seed(int): random seed, the dataset is the same for the same arguments.
+        workers(int or None): number of worker processes, each generating whole scenes.
+
+    Returns:
+        list of str: scene names.
+    """
+    os.makedirs(os.path.join(root, 'rgb_pcd'), exist_ok = True)
+    object_names = get_synthetic_object_names(object_number)
+    object_colors, object_radii = get_synthetic_object_models(object_number, seed)
+    for object_name, color, radius in zip(object_names, object_colors, object_radii):
+        write_sphere_ply(os.path.join(root, 'rgb_pcd', '{}.ply'.format(object_name)), radius, color)
+    with open(os.path.join(root, 'object_name_list.txt'), 'w') as f:
+        for object_name in object_names:
+            f.write(object_name + '\n')
+    scene_names = list(imap_ordered(
+        generate_synthetic_scene,
+        (
+            (root, scene_id, image_number, object_names, objects_per_scene, height, width, seed)
+            for scene_id in range(scene_number)
+        ),
+        workers = workers,
+        worker_type = 'process'
+    ))
+    with open(os.path.join(root, 'scene_name_list.txt'), 'w') as f:
+        for scene_name in scene_names:
+            f.write(scene_name + '\n')
+    logger.info('generated {} synthetic scenes of {} images in {}'.format(scene_number, image_number, root))
+    return scene_names
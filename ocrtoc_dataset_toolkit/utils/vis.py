@@ -1,8 +1,8 @@
 import numpy as np
 import cv2
-import matplotlib.pyplot as plt
-from PIL import Image
-import open3d as o3d
+from functools import lru_cache
+
+from .profiling import profile_stage, profile_count
 
 def get_random_color():
     """Generate random color to visualize mask
@@ -12,6 +12,177 @@ def get_random_color():
     """
     return np.random.randint(0,255,3).astype(np.uint8)
 
+def get_object_color(object_id):
+    """Get the deterministic color of an object to visualize mask
+
+    Hues are spread by the golden ratio so that consecutive ids get distinct colors.
+
+    Args:
+        object_id(int): object id.
+
+    Returns:
+        np.array(3,): The BGR value of the color
+    """
+    hue = (object_id * 0.618033988749895) % 1.0
+    hsv = np.array([[[hue * 180, 200, 255]]], dtype = np.uint8)
+    return cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)[0, 0]
+
+def overlay_seg_mask(bgr, mask, object_ids):
+    """Blend object colors into an image in one pass over the pixels
+
+    Pixels of the given objects become the mean of the image and the object color
+    from :func:`get_object_color`, other pixels are kept.
+
+    Args:
+        bgr(np.array(H, W, 3)): BGR image.
+        mask(np.array(H, W)): segmentation mask of object ids.
+        object_ids(list of int): ids of the objects to draw.
+
+    Returns:
+        np.array(H, W, 3): the blended BGR image.
+    """
+    lut_size = int(max(mask.max(initial = 0), max(object_ids, default = 0))) + 1
+    color_lut = np.zeros((lut_size, 3), dtype = np.uint8)
+    draw_lut = np.zeros((lut_size,), dtype = bool)
+    for object_id in object_ids:
+        color_lut[object_id] = get_object_color(object_id) // 2
+        draw_lut[object_id] = True
+    return np.where(draw_lut[mask][..., np.newaxis], bgr // 2 + color_lut[mask], bgr)
+
+@lru_cache(maxsize = 16)
+def _cached_ray_grid(fx, fy, cx, cy, height, width):
+    ray_x = (np.arange(width, dtype = np.float32) - np.float32(cx)) / np.float32(fx)
+    ray_y = (np.arange(height, dtype = np.float32) - np.float32(cy)) / np.float32(fy)
+    ray_x = np.ascontiguousarray(np.broadcast_to(ray_x[np.newaxis, :], (height, width)))
+    ray_y = np.ascontiguousarray(np.broadcast_to(ray_y[:, np.newaxis], (height, width)))
+    ray_x.flags.writeable = False
+    ray_y.flags.writeable = False
+    return ray_x, ray_y
+
+def get_ray_grid(intrinsics, height, width):
+    """Get the cached per pixel ray grid of a camera
+
+    Args:
+        intrinsics(np.array): camera intrinsics matrix.
+        height(int): image height.
+        width(int): image width.
+
+    Returns:
+        np.array(height, width), np.array(height, width): read only float32 (u-cx)/fx and (v-cy)/fy.
+    """
+    return _cached_ray_grid(
+        float(intrinsics[0,0]),
+        float(intrinsics[1,1]),
+        float(intrinsics[0,2]),
+        float(intrinsics[1,2]),
+        int(height),
+        int(width)
+    )
+
+def depth_to_points(depth, intrinsics, depth_scale, rgb = None, depth_range = None, roi = None,
+    organized = False, pixel_mask = None):
+    """Back-project the valid pixels of a depth image
+
+    Args:
+        depth(np.array(H, W)): depth image.
+        intrinsics(np.array): camera intrinsics matrix.
+        depth_scale(float): the depth factor.
+        rgb(np.array(H, W, 3) or None): RGB image whose colors are gathered for the valid pixels.
+        depth_range(tuple of float or None): (min, max) depth in meters of the valid pixels.
+        roi(tuple of int or None): (x_min, y_min, x_max, y_max) pixel box, cropped before back-projection.
+        organized(bool): keep the image layout, invalid pixels get zero points.
+        pixel_mask(np.array or None): bool mask of the pixels to keep, with the shape of the roi if given.
+
+    Returns:
+        np.array(N, 3), np.array(N, 3) or None: float32 points and colors in [0, 1],
+        (H, W, 3) arrays of the (cropped) image if organized.
+    """
+    with profile_stage('back_projection'):
+        ray_x, ray_y = get_ray_grid(intrinsics, depth.shape[0], depth.shape[1])
+        if roi is not None:
+            x_min, y_min, x_max, y_max = roi
+            depth = depth[y_min:y_max, x_min:x_max]
+            ray_x = ray_x[y_min:y_max, x_min:x_max]
+            ray_y = ray_y[y_min:y_max, x_min:x_max]
+            if rgb is not None:
+                rgb = rgb[y_min:y_max, x_min:x_max]
+        mask = depth > 0
+        if pixel_mask is not None:
+            mask &= pixel_mask
+        if depth_range is not None:
+            mask &= depth >= depth_range[0] * depth_scale
+            mask &= depth <= depth_range[1] * depth_scale
+        if organized:
+            points = np.empty(depth.shape + (3,), dtype = np.float32)
+            np.divide(depth, np.float32(depth_scale), out = points[..., 2], dtype = np.float32)
+            points[..., 2][~mask] = 0
+            np.multiply(ray_x, points[..., 2], out = points[..., 0])
+            np.multiply(ray_y, points[..., 2], out = points[..., 1])
+            if rgb is None:
+                return points, None
+            return points, rgb.astype(np.float32) / np.float32(255.0)
+        points_z = depth[mask].astype(np.float32) / np.float32(depth_scale)
+        points = np.empty((points_z.shape[0], 3), dtype = np.float32)
+        np.multiply(ray_x[mask], points_z, out = points[:, 0])
+        np.multiply(ray_y[mask], points_z, out = points[:, 1])
+        points[:, 2] = points_z
+        profile_count('points_back_projected', len(points))
+        if rgb is None:
+            return points, None
+        colors = rgb[mask].astype(np.float32) / np.float32(255.0)
+        return points, colors
+
+def transform_points(points, pose):
+    """Apply a rigid transformation to points with a single matrix multiply
+
+    Args:
+        points(np.array(N, 3)): points.
+        pose(np.array(4, 4)): transformation matrix.
+
+    Returns:
+        np.array(N, 3): transformed points with the dtype of points.
+    """
+    with profile_stage('transform'):
+        pose = np.asarray(pose, dtype = points.dtype)
+        transformed = points @ pose[:3, :3].T
+        transformed += pose[:3, 3]
+    return transformed
+
+def points_to_pointcloud(points, colors = None):
+    """Build an open3d point cloud from arrays
+
+    float64 arrays are handed to open3d as they are, other dtypes are converted once.
+
+    Args:
+        points(np.array(N, 3)): points.
+        colors(np.array(N, 3) or None): colors in [0, 1].
+
+    Returns:
+        open3d.geometry.PointCloud: the point cloud
+    """
+    import open3d as o3d
+    with profile_stage('vector3d_conversion'):
+        cloud = o3d.geometry.PointCloud()
+        cloud.points = o3d.utility.Vector3dVector(np.asarray(points, dtype = np.float64))
+        if colors is not None:
+            cloud.colors = o3d.utility.Vector3dVector(np.asarray(colors, dtype = np.float64))
+    return cloud
+
+def generate_pointcloud_from_arrays(depth, rgb, intrinsics, depth_scale):
+    '''Generate point cloud from decoded depth image and color image
+    
+    Args:
+        depth(np.array(H, W)): depth image.
+        rgb(np.array(H, W, 3)): RGB image.
+        intrinsics(np.array): camera intrinsics matrix.
+        depth_scale(float): the depth factor.
+
+    Returns:
+        open3d.geometry.PointCloud: the point cloud
+    '''
+    points, colors = depth_to_points(depth, intrinsics, depth_scale, rgb = rgb)
+    return points_to_pointcloud(points, colors)
+
 def generate_scene_pointcloud(depth_path, rgb_path, intrinsics, depth_scale):
     '''Generate point cloud from depth image and color image
     
@@ -24,25 +195,10 @@ def generate_scene_pointcloud(depth_path, rgb_path, intrinsics, depth_scale):
     Returns:
         open3d.geometry.PointCloud: the point cloud
     '''
-    colors = np.array(Image.open(rgb_path), dtype=np.float32) / 255.0
-    depths = np.array(Image.open(depth_path))
-    fx, fy = intrinsics[0,0], intrinsics[1,1]
-    cx, cy = intrinsics[0,2], intrinsics[1,2]
-    
-    xmap, ymap = np.arange(colors.shape[1]), np.arange(colors.shape[0])
-    xmap, ymap = np.meshgrid(xmap, ymap)
-
-    points_z = depths / depth_scale
-    points_x = (xmap - cx) / fx * points_z
-    points_y = (ymap - cy) / fy * points_z
-
-    mask = (points_z > 0)
-    points = np.stack([points_x, points_y, points_z], axis=-1)
-    points = points[mask]
-    colors = colors[mask]
-
-    cloud = o3d.geometry.PointCloud()
-    cloud.points = o3d.utility.Vector3dVector(points)
-    cloud.colors = o3d.utility.Vector3dVector(colors)
-
-    return cloud
\ No newline at end of file
+    from PIL import Image
+    return generate_pointcloud_from_arrays(
+        depth = np.array(Image.open(depth_path)),
+        rgb = np.array(Image.open(rgb_path)),
+        intrinsics = intrinsics,
+        depth_scale = depth_scale
+    )
@@ -0,0 +1,255 @@
+import os
+import io
+import json
+import numpy as np
+
+from .logging import get_main_logger
+from .manifest import get_root_signature, get_mtime_signature
+from .pack import PACKED_FILE_NAME
+from .parallel import imap_ordered
+
+logger = get_main_logger()
+
+VISIBILITY_INDEX_FILE_NAME = 'visibility_index.npz'
+VISIBILITY_INDEX_VERSION = 2
+
+# entries of a scene directory the masks are read from, '.' is the scene directory
+# itself, adding, removing or replacing a mask file changes the mtime of seg_masks
+VISIBILITY_SCENE_ENTRIES = ('.', 'seg_masks', PACKED_FILE_NAME)
+
+# one record per visible object in a frame, bbox is (x_min, y_min, x_max, y_max)
+# in pixels with inclusive bounds
+VISIBILITY_DTYPE = np.dtype([
+    ('scene_id', np.int32),
+    ('image_id', np.int32),
+    ('object_id', np.int32),
+    ('pixel_count', np.int64),
+    ('bbox', np.int32, (4,)),
+    ('visibility', np.float32),
+])
+
+def compute_mask_objects(seg_mask):
+    """Count the pixels and get the bounding boxes of the objects in a segmentation mask
+
+    Args:
+        seg_mask(np.ndarray(H, W)): segmentation mask, 0 is the background.
+
+    Returns:
+        np.ndarray(K), np.ndarray(K), np.ndarray(K, 4): object ids, pixel counts and
+        (x_min, y_min, x_max, y_max) bounding boxes.
+    """
+    seg_mask = np.asarray(seg_mask)
+    if seg_mask.size == 0:
+        return np.zeros((0,), np.int64), np.zeros((0,), np.int64), np.zeros((0, 4), np.int32)
+    labels = seg_mask.astype(np.int64, copy = False)
+    counts = np.bincount(labels.reshape(-1))
+    object_ids = np.flatnonzero(counts)
+    object_ids = object_ids[object_ids != 0]
+    # per object occupancy of the rows and columns, scattered in one pass each
+    height, width = labels.shape
+    rows = np.zeros(shape = (len(counts), height), dtype = bool)
+    cols = np.zeros(shape = (len(counts), width), dtype = bool)
+    rows[labels, np.arange(height)[:, np.newaxis]] = True
+    cols[labels, np.arange(width)[np.newaxis, :]] = True
+    rows, cols = rows[object_ids], cols[object_ids]
+    bboxes = np.stack([
+        np.argmax(cols, axis = 1),
+        np.argmax(rows, axis = 1),
+        width - 1 - np.argmax(cols[:, ::-1], axis = 1),
+        height - 1 - np.argmax(rows[:, ::-1], axis = 1),
+    ], axis = 1).astype(np.int32)
+    return object_ids, counts[object_ids], bboxes
+
+def compute_scene_visibility(dataset, scene_id):
+    """Compute the visibility records of a scene
+
+    The visibility of an object in a frame is its pixel count divided by its
+    largest pixel count over the frames of the scene.
+
+    Args:
+        dataset(OCRTOC_Dataset): the dataset.
+        scene_id(int): scene index.
+
+    Returns:
+        np.ndarray: records of :data:`VISIBILITY_DTYPE`.
+    """
+    records = []
+    for image_id in range(dataset.load_scene_image_number(scene_id)):
+        object_ids, counts, bboxes = compute_mask_objects(dataset.load_seg_mask(scene_id, image_id))
+        frame_records = np.zeros(shape = (len(object_ids),), dtype = VISIBILITY_DTYPE)
+        frame_records['scene_id'] = scene_id
+        frame_records['image_id'] = image_id
+        frame_records['object_id'] = object_ids
+        frame_records['pixel_count'] = counts
+        frame_records['bbox'] = bboxes
+        records.append(frame_records)
+    records = np.concatenate(records) if len(records) > 0 else np.zeros((0,), VISIBILITY_DTYPE)
+    if len(records) > 0:
+        max_counts = np.zeros(shape = (records['object_id'].max() + 1,), dtype = np.int64)
+        np.maximum.at(max_counts, records['object_id'], records['pixel_count'])
+        records['visibility'] = records['pixel_count'] / max_counts[records['object_id']]
+    return records
+
+class VisibilityIndex():
+    """Per frame and per object pixel counts, bounding boxes and visibility ratios
+
+    Records are sorted by scene, image and object.
+
+    Args:
+        records(np.ndarray): records of :data:`VISIBILITY_DTYPE`.
+        scene_signatures(list or None): (scene name, signature) of each scene index,
+            taken by :func:`get_visibility_scene_signature` before the masks were read.
+    """
+    def __init__(self, records, scene_signatures = None):
+        order = np.lexsort((records['object_id'], records['image_id'], records['scene_id']))
+        self.records = records[order]
+        self.scene_signatures = scene_signatures
+
+    def __len__(self):
+        return len(self.records)
+
+    def query(self, object_id = None, min_visibility = 0.0, min_pixels = 1, scene_ids = None):
+        """Select records
+
+        Args:
+            object_id(int or None): object id, all objects if None.
+            min_visibility(float): minimum visibility ratio.
+            min_pixels(int): minimum pixel count.
+            scene_ids(list of int or None): scenes to search, all scenes if None.
+
+        Returns:
+            np.ndarray: the selected records.
+        """
+        records = self.records
+        selected = (records['visibility'] >= min_visibility) & (records['pixel_count'] >= min_pixels)
+        if object_id is not None:
+            selected &= records['object_id'] == object_id
+        if scene_ids is not None:
+            selected &= np.isin(records['scene_id'], scene_ids)
+        return records[selected]
+
+    def frame_records(self, scene_id, image_id):
+        """Get the records of the objects visible in a frame
+
+        Args:
+            scene_id(int): scene index.
+            image_id(int): image index.
+
+        Returns:
+            np.ndarray: the records of the frame.
+        """
+        start = np.searchsorted(self.records['scene_id'], scene_id, side = 'left')
+        end = np.searchsorted(self.records['scene_id'], scene_id, side = 'right')
+        scene_records = self.records[start:end]
+        start = np.searchsorted(scene_records['image_id'], image_id, side = 'left')
+        end = np.searchsorted(scene_records['image_id'], image_id, side = 'right')
+        return scene_records[start:end]
+
+def get_visibility_scene_signature(root, scene_name):
+    """Get the modification times of the scene entries the visibility is computed from
+
+    Args:
+        root(str): dataset root.
+        scene_name(str): scene name.
+
+    Returns:
+        dict: entry name to mtime in ns, None for missing entries.
+    """
+    return get_mtime_signature(os.path.join(root, 'scenes', scene_name), VISIBILITY_SCENE_ENTRIES)
+
+def build_visibility_index(dataset, workers = None, worker_type = 'process'):
+    """Build the visibility index of a dataset in one parallel pass over the masks
+
+    Args:
+        dataset(OCRTOC_Dataset): the dataset.
+        workers(int or None): number of workers, each processing whole scenes.
+        worker_type(str): 'thread' or 'process'.
+
+    Returns:
+        VisibilityIndex: the index.
+    """
+    scene_signatures = [
+        (scene_name, get_visibility_scene_signature(dataset.root, scene_name))
+        for scene_name in dataset.scene_name_list
+    ]
+    scene_records = imap_ordered(
+        compute_scene_visibility,
+        ((dataset, scene_id) for scene_id in range(dataset.load_scene_number())),
+        workers = workers,
+        worker_type = worker_type
+    )
+    records = list(scene_records)
+    records = np.concatenate(records) if len(records) > 0 else np.zeros((0,), VISIBILITY_DTYPE)
+    return VisibilityIndex(records, scene_signatures)
+
+def save_visibility_index(root, index):
+    """Save the visibility index to the dataset root
+
+    Args:
+        root(str): dataset root.
+        index(VisibilityIndex): the index, built by :func:`build_visibility_index`.
+
+    Returns:
+        str: index path.
+    """
+    if index.scene_signatures is None:
+        raise ValueError('The index has no scene signatures, build it with build_visibility_index')
+    index_path = os.path.join(root, VISIBILITY_INDEX_FILE_NAME)
+    meta = json.dumps({
+        'version': VISIBILITY_INDEX_VERSION,
+        'root_signature': get_root_signature(root),
+        'scene_signatures': index.scene_signatures,
+    }).encode('utf-8')
+    buffer = io.BytesIO()
+    np.savez(buffer, records = index.records, meta = np.frombuffer(meta, dtype = np.uint8))
+    tmp_path = '{}.{}.tmp'.format(index_path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        f.write(buffer.getbuffer())
+    os.replace(tmp_path, index_path)
+    return index_path
+
+def load_visibility_index(root, dataset = None):
+    """Load the visibility index of a dataset
+
+    The records of the scenes whose masks changed since the index was built are
+    recomputed in memory when the dataset is given, otherwise the index is stale.
+
+    Args:
+        root(str): dataset root.
+        dataset(OCRTOC_Dataset or None): the dataset to recompute changed scenes from.
+
+    Returns:
+        VisibilityIndex or None: the index, None if it is missing or stale.
+    """
+    index_path = os.path.join(root, VISIBILITY_INDEX_FILE_NAME)
+    if not os.path.exists(index_path):
+        return None
+    with np.load(index_path) as data:
+        meta = json.loads(data['meta'].tobytes().decode('utf-8'))
+        if meta.get('version') != VISIBILITY_INDEX_VERSION:
+            logger.warning('Ignore visibility index of version {}'.format(meta.get('version')))
+            return None
+        if meta['root_signature'] != get_root_signature(root):
+            logger.warning('Stale visibility index, rebuild it with ocrtoc_dataset_toolkit.tools.build_visibility_index')
+            return None
+        records = data['records']
+    scene_signatures = [(scene_name, signature) for scene_name, signature in meta['scene_signatures']]
+    stale_scene_ids = [
+        scene_id for scene_id, (scene_name, signature) in enumerate(scene_signatures)
+        if signature != get_visibility_scene_signature(root, scene_name)
+    ]
+    if len(stale_scene_ids) == 0:
+        return VisibilityIndex(records, scene_signatures)
+    stale_scene_names = ', '.join(scene_signatures[scene_id][0] for scene_id in stale_scene_ids)
+    if dataset is None:
+        logger.warning('Stale visibility index of scenes {}, rebuild it with '
+            'ocrtoc_dataset_toolkit.tools.build_visibility_index'.format(stale_scene_names))
+        return None
+    logger.warning('Recompute the visibility of the changed scenes {}, rebuild the index with '
+        'ocrtoc_dataset_toolkit.tools.build_visibility_index to save them'.format(stale_scene_names))
+    scene_records = [records[~np.isin(records['scene_id'], stale_scene_ids)]]
+    for scene_id in stale_scene_ids:
+        scene_name = scene_signatures[scene_id][0]
+        scene_signatures[scene_id] = (scene_name, get_visibility_scene_signature(root, scene_name))
+        scene_records.append(compute_scene_visibility(dataset, scene_id))
+    return VisibilityIndex(np.concatenate(scene_records), scene_signatures)
@@ -20,5 +20,23 @@ setup(
         'opencv-python',
         'grasp-nms',
         'colorlog'
-    ]
+    ],
+    extras_require={
+        'torch': ['torch'],
+        'compression': ['zstandard'],
+    },
+    entry_points={
+        'console_scripts': [
+            'ocrtoc-export=ocrtoc_dataset_toolkit.tools.export:main',
+            'ocrtoc-pack-scenes=ocrtoc_dataset_toolkit.tools.pack_scenes:main',
+            'ocrtoc-export-shards=ocrtoc_dataset_toolkit.tools.export_shards:main',
+            'ocrtoc-compress-scenes=ocrtoc_dataset_toolkit.tools.compress_scenes:main',
+            'ocrtoc-build-manifest=ocrtoc_dataset_toolkit.tools.build_manifest:main',
+            'ocrtoc-scan-dataset=ocrtoc_dataset_toolkit.tools.scan_dataset:main',
+            'ocrtoc-build-visibility-index=ocrtoc_dataset_toolkit.tools.build_visibility_index:main',
+            'ocrtoc-build-scene-cache=ocrtoc_dataset_toolkit.tools.build_scene_cache:main',
+            'ocrtoc-render-overlays=ocrtoc_dataset_toolkit.tools.render_overlays:main',
+            'ocrtoc-generate-synthetic-dataset=ocrtoc_dataset_toolkit.tools.generate_synthetic_dataset:main',
+        ],
+    }
 )
@@ -0,0 +1,29 @@
+import os
+import shutil
+
+import pytest
+
+from ocrtoc_dataset_toolkit.utils.logging import set_log_level
+from ocrtoc_dataset_toolkit.utils.synthetic import generate_synthetic_dataset
+
+set_log_level('WARNING')
+
+@pytest.fixture(scope = 'session')
+def synthetic_root(tmp_path_factory):
+    """Read only synthetic dataset shared by the tests"""
+    root = str(tmp_path_factory.mktemp('synthetic'))
+    generate_synthetic_dataset(root, scene_number = 2, image_number = 4, height = 120, width = 160)
+    return root
+
+@pytest.fixture
+def dataset_root(synthetic_root, tmp_path):
+    """Copy of the synthetic dataset which a test may modify"""
+    root = str(tmp_path / 'dataset')
+    shutil.copytree(synthetic_root, root)
+    # date the copy back so that the changes of a test always modify the mtimes,
+    # which have a coarse resolution on some file systems
+    for dir_path, dir_names, file_names in os.walk(root):
+        for name in dir_names + file_names:
+            os.utime(os.path.join(dir_path, name), ns = (0, 0))
+    os.utime(root, ns = (0, 0))
+    return root
@@ -0,0 +1,27 @@
+import numpy as np
+
+from ocrtoc_dataset_toolkit import OCRTOC_Dataset
+
+def load_frames(dataset):
+    return [
+        (dataset.load_depth_image(scene_id, image_id), dataset.load_seg_mask(scene_id, image_id))
+        for scene_id in range(dataset.load_scene_number())
+        for image_id in range(dataset.load_scene_image_number(scene_id))
+    ]
+
+def test_compressed_frames_match_originals(dataset_root):
+    other = OCRTOC_Dataset(root = dataset_root)
+    assert not other.has_compressed_frames(0, 'depth')
+    dataset = OCRTOC_Dataset(root = dataset_root)
+    original_frames = load_frames(dataset)
+    assert dataset.compress_scene(0, codec = 'zlib') == 2 * dataset.load_scene_image_number(0)
+    for field in ['depth', 'mask']:
+        assert dataset.has_compressed_frames(0, field)
+        assert not dataset.has_compressed_frames(1, field)
+    # the detection is kept until the cache is cleared
+    assert not other.has_compressed_frames(0, 'depth')
+    other.clear_cache()
+    assert other.has_compressed_frames(0, 'depth')
+    for (depth, seg_mask), (original_depth, original_seg_mask) in zip(load_frames(dataset), original_frames):
+        assert depth.dtype == original_depth.dtype and np.array_equal(depth, original_depth)
+        assert seg_mask.dtype == original_seg_mask.dtype and np.array_equal(seg_mask, original_seg_mask)
@@ -0,0 +1,37 @@
+import os
+
+from ocrtoc_dataset_toolkit import OCRTOC_Dataset
+from ocrtoc_dataset_toolkit.utils.manifest import build_manifest, save_manifest, load_manifest
+
+def build(root):
+    save_manifest(root, build_manifest(OCRTOC_Dataset(root = root, use_manifest = False)))
+
+def test_manifest_matches_scan(dataset_root):
+    build(dataset_root)
+    scanned = OCRTOC_Dataset(root = dataset_root, use_manifest = False)
+    dataset = OCRTOC_Dataset(root = dataset_root)
+    assert dataset.manifest is not None
+    for scene_id in range(scanned.load_scene_number()):
+        assert dataset.load_scene_image_number(scene_id) == scanned.load_scene_image_number(scene_id)
+        assert dataset.load_scene_object_list(scene_id) == scanned.load_scene_object_list(scene_id)
+        assert (dataset.load_real_camera_intrinsic(scene_id) == scanned.load_real_camera_intrinsic(scene_id)).all()
+
+def test_changed_scene_is_scanned(dataset_root):
+    build(dataset_root)
+    dataset = OCRTOC_Dataset(root = dataset_root)
+    scene_dir = os.path.join(dataset_root, 'scenes', dataset.load_scene_name(0))
+    object_name = dataset.load_scene_object_list(0)[0]
+    image_number = dataset.load_scene_image_number(0)
+    image_name = '{:04d}.png'.format(image_number - 1)
+    assert os.path.exists(os.path.join(scene_dir, 'rgb_undistort', image_name))
+
+    os.remove(os.path.join(scene_dir, 'object_poses', object_name + '.npy'))
+    os.remove(os.path.join(scene_dir, 'rgb_undistort', image_name))
+
+    manifest = load_manifest(dataset_root)
+    assert dataset.load_scene_name(0) not in manifest['scenes']
+    assert dataset.load_scene_name(1) in manifest['scenes']
+    dataset = OCRTOC_Dataset(root = dataset_root)
+    assert dataset.load_scene_manifest(0) is None
+    assert dataset.load_object_pose_dict(0)[object_name] is None
+    assert dataset.load_scene_image_number(0) == image_number - 1
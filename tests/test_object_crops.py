@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from ocrtoc_dataset_toolkit import OCRTOC_Dataset
+from ocrtoc_dataset_toolkit.utils.visibility import build_visibility_index, save_visibility_index
+
+def test_crop_colors_match_full_frame(synthetic_root):
+    dataset = OCRTOC_Dataset(root = synthetic_root)
+    checked = 0
+    for scene_id in range(dataset.load_scene_number()):
+        for image_id in range(dataset.load_scene_image_number(scene_id)):
+            rgb = dataset.load_raw_image(scene_id, image_id, order = 'RGB')
+            depth = dataset.load_depth_image(scene_id, image_id)
+            seg_mask = dataset.load_seg_mask(scene_id, image_id)
+            for crop in dataset.load_object_crops(scene_id, image_id, padding = 3):
+                x_min, y_min, x_max, y_max = crop['bbox']
+                rows, cols = np.nonzero(crop['mask'] & (crop['depth'] > 0))
+                rows, cols = rows + y_min, cols + x_min
+                object_id = dataset.object_id_dict[crop['object_name']]
+                assert (seg_mask[rows, cols] == object_id).all()
+                assert len(crop['points_camera']) == len(rows)
+                np.testing.assert_allclose(crop['colors'], rgb[rows, cols] / 255.0, atol = 1e-6)
+                np.testing.assert_allclose(crop['points_camera'][:, 2], depth[rows, cols] / 1000.0, rtol = 1e-6)
+                assert np.array_equal(crop['rgb'], rgb[y_min:y_max + 1, x_min:x_max + 1])
+                checked += 1
+    assert checked > 0
+
+def test_iter_object_crops(synthetic_root):
+    dataset = OCRTOC_Dataset(root = synthetic_root)
+    crops = list(dataset.iter_object_crops(scene_ids = [0, 1]))
+    assert len(crops) > 0
+    for crop in crops:
+        assert crop['rgb'].shape[:2] == crop['mask'].shape
+
+def test_unknown_object_name(dataset_root):
+    dataset = OCRTOC_Dataset(root = dataset_root)
+    with pytest.raises(ValueError, match = 'Unknown object'):
+        dataset.load_object_crops(0, 0, object_names = ['missing_object'])
+    # without and with the visibility index
+    with pytest.raises(ValueError, match = 'Unknown object'):
+        next(dataset.iter_object_crops(object_names = ['missing_object']))
+    save_visibility_index(dataset_root, build_visibility_index(dataset, workers = 1, worker_type = 'thread'))
+    dataset = OCRTOC_Dataset(root = dataset_root)
+    assert len(dataset.load_visibility_index()) > 0
+    with pytest.raises(ValueError, match = 'Unknown object'):
+        next(dataset.iter_object_crops(object_names = ['missing_object']))
@@ -0,0 +1,43 @@
+import numpy as np
+
+from ocrtoc_dataset_toolkit import OCRTOC_Dataset
+from ocrtoc_dataset_toolkit.utils.combine import VoxelAccumulator, get_inlier_mask, get_voxel_count_threshold
+from ocrtoc_dataset_toolkit.utils.synthetic import generate_synthetic_dataset
+from ocrtoc_dataset_toolkit.utils.vis import points_to_pointcloud, transform_points
+
+def match_ratio(source, target, match_distance = 0.004):
+    # fraction of the source points with a target point closer than match_distance
+    if len(source) == 0 or len(target) == 0:
+        return 0.0
+    distances = np.asarray(points_to_pointcloud(source).compute_point_cloud_distance(points_to_pointcloud(target)))
+    return float(np.mean(distances < match_distance))
+
+def accumulate_scene(dataset, scene_id):
+    accumulator = VoxelAccumulator()
+    frames = []
+    for image_id in range(dataset.load_scene_image_number(scene_id)):
+        points, _ = dataset.load_point_cloud_array(scene_id, image_id, dtype = np.float64, with_colors = False)
+        camera_pose = dataset.load_camera_pose(scene_id, image_id)
+        accumulator.add(transform_points(points, camera_pose))
+        frames.append((dataset.load_depth_image(scene_id, image_id), dataset.load_real_camera_intrinsic(scene_id), camera_pose))
+    points, _ = accumulator.get_arrays()
+    return points, accumulator.counts, frames
+
+def test_voxel_count_threshold():
+    assert get_voxel_count_threshold(np.zeros((0,), np.int64)) == 1
+    assert get_voxel_count_threshold(np.ones((100,), np.int64)) == 1
+    assert get_voxel_count_threshold(np.full((100,), 4, np.int64)) == 3
+
+def test_recall_against_statistical(tmp_path):
+    root = str(tmp_path)
+    generate_synthetic_dataset(root, scene_number = 1, image_number = 2, height = 480, width = 640)
+    dataset = OCRTOC_Dataset(root = root)
+    points, counts, frames = accumulate_scene(dataset, 0)
+    # the frames are fine enough for the derived threshold to remove voxels
+    assert get_voxel_count_threshold(counts) >= 2
+    # fewer neighbors than the default keep the reference fast
+    reference = points[get_inlier_mask(points, 'statistical', {'neighbors': 200, 'std_ratio': 0.5})]
+    for outlier_filter, min_recall in [('voxel_count', 0.95), ('radius', 0.95), ('multiview', 0.8)]:
+        mask = get_inlier_mask(points, outlier_filter, counts = counts, frames = frames)
+        assert mask.any()
+        assert match_ratio(reference, points[mask]) >= min_recall, outlier_filter
@@ -0,0 +1,25 @@
+import os
+
+from ocrtoc_dataset_toolkit import OCRTOC_Dataset
+from ocrtoc_dataset_toolkit.utils.scan import get_scan_params, iter_scan
+
+def scan(root):
+    dataset = OCRTOC_Dataset(root = root, use_manifest = False, metadata_cache_items = 0)
+    return list(iter_scan(dataset, get_scan_params(dataset), workers = 1, worker_type = 'thread'))
+
+def test_clean_dataset(dataset_root):
+    records = scan(dataset_root)
+    assert len(records) == 2
+    assert all(len(record['errors']) == 0 for record in records)
+
+def test_corrupt_original_of_compressed_scene(dataset_root):
+    dataset = OCRTOC_Dataset(root = dataset_root)
+    dataset.compress_scene(0, codec = 'zlib')
+    depth_path = os.path.join(dataset_root, 'scenes', dataset.load_scene_name(0), 'depth_undistort', '0001.png')
+    with open(depth_path, 'wb') as f:
+        f.write(b'not a png')
+    # the loaders still read the intact compressed copy
+    assert dataset.load_depth_image(0, 1) is not None
+    records = scan(dataset_root)
+    assert any('frame 1 cannot be read' in error for error in records[0]['errors'])
+    assert len(records[1]['errors']) == 0
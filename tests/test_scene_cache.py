@@ -0,0 +1,26 @@
+import numpy as np
+
+from ocrtoc_dataset_toolkit import OCRTOC_Dataset
+from ocrtoc_dataset_toolkit.utils.profiling import profiling
+
+def load_scene(root, cache_dir):
+    dataset = OCRTOC_Dataset(root = root, cache_dir = cache_dir)
+    with profiling() as profiler:
+        points, _ = dataset.load_scene_point_cloud_array(0, image_stride = 1, outlier_filter = 'none')
+    counters = profiler.stats()['counters']
+    return points, (counters.get('scene_cache_hits', 0), counters.get('scene_cache_misses', 0))
+
+def test_cache_is_invalidated_by_compression(dataset_root, tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    points, counters = load_scene(dataset_root, cache_dir)
+    assert counters == (0, 1)
+    _, counters = load_scene(dataset_root, cache_dir)
+    assert counters == (1, 0)
+
+    OCRTOC_Dataset(root = dataset_root).compress_scene(0, codec = 'zlib')
+    compressed_points, counters = load_scene(dataset_root, cache_dir)
+    assert counters == (0, 1)
+    # the compression is lossless
+    assert np.array_equal(compressed_points, points)
+    _, counters = load_scene(dataset_root, cache_dir)
+    assert counters == (1, 0)
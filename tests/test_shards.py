@@ -0,0 +1,43 @@
+import io
+import os
+import tarfile
+
+import numpy as np
+import pytest
+
+from ocrtoc_dataset_toolkit import OCRTOC_Dataset
+from ocrtoc_dataset_toolkit.utils.shards import write_shard, read_shard
+
+def rename_scene(root, scene_name, new_scene_name):
+    os.rename(os.path.join(root, 'scenes', scene_name), os.path.join(root, 'scenes', new_scene_name))
+    with open(os.path.join(root, 'scene_name_list.txt')) as f:
+        scene_names = [line.strip() for line in f]
+    with open(os.path.join(root, 'scene_name_list.txt'), 'w') as f:
+        for name in scene_names:
+            f.write((new_scene_name if name == scene_name else name) + '\n')
+
+def test_read_shard_with_dotted_scene_name(dataset_root, tmp_path):
+    rename_scene(dataset_root, OCRTOC_Dataset(root = dataset_root).load_scene_name(0), 'scene.v1.0')
+    dataset = OCRTOC_Dataset(root = dataset_root, use_manifest = False)
+    frame_ids = [(0, 0), (0, 1), (1, 0)]
+    shard_path, _ = write_shard(dataset, str(tmp_path / 'shard.tar'), frame_ids)
+    frames = list(read_shard(shard_path))
+    assert [(frame['scene_id'], frame['image_id']) for frame in frames] == frame_ids
+    for frame in frames:
+        scene_id, image_id = frame['scene_id'], frame['image_id']
+        assert np.array_equal(frame['rgb'], dataset.load_raw_image(scene_id, image_id))
+        assert np.array_equal(frame['depth'], dataset.load_depth_image(scene_id, image_id))
+        assert np.array_equal(frame['mask'], dataset.load_seg_mask(scene_id, image_id))
+        assert np.array_equal(frame['pose'], dataset.load_camera_pose(scene_id, image_id))
+        assert np.array_equal(frame['intrinsics'], dataset.load_real_camera_intrinsic(scene_id))
+        assert sorted(frame['object_poses']) == sorted(
+            name for name, pose in dataset.load_object_pose_dict(scene_id).items() if pose is not None)
+
+def test_read_shard_rejects_malformed_members(tmp_path):
+    shard_path = str(tmp_path / 'malformed.tar')
+    with tarfile.open(shard_path, 'w') as tar:
+        info = tarfile.TarInfo('no_extension')
+        info.size = 1
+        tar.addfile(info, io.BytesIO(b'x'))
+    with pytest.raises(ValueError, match = 'Malformed member'):
+        list(read_shard(shard_path))
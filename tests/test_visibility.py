@@ -0,0 +1,32 @@
+import os
+
+import numpy as np
+
+from ocrtoc_dataset_toolkit import OCRTOC_Dataset
+from ocrtoc_dataset_toolkit.utils.visibility import build_visibility_index, save_visibility_index, \
+    load_visibility_index, compute_scene_visibility
+
+def build(root):
+    dataset = OCRTOC_Dataset(root = root)
+    save_visibility_index(root, build_visibility_index(dataset, workers = 1, worker_type = 'thread'))
+    return dataset
+
+def test_changed_scene_is_recomputed(dataset_root):
+    dataset = build(dataset_root)
+    assert load_visibility_index(dataset_root) is not None
+    # replace the last mask of scene 1 by an empty one
+    image_id = dataset.load_scene_image_number(1) - 1
+    mask_path = os.path.join(dataset_root, 'scenes', dataset.load_scene_name(1), 'seg_masks', '%04d.npy' % image_id)
+    mask = np.load(mask_path)
+    os.remove(mask_path)
+    np.save(mask_path, np.zeros_like(mask))
+
+    assert load_visibility_index(dataset_root) is None
+    dataset = OCRTOC_Dataset(root = dataset_root)
+    index = dataset.load_visibility_index()
+    assert len(index.frame_records(1, image_id)) == 0
+    for scene_id in range(dataset.load_scene_number()):
+        expected = compute_scene_visibility(dataset, scene_id)
+        records = index.query(scene_ids = [scene_id])
+        assert np.array_equal(np.sort(records, order = ['image_id', 'object_id']),
+            np.sort(expected, order = ['image_id', 'object_id']))